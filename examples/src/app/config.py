@@ -1,8 +1,36 @@
-import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
-from azure.keyvault.secrets import SecretClient
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Key Vault secret name -> setting it populates when not set in the environment
+SECRET_SETTINGS = {
+    "azure-openai-endpoint": "azure_openai_endpoint",
+    "azure-openai-api-key": "azure_openai_api_key",
+    "cosmos-db-endpoint": "cosmos_db_endpoint",
+    "cosmos-db-key": "cosmos_db_key",
+    "applicationinsights-connection-string": "applicationinsights_connection_string"
+}
+
+SecretListener = Callable[[str, Optional[str]], Awaitable[None]]
+
+
+class AzureOpenAIBackend(BaseModel):
+    """One Azure OpenAI deployment that completion requests can be routed to"""
+    name: str
+    endpoint: str
+    api_key: Optional[str] = None  # Defaults to azure_openai_api_key
+    deployment: Optional[str] = None  # Defaults to azure_openai_deployment
+    weight: float = 1.0  # Share of traffic relative to the other backends
+    requests_per_minute: Optional[int] = None  # Defaults to azure_openai_requests_per_minute
+    tokens_per_minute: Optional[int] = None  # Defaults to azure_openai_tokens_per_minute
 
 
 class Settings(BaseSettings):
@@ -16,17 +44,128 @@ class Settings(BaseSettings):
     azure_openai_deployment: str = "gpt-4.1"  # Default deployment name from main.tf
     azure_openai_api_version: str = "2024-02-01"
     
+    # Azure OpenAI client pool and limits (per worker process)
+    azure_openai_max_connections: int = 100
+    azure_openai_max_keepalive_connections: int = 20
+    azure_openai_keepalive_expiry_seconds: float = 30.0
+    azure_openai_max_concurrent_requests: int = 32
+    azure_openai_max_retries: int = 2  # Connection errors and 5xx responses
+    azure_openai_throttle_retries: int = 3  # 429 responses, retried after Retry-After
+    azure_openai_retry_backoff_seconds: float = 1.0  # Base of the exponential backoff
+    azure_openai_retry_deadline_seconds: float = 30.0  # Cap on one request's total retry and throttle waits
+    azure_openai_requests_per_minute: int = 0  # Client-side budget; 0 learns it from x-ratelimit headers
+    azure_openai_tokens_per_minute: int = 0
+    azure_openai_coalesce_requests: bool = True  # Share one upstream call among concurrent identical requests
+    azure_openai_connect_timeout_seconds: float = 5.0
+    azure_openai_timeout_seconds: float = 60.0
+    azure_openai_title_timeout_seconds: float = 15.0
+    azure_openai_test_timeout_seconds: float = 10.0
+    
+    # Azure OpenAI backends to balance across (JSON list); empty uses azure_openai_endpoint alone
+    azure_openai_backends: List[AzureOpenAIBackend] = []
+    azure_openai_breaker_failure_threshold: int = 5  # Consecutive failures that open a backend's circuit
+    azure_openai_breaker_reset_seconds: float = 30.0  # How long an open circuit waits before a trial request
+    
     # Cosmos DB settings
     cosmos_db_endpoint: Optional[str] = None
     cosmos_db_key: Optional[str] = None
     cosmos_db_database: str = "chathistory"
     cosmos_db_container: str = "conversations"
+    cosmos_db_max_connections: int = 100
+    cosmos_db_max_concurrent_requests: int = 64
+    
+    # Recent sessions feed (materialized index document per tenant)
+    session_feed_tenant: str = "default"
+    # Sessions kept in the feed document; every feed write rewrites it, so this bounds the RU
+    # charge on the feed's partition. Pages past these come from the ORDER BY query.
+    session_feed_max_entries: int = 100
+    session_feed_max_write_attempts: int = 5
+    
+    # Completion cache for repeated prompts (opt-in)
+    completion_cache_enabled: bool = False
+    completion_cache_backend: str = "memory"  # "memory" (per process) or "redis" (shared)
+    completion_cache_redis_url: str = "redis://localhost:6379/0"
+    completion_cache_max_entries: int = 10000  # Memory backend only
+    completion_cache_ttl_seconds: float = 3600.0
+    completion_cache_max_temperature: float = 0.3  # Requests sampled above this are never cached
+    
+    # Conversation history cache (per worker process)
+    history_cache_enabled: bool = True
+    history_cache_max_sessions: int = 1000
+    history_cache_max_bytes: int = 64 * 1024 * 1024
+    history_cache_ttl_seconds: float = 900.0
+    # Check hits against the newest stored message (one single-partition query). Turn on when a
+    # session's requests can reach several replicas or workers (no session affinity): another one
+    # may have added messages this cache has not seen. Hits within the interval of the last check
+    # (or of loading the history) are trusted, so a busy session is checked at most that often.
+    history_cache_verify: bool = False
+    history_cache_verify_interval_seconds: float = 5.0
+    
+    # Batched chat history writes (transactional batch per session partition)
+    message_write_flush_interval_ms: float = 10.0  # How long the first queued write waits for others to join its batch
+    message_write_max_batch_size: int = 100  # Cosmos DB allows at most 100 operations per batch
+    message_write_durable: bool = True  # Acknowledge writes only once committed; False returns once queued
+    
+    # Prompt context window
+    context_max_tokens: int = 8000
+    context_token_encoding: str = "o200k_base"
+    context_token_cache_size: int = 50000
+    context_summary_enabled: bool = False
+    context_summary_max_tokens: int = 500
+    
+    # Background session title generation
+    title_generation_workers: int = 2
+    title_generation_queue_size: int = 500
+    title_generation_max_attempts: int = 3
+    title_generation_retry_delay_seconds: float = 1.0
     
     # Application Insights
     applicationinsights_connection_string: Optional[str] = None
     
+    # Logging (records are queued and written by a background thread)
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json" (one object per line) or "text"
+    log_queue_size: int = 10000  # Records beyond this are dropped rather than blocking requests
+    log_sample_rates: Dict[str, float] = {}  # Logger name -> share of INFO/DEBUG records kept, e.g. {"app.access": 0.1}
+    
     # Key Vault settings (for retrieving secrets)
     key_vault_url: Optional[str] = None
+    key_vault_refresh_interval_seconds: float = 3600.0  # Secret cache TTL and background refresh period
+    
+    # Startup
+    startup_background_init: bool = False  # Serve before the clients are created; early requests wait for them
+    
+    # Health checks
+    health_check_interval_seconds: float = 30.0
+    health_require_dependencies: bool = False  # Report not-ready while a dependency is down
+    
+    # Network connectivity probes
+    network_probe_port: int = 443  # Used for endpoints without an explicit ":port"
+    network_probe_mode: str = "tcp"  # "tcp", "tls" (handshake with certificate/SNI checks) or "https"
+    network_probe_https_path: str = "/"
+    network_probe_ca_file: Optional[str] = None  # Extra CA bundle for TLS probes (system store when unset)
+    network_probe_timeout_seconds: float = 5.0  # DNS + connect deadline per endpoint
+    network_sweep_timeout_seconds: float = 10.0  # Deadline for a full sweep
+    network_probe_max_concurrency: int = 16
+    network_status_refresh_seconds: float = 60.0  # Background sweep interval for /api/network/status
+    network_history_size: int = 1440  # Samples kept per endpoint (a day at the default interval)
+    network_status_window_seconds: float = 900.0  # Window overall_status is graded over
+    network_healthy_availability_percent: float = 99.0
+    network_degraded_availability_percent: float = 90.0
+    network_latency_threshold_ms: float = 500.0  # p95 above this grades an endpoint degraded
+    
+    # DNS resolution for network probes
+    dns_cache_ttl_seconds: float = 30.0  # Used when the record TTL is unknown (system resolver)
+    dns_cache_max_ttl_seconds: float = 300.0
+    dns_negative_cache_ttl_seconds: float = 5.0
+    dns_cache_max_entries: int = 1024
+    dns_private_cidrs: list = [
+        "10.0.0.0/8",
+        "172.16.0.0/12",
+        "192.168.0.0/16",
+        "100.64.0.0/10",
+        "fc00::/7"
+    ]
     
     # Network testing endpoints
     test_endpoints: list = [
@@ -51,10 +190,18 @@ class ConfigManager:
         self.settings = Settings()
         self._credential = None
         self._key_vault_client = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._secret_cache: Dict[str, Tuple[str, float]] = {}
+        self._key_vault_secrets: List[str] = []
+        self._listeners: List[SecretListener] = []
+        self._refresh_task: Optional[asyncio.Task] = None
         
     def get_credential(self):
         """Get Azure credential (Managed Identity in production, Default for development)"""
         if self._credential is None:
+            # Imported here so that apps configured without Key Vault never load the identity stack
+            from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
             try:
                 # Try Managed Identity first (for Container Apps/VM deployment)
                 self._credential = ManagedIdentityCredential()
@@ -66,6 +213,7 @@ class ConfigManager:
     def get_key_vault_client(self):
         """Get Key Vault client if configured"""
         if self.settings.key_vault_url and self._key_vault_client is None:
+            from azure.keyvault.secrets import SecretClient
             self._key_vault_client = SecretClient(
                 vault_url=self.settings.key_vault_url,
                 credential=self.get_credential()
@@ -73,41 +221,109 @@ class ConfigManager:
         return self._key_vault_client
     
     def get_secret(self, secret_name: str) -> Optional[str]:
-        """Retrieve secret from Key Vault or environment variables"""
+        """Retrieve secret from environment variables or Key Vault (cached until the refresh interval elapses)"""
         # Try environment variable first
         env_value = os.getenv(secret_name.upper().replace('-', '_'))
         if env_value:
             return env_value
-            
+        
+        cached = self._secret_cache.get(secret_name)
+        if cached and time.monotonic() - cached[1] < self.settings.key_vault_refresh_interval_seconds:
+            return cached[0]
+        
         # Try Key Vault if configured
+        return self._fetch_secret(secret_name)
+    
+    def _fetch_secret(self, secret_name: str) -> Optional[str]:
+        """Read a secret from Key Vault and cache it"""
         kv_client = self.get_key_vault_client()
-        if kv_client:
-            try:
-                secret = kv_client.get_secret(secret_name)
-                return secret.value
-            except Exception as e:
-                print(f"Failed to retrieve secret {secret_name} from Key Vault: {e}")
+        if not kv_client:
+            return None
         
-        return None
+        try:
+            secret = kv_client.get_secret(secret_name)
+        except Exception as e:
+            logger.warning("Failed to retrieve secret %s from Key Vault: %s", secret_name, e)
+            return None
+        
+        self._secret_cache[secret_name] = (secret.value, time.monotonic())
+        return secret.value
     
     def load_azure_config(self):
-        """Load Azure service configurations"""
-        # Load OpenAI config
-        if not self.settings.azure_openai_endpoint:
-            self.settings.azure_openai_endpoint = self.get_secret("azure-openai-endpoint")
-        if not self.settings.azure_openai_api_key:
-            self.settings.azure_openai_api_key = self.get_secret("azure-openai-api-key")
+        """Load Azure service configurations (only the first call does any work)"""
+        if self._loaded:
+            return
+        
+        with self._load_lock:
+            if self._loaded:
+                return
             
-        # Load Cosmos DB config
-        if not self.settings.cosmos_db_endpoint:
-            self.settings.cosmos_db_endpoint = self.get_secret("cosmos-db-endpoint")
-        if not self.settings.cosmos_db_key:
-            self.settings.cosmos_db_key = self.get_secret("cosmos-db-key")
+            missing = [name for name, field in SECRET_SETTINGS.items() if not getattr(self.settings, field)]
+            values = {name: os.getenv(name.upper().replace('-', '_')) for name in missing}
             
-        # Load Application Insights config
-        if not self.settings.applicationinsights_connection_string:
-            self.settings.applicationinsights_connection_string = self.get_secret("applicationinsights-connection-string")
-
+            # Fetch everything else from Key Vault concurrently instead of one round trip at a time
+            self._key_vault_secrets = [name for name in missing if not values[name]]
+            if self._key_vault_secrets and self.get_key_vault_client():
+                with ThreadPoolExecutor(max_workers=len(self._key_vault_secrets)) as executor:
+                    fetched = executor.map(self._fetch_secret, self._key_vault_secrets)
+                    values.update(zip(self._key_vault_secrets, fetched))
+            
+            for name, value in values.items():
+                if value:
+                    setattr(self.settings, SECRET_SETTINGS[name], value)
+            self._loaded = True
+    
+    def subscribe(self, listener: SecretListener):
+        """Register a coroutine called with (secret_name, value) when a Key Vault secret changes"""
+        self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: SecretListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    async def refresh_secrets(self) -> List[str]:
+        """Re-read Key Vault secrets concurrently, apply changed values and notify subscribers"""
+        if not self._key_vault_secrets or not self.get_key_vault_client():
+            return []
+        
+        names = list(self._key_vault_secrets)
+        values = await asyncio.gather(*(asyncio.to_thread(self._fetch_secret, name) for name in names))
+        
+        changed = []
+        for name, value in zip(names, values):
+            field = SECRET_SETTINGS[name]
+            # Keep the last good value when a fetch fails
+            if value and value != getattr(self.settings, field):
+                setattr(self.settings, field, value)
+                changed.append(name)
+        
+        for name in changed:
+            logger.info("Secret %s changed in Key Vault", name)
+            for listener in list(self._listeners):
+                try:
+                    await listener(name, getattr(self.settings, SECRET_SETTINGS[name]))
+                except Exception as e:
+                    logger.error("Secret change listener failed for %s: %s", name, e)
+        return changed
+    
+    def start_secret_refresh(self):
+        """Refresh Key Vault secrets in the background (no-op when nothing comes from Key Vault)"""
+        if self._refresh_task is None and self._key_vault_secrets and self.get_key_vault_client():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    async def stop_secret_refresh(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+    
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.settings.key_vault_refresh_interval_seconds)
+            try:
+                await self.refresh_secrets()
+            except Exception as e:
+                logger.error("Failed to refresh Key Vault secrets: %s", e)
 
 # Global configuration instance
 config_manager = ConfigManager()
@@ -0,0 +1,124 @@
+from fastapi import Depends, Request
+from typing import Optional
+from app.config import config_manager
+from app.services.ai_service import AIService, close_shared_http_client
+from app.services.completion_cache import completion_cache
+from app.services.chat_service import ChatHistoryService
+from app.services.context_service import ContextWindowBuilder
+from app.services.cosmos_store import cosmos_store
+from app.services.health_service import HealthMonitor
+from app.services.network_monitor import NetworkStatusMonitor
+from app.services.network_service import NetworkTestService
+from app.services.title_service import TitleGenerationQueue
+from app.startup import startup_timer
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Application-scoped services, created once per process by the app lifespan"""
+
+    def __init__(self):
+        self.ai_service = AIService()
+        self.chat_history_service = ChatHistoryService()
+        self.network_service = NetworkTestService()
+        self.network_monitor = NetworkStatusMonitor(self.network_service)
+        self.title_queue = TitleGenerationQueue(self.ai_service, self.chat_history_service)
+        self.context_builder = ContextWindowBuilder(self.ai_service, self.chat_history_service)
+        self.health_monitor = HealthMonitor(self.ai_service, self.chat_history_service)
+        self._connecting: Optional[asyncio.Task] = None
+
+    async def start(self, wait: bool = True):
+        """Start background work and connect to dependencies.
+
+        With ``wait`` this returns once the clients are created and the first health check
+        has run. Otherwise they are created in the background: the app serves at once and
+        requests that need a service wait for them (see ``get_services``).
+        """
+        # Load the tokenizer used for context budgeting without delaying startup
+        self.context_builder.start()
+        self.title_queue.start()
+        self.network_monitor.start()
+        self._connecting = asyncio.create_task(self._connect())
+        if wait:
+            await self.wait_until_connected()
+
+    async def wait_until_connected(self):
+        """Wait for the dependency clients (returns at once after startup)"""
+        await asyncio.shield(self._connecting)
+
+    async def _connect(self):
+        """Load configuration, create the clients concurrently and run the first health check"""
+        # Every client needs the Key Vault secrets; the round trips run off the event loop
+        with startup_timer.phase("config"):
+            await asyncio.to_thread(config_manager.load_azure_config)
+        settings = config_manager.settings
+        logger.info("Azure OpenAI Endpoint: %s", settings.azure_openai_endpoint)
+        logger.info("Cosmos DB Endpoint: %s", settings.cosmos_db_endpoint)
+        logger.info("Application Insights: %s", 'Configured' if settings.applicationinsights_connection_string else 'Not configured')
+        config_manager.subscribe(self._on_secret_changed)
+        config_manager.start_secret_refresh()
+
+        # The SDKs import on worker threads while the Cosmos DB database and container round trips are in flight
+        await asyncio.gather(
+            startup_timer.timed("azure_openai", self.ai_service.start()),
+            startup_timer.timed("cosmos_db", cosmos_store.get_container())
+        )
+        with startup_timer.phase("health_check"):
+            await self.health_monitor.start()
+        startup_timer.connected()
+
+    async def stop(self):
+        """Stop background work and close shared connection pools"""
+        if self._connecting and not self._connecting.done():
+            self._connecting.cancel()
+            await asyncio.gather(self._connecting, return_exceptions=True)
+        await config_manager.stop_secret_refresh()
+        config_manager.unsubscribe(self._on_secret_changed)
+        await self.health_monitor.stop()
+        await self.network_monitor.stop()
+        await self.title_queue.stop()
+        await self.context_builder.stop()
+        await self.chat_history_service.close()
+        await close_shared_http_client()
+        await cosmos_store.close()
+        if completion_cache:
+            await completion_cache.close()
+        logger.info("Azure OpenAI and Cosmos DB connection pools closed")
+
+    async def _on_secret_changed(self, secret_name: str, value: Optional[str]):
+        """Rotate clients when their Key Vault secrets change"""
+        if secret_name.startswith("azure-openai-"):
+            self.ai_service.refresh_credentials()
+        elif secret_name.startswith("cosmos-db-"):
+            await cosmos_store.refresh_credentials()
+
+
+async def get_services(request: Request) -> ServiceContainer:
+    """Get the application's service container once its dependency clients are created"""
+    services = request.app.state.services
+    await services.wait_until_connected()
+    return services
+
+
+def get_ai_service(services: ServiceContainer = Depends(get_services)) -> AIService:
+    return services.ai_service
+
+
+def get_chat_history_service(services: ServiceContainer = Depends(get_services)) -> ChatHistoryService:
+    return services.chat_history_service
+
+
+def get_network_service(services: ServiceContainer = Depends(get_services)) -> NetworkTestService:
+    return services.network_service
+
+
+def get_network_monitor(services: ServiceContainer = Depends(get_services)) -> NetworkStatusMonitor:
+    return services.network_monitor
+
+
+def get_health_monitor(request: Request) -> HealthMonitor:
+    # Probes must answer while the clients are still being created
+    return request.app.state.services.health_monitor
@@ -1,43 +1,89 @@
+# Imported first so the startup breakdown covers the rest of the app's imports
+from app.startup import startup_timer
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.routers import chat, network
+from fastapi.responses import FileResponse, ORJSONResponse
+from app.routers import chat, health, metrics, network
 from app.config import config_manager
+from app.dependencies import ServiceContainer
+from app.logging_config import configure_logging
+from app.telemetry import pipeline_metrics
+import asyncio
 import logging
 import os
-from azure.monitor.opentelemetry import configure_azure_monitor
+import time
 from opentelemetry import trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging (written off the event loop by a background thread)
+configure_logging(
+    level=config_manager.settings.log_level,
+    log_format=config_manager.settings.log_format,
+    queue_size=config_manager.settings.log_queue_size,
+    sample_rates=config_manager.settings.log_sample_rates
 )
 logger = logging.getLogger(__name__)
+# One record per request; sample it with LOG_SAMPLE_RATES={"app.access": 0.1} under heavy load
+access_logger = logging.getLogger("app.access")
+startup_timer.mark("imports")
 
 
-def create_app() -> FastAPI:
-    """Create and configure FastAPI application"""
-    
-    # Load configuration
+def configure_telemetry():
+    """Export traces, metrics and logs to Application Insights if a connection string is configured"""
+    # The connection string may come from Key Vault
     config_manager.load_azure_config()
+    connection_string = config_manager.settings.applicationinsights_connection_string
+    if not connection_string:
+        return
+    try:
+        # The exporter stack is slow to import, so it is only loaded when it is used
+        from azure.monitor.opentelemetry import configure_azure_monitor
+        configure_azure_monitor(connection_string=connection_string)
+        logger.info("Application Insights configured successfully")
+    except Exception as e:
+        logger.error("Failed to configure Application Insights: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create application-scoped services on startup and release them on shutdown"""
+    logger.info("Starting AI Landing Zone Chat Application")
+    background = config_manager.settings.startup_background_init
+    
+    # Telemetry and the dependency clients are set up concurrently, off the event loop
+    telemetry = asyncio.create_task(startup_timer.timed("telemetry", asyncio.to_thread(configure_telemetry)))
+    services = ServiceContainer()
+    app.state.services = services
+    await services.start(wait=not background)
+    if not background:
+        await telemetry
     
-    # Configure Azure Monitor if connection string is available
-    if config_manager.settings.applicationinsights_connection_string:
-        try:
-            configure_azure_monitor(
-                connection_string=config_manager.settings.applicationinsights_connection_string
-            )
-            logger.info("Application Insights configured successfully")
-        except Exception as e:
-            logger.error(f"Failed to configure Application Insights: {e}")
+    # Log startup event to Application Insights
+    tracer = trace.get_tracer(__name__)
+    with tracer.start_as_current_span("application_startup"):
+        startup_timer.ready()
+    
+    yield
+    
+    await services.stop()
+    await asyncio.gather(telemetry, return_exceptions=True)
+
+
+def create_app() -> FastAPI:
+    """Create and configure FastAPI application.
+    
+    Configuration, telemetry and dependency clients are loaded by the lifespan, so importing
+    the app makes no network calls.
+    """
     
     # Create FastAPI app
     app = FastAPI(
         title="AI Landing Zone Chat Application",
         description="Chat application with network connectivity testing for Azure AI Landing Zone",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
     
     # Instrument FastAPI with OpenTelemetry
@@ -46,6 +92,8 @@ def create_app() -> FastAPI:
     # Include routers
     app.include_router(chat.router)
     app.include_router(network.router)
+    app.include_router(health.router)
+    app.include_router(metrics.router)
     
     # Mount static files
     static_path = os.path.join(os.path.dirname(__file__), "static")
@@ -56,41 +104,26 @@ def create_app() -> FastAPI:
         """Serve the main chat interface"""
         return FileResponse(os.path.join(static_path, "index.html"))
     
-    @app.get("/health")
-    async def health_check():
-        """Health check endpoint"""
-        return {
-            "status": "healthy",
-            "app_name": config_manager.settings.app_name,
-            "ai_service_available": await _check_ai_service(),
-            "cosmos_db_available": _check_cosmos_db()
-        }
-    
-    @app.on_event("startup")
-    async def startup_event():
-        """Application startup event"""
-        logger.info("Starting AI Landing Zone Chat Application")
-        logger.info(f"Azure OpenAI Endpoint: {config_manager.settings.azure_openai_endpoint}")
-        logger.info(f"Cosmos DB Endpoint: {config_manager.settings.cosmos_db_endpoint}")
-        logger.info(f"Application Insights: {'Configured' if config_manager.settings.applicationinsights_connection_string else 'Not configured'}")
-        
-        # Log startup event to Application Insights
-        tracer = trace.get_tracer(__name__)
-        with tracer.start_as_current_span("application_startup"):
-            logger.info("Application startup completed")
-    
     @app.middleware("http")
     async def log_requests(request: Request, call_next):
         """Log HTTP requests"""
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         response = await call_next(request)
         
-        process_time = time.time() - start_time
-        logger.info(
-            f"{request.method} {request.url.path} - "
-            f"Status: {response.status_code} - "
-            f"Time: {process_time:.4f}s"
+        process_time = time.perf_counter() - start_time
+        # Label by route template so /metrics does not grow a series per session id
+        route = request.scope.get("route")
+        pipeline_metrics.observe_request(request.method, getattr(route, "path", "unmatched"), process_time)
+        access_logger.info(
+            "%s %s - Status: %s - Time: %.4fs",
+            request.method, request.url.path, response.status_code, process_time,
+            extra={
+                "http_method": request.method,
+                "path": request.url.path,
+                "status_code": response.status_code,
+                "duration_ms": round(process_time * 1000, 3)
+            }
         )
         
         return response
@@ -98,32 +131,12 @@ def create_app() -> FastAPI:
     return app
 
 
-async def _check_ai_service() -> bool:
-    """Check if AI service is available"""
-    try:
-        from app.services.ai_service import AIService
-        ai_service = AIService()
-        return ai_service.is_available()
-    except Exception:
-        return False
-
-
-def _check_cosmos_db() -> bool:
-    """Check if Cosmos DB is available"""
-    try:
-        from app.services.chat_service import ChatHistoryService
-        chat_service = ChatHistoryService()
-        return chat_service.container is not None
-    except Exception:
-        return False
-
-
 # Create the app instance
 app = create_app()
+startup_timer.mark("create_app")
 
 if __name__ == "__main__":
     import uvicorn
-    import time
     
     uvicorn.run(
         "app.main:app",
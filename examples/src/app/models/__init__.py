@@ -1,53 +1,74 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 import uuid
 
 
+def _new_id() -> str:
+    return str(uuid.uuid4())
+
+
 class ChatMessage(BaseModel):
-    id: str = None
+    id: str = Field(default_factory=_new_id)
     session_id: str
     role: str  # "user" or "assistant"
     content: str
-    timestamp: datetime = None
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    
+    def to_document(self) -> Dict[str, Any]:
+        """Cosmos DB document for this message (timestamps as ISO 8601 strings)"""
+        return self.model_dump(mode="json")
     
-    def __init__(self, **data):
-        if data.get('id') is None:
-            data['id'] = str(uuid.uuid4())
-        if data.get('timestamp') is None:
-            data['timestamp'] = datetime.utcnow()
-        super().__init__(**data)
+    @classmethod
+    def from_document(cls, item: Dict[str, Any]) -> "ChatMessage":
+        """Build from a stored document in a single validation pass.
+        
+        pydantic-core parses the ISO timestamps and drops the Cosmos DB system
+        properties, which is cheaper than pre-converting fields in Python (and than
+        ``model_construct``, which runs in Python).
+        """
+        return cls.model_validate(item)
 
 
 class ChatSession(BaseModel):
-    id: str = None
+    id: str = Field(default_factory=_new_id)
     title: str = "New Chat"
-    created_at: datetime = None
-    updated_at: datetime = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
     message_count: int = 0
     
-    def __init__(self, **data):
-        if data.get('id') is None:
-            data['id'] = str(uuid.uuid4())
-        if data.get('created_at') is None:
-            data['created_at'] = datetime.utcnow()
-        if data.get('updated_at') is None:
-            data['updated_at'] = datetime.utcnow()
-        super().__init__(**data)
+    def to_document(self) -> Dict[str, Any]:
+        """Session fields as stored in Cosmos DB and the recent sessions feed"""
+        return self.model_dump(mode="json")
+    
+    @classmethod
+    def from_document(cls, item: Dict[str, Any]) -> "ChatSession":
+        """Build from a stored session document or feed entry (see ``ChatMessage.from_document``)"""
+        return cls.model_validate(item)
+
+
+class SessionSummary(BaseModel):
+    content: str
+    through_message_id: str  # Last message folded into the summary
+    etag: Optional[str] = Field(default=None, exclude=True)  # Session ETag when read, not stored
 
 
 class NetworkTestResult(BaseModel):
     endpoint: str
     is_reachable: bool
     response_time_ms: Optional[float] = None
+    dns_time_ms: Optional[float] = None
+    connect_time_ms: Optional[float] = None
+    tls_time_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    probe_mode: Optional[str] = None  # "tcp", "tls" or "https"
+    dns_cached: Optional[bool] = None
+    private_address: Optional[bool] = None  # Resolved address is in a private range
+    tls_version: Optional[str] = None
+    http_status_code: Optional[int] = None
     ip_address: Optional[str] = None
     error_message: Optional[str] = None
-    test_timestamp: datetime = None
-    
-    def __init__(self, **data):
-        if data.get('test_timestamp') is None:
-            data['test_timestamp'] = datetime.utcnow()
-        super().__init__(**data)
+    test_timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
 class NetworkTestSummary(BaseModel):
@@ -57,12 +78,46 @@ class NetworkTestSummary(BaseModel):
     average_response_time_ms: Optional[float] = None
     test_results: List[NetworkTestResult]
     overall_status: str  # "healthy", "degraded", or "unhealthy"
-    last_test_time: datetime = None
-    
-    def __init__(self, **data):
-        if data.get('last_test_time') is None:
-            data['last_test_time'] = datetime.utcnow()
-        super().__init__(**data)
+    last_test_time: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DnsResolutionResult(BaseModel):
+    hostname: str
+    addresses: List[str] = []  # Every A and AAAA answer
+    canonical_name: Optional[str] = None
+    resolver: str  # "dnspython", "system" or "literal"
+    ttl_seconds: Optional[float] = None  # Remaining cache lifetime of this answer
+    cached: bool = False
+    resolution_time_ms: Optional[float] = None
+    is_private: Optional[bool] = None  # All answers fall in the configured private ranges
+    private_addresses: List[str] = []
+    error_message: Optional[str] = None
+
+
+class DnsCheckSummary(BaseModel):
+    total_hostnames: int
+    private_hostnames: int
+    results: List[DnsResolutionResult]
+    all_private: bool
+
+
+class EndpointLatencyStats(BaseModel):
+    endpoint: str
+    window_seconds: float
+    samples: int
+    status: Optional[str] = None  # "healthy", "degraded", "unhealthy" or "unknown"
+    availability_percent: Optional[float] = None
+    mean_ms: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
+
+
+class NetworkHistorySummary(BaseModel):
+    window_seconds: float
+    overall_status: str
+    endpoints: List[EndpointLatencyStats]
 
 
 class ChatRequest(BaseModel):
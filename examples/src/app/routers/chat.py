@@ -1,44 +1,89 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple, AsyncIterator
+from opentelemetry import metrics
 from app.models import ChatRequest, ChatResponse, ChatMessage, ChatSession
 from app.services.chat_service import ChatHistoryService
-from app.services.ai_service import AIService
+from app.services.ai_service import AIService, NoBackendAvailableError, ThrottledError
+from app.dependencies import ServiceContainer, get_services, get_ai_service, get_chat_history_service
+import asyncio
 import logging
+import math
+import orjson
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
-# Service instances
-chat_history_service = ChatHistoryService()
-ai_service = AIService()
+# Streaming metrics (exported through Azure Monitor when configured)
+meter = metrics.get_meter(__name__)
+time_to_first_token_histogram = meter.create_histogram(
+    "chat.stream.time_to_first_token",
+    unit="ms",
+    description="Time from request start to the first streamed response token"
+)
+
+
+async def _prepare_conversation(request: ChatRequest,
+                                chat_history_service: ChatHistoryService) -> Tuple[str, ChatMessage, List[ChatMessage]]:
+    """Resolve the session and return the user message and the conversation history ending with it
+    
+    The user message is saved with the reply once the response completes (see _save_turn).
+    """
+    # Create or use existing session
+    session_id = request.session_id
+    if not session_id:
+        # Create new session
+        session = await chat_history_service.create_session()
+        session_id = session.id
+    
+    # Create user message
+    user_message = ChatMessage(
+        session_id=session_id,
+        role="user",
+        content=request.message
+    )
+    
+    # Get conversation history for context
+    message_history = await chat_history_service.get_session_messages(session_id)
+    return session_id, user_message, [*message_history, user_message]
+
+
+async def _save_turn(chat_history_service: ChatHistoryService, user_message: ChatMessage,
+                     assistant_message: Optional[ChatMessage] = None):
+    """Save the user message and its reply together, or the user message alone when the reply failed"""
+    if assistant_message is None:
+        await chat_history_service.save_message(user_message)
+    else:
+        await chat_history_service.save_messages([user_message, assistant_message])
+
+
+def _upstream_error(error: Exception) -> HTTPException:
+    """503 when no Azure OpenAI backend can serve the request, 429 when it stays throttled"""
+    status_code = 429 if isinstance(error, ThrottledError) else 503
+    return HTTPException(status_code=status_code, detail=str(error),
+                         headers={"Retry-After": str(math.ceil(error.retry_after or 1))})
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
 
 
 @router.post("/", response_model=ChatResponse)
-async def send_message(request: ChatRequest):
+async def send_message(request: ChatRequest, services: ServiceContainer = Depends(get_services)):
     """Send a message and get AI response"""
+    user_message = None
     try:
-        # Create or use existing session
-        session_id = request.session_id
-        if not session_id:
-            # Create new session
-            session = await chat_history_service.create_session()
-            session_id = session.id
+        session_id, user_message, message_history = await _prepare_conversation(request, services.chat_history_service)
         
-        # Create user message
-        user_message = ChatMessage(
-            session_id=session_id,
-            role="user",
-            content=request.message
-        )
-        
-        # Save user message
-        await chat_history_service.save_message(user_message)
-        
-        # Get conversation history for context
-        message_history = await chat_history_service.get_session_messages(session_id)
-        
-        # Generate AI response
-        ai_response_content = await ai_service.generate_response(message_history)
+        # Generate AI response from the token-budgeted context
+        context_messages = await services.context_builder.build(session_id, message_history)
+        try:
+            ai_response_content = await services.ai_service.generate_response(context_messages)
+        except Exception:
+            await _save_turn(services.chat_history_service, user_message)
+            raise
         
         # Create assistant message
         assistant_message = ChatMessage(
@@ -47,13 +92,12 @@ async def send_message(request: ChatRequest):
             content=ai_response_content
         )
         
-        # Save assistant message
-        await chat_history_service.save_message(assistant_message)
+        # Save the turn: both messages commit in one batch
+        await _save_turn(services.chat_history_service, user_message, assistant_message)
         
-        # If this is the first message, generate a title for the session
+        # If this is the first message, generate a title for the session in the background
         if len(message_history) <= 2:  # user + assistant message
-            title = await ai_service.generate_chat_title(request.message)
-            await chat_history_service.update_session(session_id, title=title)
+            services.title_queue.enqueue(session_id, request.message)
         
         return ChatResponse(
             message=ai_response_content,
@@ -61,50 +105,153 @@ async def send_message(request: ChatRequest):
             message_id=assistant_message.id
         )
         
+    except (NoBackendAvailableError, ThrottledError) as e:
+        logger.warning("Azure OpenAI could not answer the chat message: %s", e)
+        raise _upstream_error(e)
+    except Exception as e:
+        logger.error("Error processing chat message: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/stream")
+async def stream_message(request: ChatRequest, services: ServiceContainer = Depends(get_services)):
+    """Send a message and stream the AI response as server-sent events"""
+    start_time = time.perf_counter()
+    try:
+        session_id, user_message, message_history = await _prepare_conversation(request, services.chat_history_service)
     except Exception as e:
-        logger.error(f"Error processing chat message: {e}")
+        logger.error("Error processing chat message: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return StreamingResponse(
+        _stream_events(services, request, session_id, user_message, message_history, start_time),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _stream_events(services: ServiceContainer, request: ChatRequest, session_id: str,
+                         user_message: ChatMessage, message_history: List[ChatMessage],
+                         start_time: float) -> AsyncIterator[str]:
+    """Forward response tokens as they arrive, then persist the turn with the assembled assistant message"""
+    chunks = []
+    time_to_first_token_ms = None
+    saved = False
+    try:
+        yield _sse_event("session", {"session_id": session_id})
+        
+        context_messages = await services.context_builder.build(session_id, message_history)
+        async for token in services.ai_service.stream_response(context_messages):
+            if time_to_first_token_ms is None:
+                time_to_first_token_ms = (time.perf_counter() - start_time) * 1000
+                time_to_first_token_histogram.record(time_to_first_token_ms)
+            chunks.append(token)
+            yield _sse_event("token", {"content": token})
+        
+        # Save the turn once the stream has completed
+        assistant_message = ChatMessage(
+            session_id=session_id,
+            role="assistant",
+            content="".join(chunks)
+        )
+        saved = True
+        await _save_turn(services.chat_history_service, user_message, assistant_message)
+        
+        # If this is the first message, generate a title for the session in the background
+        if len(message_history) <= 2:  # user + assistant message
+            services.title_queue.enqueue(session_id, request.message)
+        
+        total_time_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(
+            "Streamed response for session %s - TTFT: %.1fms - Total: %.1fms",
+            session_id, time_to_first_token_ms or 0, total_time_ms
+        )
+        yield _sse_event("done", {
+            "session_id": session_id,
+            "message_id": assistant_message.id,
+            "time_to_first_token_ms": time_to_first_token_ms,
+            "total_time_ms": total_time_ms
+        })
+        
+    except (NoBackendAvailableError, ThrottledError) as e:
+        logger.warning("Azure OpenAI could not stream the chat message: %s", e)
+        error = _upstream_error(e)
+        yield _sse_event("error", {"detail": error.detail, "status_code": error.status_code,
+                                   "retry_after": int(error.headers["Retry-After"])})
+    except Exception as e:
+        logger.error("Error streaming chat message: %s", e)
+        yield _sse_event("error", {"detail": str(e)})
+    finally:
+        # A failed or abandoned stream still keeps the user message (without a partial reply);
+        # shielded so a client disconnect does not cancel the save
+        if not saved:
+            await asyncio.shield(_save_turn(services.chat_history_service, user_message))
 
 
 @router.get("/sessions", response_model=List[ChatSession])
-async def get_recent_sessions():
-    """Get recent chat sessions"""
+async def get_recent_sessions(
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    continuation: Optional[str] = Query(None, description="Token from the X-Continuation-Token header of the previous page"),
+    chat_history_service: ChatHistoryService = Depends(get_chat_history_service)
+):
+    """Get recent chat sessions, most recently updated first"""
     try:
-        sessions = await chat_history_service.get_recent_sessions()
+        sessions, next_continuation = await chat_history_service.get_recent_sessions(limit, continuation)
+        if next_continuation:
+            response.headers["X-Continuation-Token"] = next_continuation
         return sessions
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error retrieving sessions: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/sessions/{session_id}", response_model=ChatSession)
+async def get_session(session_id: str,
+                      chat_history_service: ChatHistoryService = Depends(get_chat_history_service)):
+    """Get a specific chat session"""
+    try:
+        session = await chat_history_service.get_session(session_id)
     except Exception as e:
-        logger.error(f"Error retrieving sessions: {e}")
+        logger.error("Error retrieving session: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
 
 
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessage])
-async def get_session_messages(session_id: str):
+async def get_session_messages(session_id: str,
+                               chat_history_service: ChatHistoryService = Depends(get_chat_history_service)):
     """Get messages for a specific session"""
     try:
         messages = await chat_history_service.get_session_messages(session_id)
         return messages
     except Exception as e:
-        logger.error(f"Error retrieving session messages: {e}")
+        logger.error("Error retrieving session messages: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/sessions", response_model=ChatSession)
-async def create_new_session():
+async def create_new_session(chat_history_service: ChatHistoryService = Depends(get_chat_history_service)):
     """Create a new chat session"""
     try:
         session = await chat_history_service.create_session()
         return session
     except Exception as e:
-        logger.error(f"Error creating new session: {e}")
+        logger.error("Error creating new session: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/test")
-async def test_ai_service():
+async def test_ai_service(ai_service: AIService = Depends(get_ai_service)):
     """Test AI service connectivity"""
     try:
         test_result = await ai_service.test_connection()
         return test_result
     except Exception as e:
-        logger.error(f"Error testing AI service: {e}")
+        logger.error("Error testing AI service: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from app.dependencies import get_health_monitor
+from app.services.health_service import HealthMonitor
+from app.startup import startup_timer
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("")
+async def health_check(health_monitor: HealthMonitor = Depends(get_health_monitor)):
+    """Health check endpoint (cached dependency state)"""
+    return health_monitor.status()
+
+
+@router.get("/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@router.get("/startup")
+async def startup_report():
+    """Time from process start until ready and connected, broken down by startup phase"""
+    return startup_timer.report()
+
+
+@router.get("/ready")
+async def readiness(health_monitor: HealthMonitor = Depends(get_health_monitor)):
+    """Readiness probe: startup has completed (and dependencies are up, if required)"""
+    status = health_monitor.status()
+    return JSONResponse(
+        status_code=200 if health_monitor.ready else 503,
+        content=jsonable_encoder(status)
+    )
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.telemetry import pipeline_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request and pipeline stage latency percentiles, Cosmos DB RU charge and token usage (Prometheus text format)"""
+    return PlainTextResponse(pipeline_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,50 +1,98 @@
-from fastapi import APIRouter, HTTPException
-from app.models import NetworkTestSummary, NetworkTestResult
+from fastapi import APIRouter, HTTPException, Depends, Query
+from app.models import NetworkTestSummary, NetworkTestResult, NetworkHistorySummary, DnsCheckSummary, DnsResolutionResult
 from app.services.network_service import NetworkTestService
+from app.services.network_monitor import NetworkStatusMonitor
+from app.dependencies import get_network_service, get_network_monitor
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/network", tags=["network"])
 
-# Service instance
-network_service = NetworkTestService()
-
 
 @router.get("/test", response_model=NetworkTestSummary)
-async def run_network_tests():
+async def run_network_tests(
+    refresh: bool = Query(True, description="Run a new sweep (shared with concurrent callers) instead of returning the cached one"),
+    network_monitor: NetworkStatusMonitor = Depends(get_network_monitor)
+):
     """Run comprehensive network connectivity tests"""
     try:
-        test_summary = await network_service.run_connectivity_tests()
+        test_summary = await network_monitor.get_summary(force_refresh=refresh)
         return test_summary
     except Exception as e:
-        logger.error(f"Error running network tests: {e}")
+        logger.error("Error running network tests: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/test/{service_name}", response_model=NetworkTestResult)
-async def test_specific_service(service_name: str):
+async def test_specific_service(service_name: str,
+                                mode: Optional[str] = Query(None, pattern="^(tcp|tls|https)$", description="Probe mode (defaults to NETWORK_PROBE_MODE)"),
+                                network_service: NetworkTestService = Depends(get_network_service)):
     """Test connectivity to a specific Azure service"""
     try:
-        test_result = await network_service.test_specific_service_connectivity(service_name)
+        test_result = await network_service.test_specific_service_connectivity(service_name, mode)
         return test_result
     except Exception as e:
-        logger.error(f"Error testing service {service_name}: {e}")
+        logger.error("Error testing service %s: %s", service_name, e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/history", response_model=NetworkHistorySummary)
+async def get_network_history(
+    window_seconds: Optional[float] = Query(None, gt=0, description="Window to aggregate over (defaults to the status window)"),
+    network_service: NetworkTestService = Depends(get_network_service)
+):
+    """Get latency percentiles, jitter and availability per endpoint from recent sweeps"""
+    return network_service.get_history(window_seconds)
+
+
+@router.get("/dns", response_model=DnsCheckSummary)
+async def check_dns(
+    refresh: bool = Query(False, description="Bypass the resolver cache"),
+    network_service: NetworkTestService = Depends(get_network_service)
+):
+    """Resolve every configured endpoint and verify the answers are private addresses"""
+    try:
+        return await network_service.check_dns(use_cache=not refresh)
+    except Exception as e:
+        logger.error("Error checking DNS: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/dns/{hostname}", response_model=DnsResolutionResult)
+async def resolve_hostname(
+    hostname: str,
+    refresh: bool = Query(False, description="Bypass the resolver cache"),
+    network_service: NetworkTestService = Depends(get_network_service)
+):
+    """Resolve one configured endpoint hostname (A and AAAA) and classify its answers"""
+    # Only the configured endpoints, so the route is not an open resolver
+    if hostname.lower() not in network_service.configured_hostnames():
+        raise HTTPException(status_code=404, detail=f"Unknown hostname: {hostname}")
+    try:
+        return await network_service.resolver.resolve(hostname, use_cache=not refresh)
+    except Exception as e:
+        logger.error("Error resolving %s: %s", hostname, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/status")
-async def get_network_status():
-    """Get quick network status overview"""
+async def get_network_status(
+    refresh: bool = Query(False, description="Run a new sweep instead of serving the cached one"),
+    network_monitor: NetworkStatusMonitor = Depends(get_network_monitor)
+):
+    """Get quick network status overview from the most recent background sweep"""
     try:
-        test_summary = await network_service.run_connectivity_tests()
+        test_summary = await network_monitor.get_summary(force_refresh=refresh)
         
         return {
             "overall_status": test_summary.overall_status,
             "reachable_endpoints": test_summary.reachable_endpoints,
             "total_endpoints": test_summary.total_endpoints,
             "average_response_time_ms": test_summary.average_response_time_ms,
-            "last_test_time": test_summary.last_test_time
+            "last_test_time": test_summary.last_test_time,
+            "age_seconds": network_monitor.age_seconds
         }
     except Exception as e:
-        logger.error(f"Error getting network status: {e}")
+        logger.error("Error getting network status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
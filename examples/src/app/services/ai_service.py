@@ -1,58 +1,363 @@
-from openai import AzureOpenAI
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Mapping, Optional, AsyncIterator, Set, Tuple
+from opentelemetry import metrics
 from app.models import ChatMessage, ChatRequest, ChatResponse
 from app.config import config_manager
+from app.services.completion_cache import CompletionCache, completion_cache, completion_key
+from app.services.openai_backends import (
+    CIRCUIT_OPEN, BackendRouter, OpenAIBackend, backend_latency_histogram, backend_requests_counter,
+    create_backend_router
+)
+from app.services.rate_limiter import AdaptiveRateLimiter, PRIORITY_BACKGROUND, PRIORITY_CHAT, RateLimitTimeoutError
+from app.startup import DeferredModule
+from app.telemetry import instrumented, record_token_usage, stage
+import asyncio
+import httpx
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# The SDK is imported when the clients are created at startup
+openai = DeferredModule("openai")
+
+meter = metrics.get_meter(__name__)
+completion_requests_counter = meter.create_counter(
+    "chat.ai.completion_requests",
+    description="Non-streaming completion requests by outcome (upstream call or coalesced into one in flight)"
+)
+retry_wait_histogram = meter.create_histogram(
+    "chat.ai.retry.wait_time",
+    unit="ms",
+    description="Time each Azure OpenAI request spent in retry backoff and rate limit waits, by outcome"
+)
+
+# Process-wide pooled HTTP transport shared by every Azure OpenAI client
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """Get the pooled HTTP transport used for Azure OpenAI calls"""
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        settings = config_manager.settings
+        _shared_http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.azure_openai_max_connections,
+                max_keepalive_connections=settings.azure_openai_max_keepalive_connections,
+                keepalive_expiry=settings.azure_openai_keepalive_expiry_seconds
+            ),
+            timeout=httpx.Timeout(
+                settings.azure_openai_timeout_seconds,
+                connect=settings.azure_openai_connect_timeout_seconds
+            )
+        )
+    return _shared_http_client
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from Retry-After (or Azure's retry-after-ms), if the response has one"""
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+async def close_shared_http_client():
+    """Close the pooled HTTP transport (call on application shutdown)"""
+    global _shared_http_client
+    if _shared_http_client is not None and not _shared_http_client.is_closed:
+        await _shared_http_client.aclose()
+    _shared_http_client = None
+
+
+class NoBackendAvailableError(RuntimeError):
+    """No backend could serve the request; ``retry_after`` estimates when one can, in seconds"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryDeadlineExceededError(NoBackendAvailableError):
+    """Retrying would wait past the request's retry deadline"""
+
+
+class ThrottledError(RuntimeError):
+    """Azure OpenAI kept throttling the request after the throttle retries"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 
 class AIService:
-    def __init__(self):
+    def __init__(self, cache: Optional[CompletionCache] = completion_cache):
+        settings = config_manager.settings
         self.client = None
-        self._initialize_openai_client()
+        self.router: Optional[BackendRouter] = None
+        self.cache = cache
+        self.max_retries = settings.azure_openai_max_retries
+        self.max_throttle_retries = settings.azure_openai_throttle_retries
+        self.retry_backoff_seconds = settings.azure_openai_retry_backoff_seconds
+        self.retry_deadline_seconds = settings.azure_openai_retry_deadline_seconds
+        self.coalesce_requests = config_manager.settings.azure_openai_coalesce_requests
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+        self._request_slots = asyncio.Semaphore(
+            config_manager.settings.azure_openai_max_concurrent_requests
+        )
+    
+    async def start(self):
+        """Create the clients, importing the SDK on a worker thread to keep the event loop free"""
+        await asyncio.to_thread(self._initialize_openai_client)
     
     def _initialize_openai_client(self):
-        """Initialize Azure OpenAI client"""
+        """Initialize Azure OpenAI clients, one per configured backend"""
         try:
             config_manager.load_azure_config()
-            endpoint = config_manager.settings.azure_openai_endpoint
-            api_key = config_manager.settings.azure_openai_api_key
-            api_version = config_manager.settings.azure_openai_api_version
+            router = create_backend_router(get_shared_http_client())
             
-            if not endpoint or not api_key:
+            if not router.backends:
                 logger.error("Azure OpenAI configuration not available")
                 return
             
-            self.client = AzureOpenAI(
-                azure_endpoint=endpoint,
-                api_key=api_key,
-                api_version=api_version
-            )
-            logger.info("Azure OpenAI client initialized successfully")
+            self.router = router
+            # The first backend's client stands for the service in availability checks
+            self.client = router.backends[0].client
+            logger.info("Azure OpenAI clients initialized for backends: %s", ", ".join(b.name for b in router.backends))
             
         except Exception as e:
-            logger.error(f"Failed to initialize Azure OpenAI client: {e}")
+            logger.error("Failed to initialize Azure OpenAI client: %s", e)
     
+    def refresh_credentials(self):
+        """Rebuild the clients after a Key Vault secret rotation.
+        
+        The new clients share the pooled transport; in-flight requests finish on the
+        previous clients, which are left for garbage collection rather than closed because
+        closing them would close the shared pool. Circuit breakers and rate limiters are
+        kept per backend name, so they carry over.
+        """
+        self._initialize_openai_client()
+    
+    async def _create_completion(self, timeout: float, priority: int = PRIORITY_CHAT, **kwargs):
+        """Call chat completions, sharing one upstream call among concurrent identical requests"""
+        key = completion_key(**kwargs) if self.coalesce_requests else None
+        call = self._inflight.get(key) if key else None
+        if call is None:
+            call = asyncio.ensure_future(self._call_upstream(timeout, priority, **kwargs))
+            if key:
+                self._inflight[key] = call
+            call.add_done_callback(lambda done: self._finish_call(key, done))
+            self.upstream_requests += 1
+            completion_requests_counter.add(1, {"outcome": "upstream"})
+        else:
+            self.coalesced_requests += 1
+            completion_requests_counter.add(1, {"outcome": "coalesced"})
+        # Shielded so one caller going away does not cancel the call for the others
+        return await asyncio.shield(call)
+    
+    def _finish_call(self, key: str, call: asyncio.Future):
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        if not call.cancelled():
+            call.exception()  # Mark retrieved even if every waiter was cancelled
+    
+    async def _call_upstream(self, timeout: float, priority: int, **kwargs):
+        async with self._upstream(timeout, priority, **kwargs) as response:
+            return response
+    
+    @asynccontextmanager
+    async def _upstream(self, timeout: float, priority: int, **kwargs):
+        """Send a chat completion request to a backend once its rate limiter admits it.
+        
+        A 429, connection error or 5xx fails over to another backend not yet tried for
+        this request. Once every available backend has failed, the round is retried:
+        after 429s up to ``azure_openai_throttle_retries`` times (the limiters enforce the
+        Retry-After), otherwise with exponential backoff up to ``azure_openai_max_retries``
+        times. Waiting for backoff and rate limit budget is capped at
+        ``azure_openai_retry_deadline_seconds`` per request: once the next wait would pass
+        the deadline the request fails with RetryDeadlineExceededError instead. The
+        concurrency slot is held until the block exits, so streams keep it while consumed.
+        """
+        estimated_tokens = AdaptiveRateLimiter.estimate_tokens(kwargs["messages"], kwargs.get("max_tokens"))
+        deadline = time.monotonic() + self.retry_deadline_seconds
+        waited = 0.0
+        outcome = "failed"
+        throttles = 0
+        failures = 0
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+        try:
+            while True:
+                backend = self.router.select(exclude=tried)
+                if backend is None and tried:
+                    if isinstance(last_error, openai.RateLimitError):
+                        throttles += 1
+                        if throttles > self.max_throttle_retries:
+                            raise last_error
+                    else:
+                        failures += 1
+                        if failures > self.max_retries:
+                            raise last_error
+                        retry_delay = self.retry_backoff_seconds * 2 ** (failures - 1)
+                        if time.monotonic() + retry_delay > deadline:
+                            outcome = "deadline_exceeded"
+                            raise RetryDeadlineExceededError(
+                                f"Azure OpenAI request failed ({last_error}); retrying would pass the "
+                                f"{self.retry_deadline_seconds:.0f}s retry deadline"
+                            ) from last_error
+                        logger.warning("Azure OpenAI request failed (%s), retrying in %.1fs", last_error, retry_delay)
+                        await asyncio.sleep(retry_delay)
+                        waited += retry_delay
+                    tried.clear()
+                    backend = self.router.select()
+                if backend is None:
+                    if last_error:
+                        raise last_error
+                    raise NoBackendAvailableError("No Azure OpenAI backend available (all circuits open)")
+                if tried:
+                    logger.info("Failing over to Azure OpenAI backend %s", backend.name)
+                tried.add(backend.name)
+                
+                try:
+                    waited += await backend.rate_limiter.acquire(estimated_tokens, priority, deadline)
+                except RateLimitTimeoutError as e:
+                    backend.breaker.release()
+                    outcome = "deadline_exceeded"
+                    raise RetryDeadlineExceededError(
+                        f"Azure OpenAI rate limit budget not available within the "
+                        f"{self.retry_deadline_seconds:.0f}s retry deadline"
+                    ) from (last_error or e)
+                except BaseException:
+                    backend.breaker.release()
+                    raise
+                try:
+                    await self._request_slots.acquire()
+                except BaseException:
+                    # Cancelled while queued for a slot: nothing was sent, so end the breaker's
+                    # dispatch and return the budget taken for it
+                    backend.breaker.release()
+                    backend.rate_limiter.release_unused(estimated_tokens, 0)
+                    raise
+                backend.inflight += 1
+                try:
+                    response, last_error = await self._send(backend, estimated_tokens, timeout, **kwargs)
+                    if response is not None:
+                        outcome = "ok"
+                        yield response
+                        usage = getattr(response, "usage", None)
+                        backend.rate_limiter.release_unused(estimated_tokens, usage.total_tokens if usage else None)
+                        return
+                finally:
+                    backend.inflight -= 1
+                    self._request_slots.release()
+        finally:
+            if outcome == "deadline_exceeded":
+                logger.warning("Azure OpenAI request gave up at its retry deadline after waiting %.1fs", waited)
+            retry_wait_histogram.record(waited * 1000, {"outcome": outcome})
+    
+    async def _send(self, backend: OpenAIBackend, estimated_tokens: int, timeout: float, **kwargs) -> Tuple[Any, Optional[Exception]]:
+        """One attempt against a backend: returns (response, None), or (None, error) for errors worth retrying elsewhere"""
+        backend.requests += 1
+        start_time = time.perf_counter()
+        try:
+            raw = await backend.client.chat.completions.with_raw_response.create(
+                timeout=timeout, **dict(kwargs, model=backend.model_for(kwargs["model"]))
+            )
+        except openai.RateLimitError as e:
+            backend.rate_limiter.throttled(_retry_after(e.response.headers))
+            backend.breaker.release()
+            backend_requests_counter.add(1, {"backend": backend.name, "outcome": "throttled"})
+            return None, e
+        except (openai.APIConnectionError, openai.InternalServerError) as e:
+            backend.rate_limiter.release_unused(estimated_tokens, 0)
+            backend.breaker.record_failure(time.monotonic())
+            backend.record(None, ok=False)
+            backend_requests_counter.add(1, {"backend": backend.name, "outcome": "failure"})
+            logger.warning("Azure OpenAI backend %s failed: %s", backend.name, e)
+            return None, e
+        except BaseException:
+            backend.breaker.release()
+            raise
+        
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        backend.record(latency_ms, ok=True)
+        backend.breaker.record_success()
+        backend_latency_histogram.record(latency_ms, {"backend": backend.name})
+        backend_requests_counter.add(1, {"backend": backend.name, "outcome": "success"})
+        backend.rate_limiter.observe_headers(raw.headers)
+        response = raw.parse()
+        # Streams carry no usage unless requested with stream_options
+        record_token_usage(backend.name, getattr(response, "usage", None))
+        return response, None
+    
+    async def _complete_text(self, timeout: float, priority: int = PRIORITY_CHAT, **kwargs) -> str:
+        """Run a completion and return its text, using the completion cache when the request allows it"""
+        key = self.cache.key_for(**kwargs) if self.cache else None
+        if key:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        response = await self._create_completion(timeout, priority, **kwargs)
+        content = response.choices[0].message.content
+        if key and content:
+            await self.cache.set(key, content)
+        return content
+    
+    @staticmethod
+    def _to_openai_messages(messages: List[ChatMessage]) -> List[Dict[str, str]]:
+        """Convert ChatMessage objects to OpenAI format"""
+        return [{"role": msg.role, "content": msg.content} for msg in messages]
+    
+    def retry_after(self) -> float:
+        """Seconds until some backend is expected to accept requests again (at least 1)"""
+        now = time.monotonic()
+        waits = []
+        for backend in self.router.backends if self.router else []:
+            wait = backend.rate_limiter.blocked_until - now
+            if backend.breaker.state == CIRCUIT_OPEN:
+                wait = max(wait, backend.breaker.opened_at + backend.breaker.reset_seconds - now)
+            waits.append(wait)
+        return max(min(waits, default=0.0), 1.0)
+    
+    def _service_error(self, error: Exception) -> Exception:
+        """The error to raise to callers: throttling and unavailability carry a retry estimate"""
+        if isinstance(error, NoBackendAvailableError):
+            if error.retry_after is None:
+                error.retry_after = self.retry_after()
+            return error
+        if isinstance(error, openai.RateLimitError):
+            retry_after = _retry_after(error.response.headers)
+            return ThrottledError(f"Azure OpenAI is throttling requests: {error}", retry_after or self.retry_after())
+        if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+            return NoBackendAvailableError(f"Azure OpenAI is unavailable: {error}", self.retry_after())
+        return error
+    
+    @instrumented("ai.generate_response")
     async def generate_response(self, messages: List[ChatMessage], deployment_name: str = None) -> str:
-        """Generate AI response using Azure OpenAI"""
+        """Generate AI response using Azure OpenAI
+        
+        Failures are raised once retries are exhausted, so an error is never returned as
+        the model's reply: NoBackendAvailableError (including RetryDeadlineExceededError)
+        when no backend can serve the request, ThrottledError when it stays throttled.
+        """
         if not self.client:
-            return "Sorry, AI service is not available. Please check the configuration."
+            raise NoBackendAvailableError("AI service is not available. Please check the configuration.")
         
         try:
-            # Convert ChatMessage objects to OpenAI format
-            openai_messages = []
-            for msg in messages:
-                openai_messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
+            openai_messages = self._to_openai_messages(messages)
             
             # Use configured deployment name or default
             deployment = deployment_name or config_manager.settings.azure_openai_deployment
             
             # Call Azure OpenAI
-            response = self.client.chat.completions.create(
+            return await self._complete_text(
+                timeout=config_manager.settings.azure_openai_timeout_seconds,
                 model=deployment,
                 messages=openai_messages,
                 max_tokens=1000,
@@ -60,14 +365,63 @@ class AIService:
                 top_p=0.9
             )
             
-            return response.choices[0].message.content
+        except Exception as e:
+            logger.error("Failed to generate AI response: %s", e)
+            error = self._service_error(e)
+            if error is e:
+                raise
+            raise error from e
+    
+    async def stream_response(self, messages: List[ChatMessage], deployment_name: str = None) -> AsyncIterator[str]:
+        """Stream AI response content from Azure OpenAI as tokens arrive
+        
+        Failures are raised (possibly after some tokens were sent) so the caller can report
+        them instead of treating an error message as the model's reply.
+        """
+        if not self.client:
+            raise NoBackendAvailableError("AI service is not available. Please check the configuration.")
+        
+        try:
+            openai_messages = self._to_openai_messages(messages)
+            deployment = deployment_name or config_manager.settings.azure_openai_deployment
+            params = dict(model=deployment, messages=openai_messages, max_tokens=1000, temperature=0.7, top_p=0.9)
+            
+            # A cached answer is sent as a single chunk
+            key = self.cache.key_for(**params) if self.cache else None
+            if key:
+                cached = await self.cache.get(key)
+                if cached is not None:
+                    yield cached
+                    return
+            
+            # Hold the concurrency slot until the stream is fully consumed
+            chunks = []
+            with stage("ai.stream_response"):
+                async with self._upstream(config_manager.settings.azure_openai_timeout_seconds, PRIORITY_CHAT,
+                                          stream=True, **params) as stream:
+                    async for chunk in stream:
+                        # Azure sends content-filter chunks without choices
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            chunks.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+            
+            if key and chunks:
+                await self.cache.set(key, "".join(chunks))
             
         except Exception as e:
-            logger.error(f"Failed to generate AI response: {e}")
-            return f"Sorry, I encountered an error: {str(e)}"
+            logger.error("Failed to stream AI response: %s", e)
+            error = self._service_error(e)
+            if error is e:
+                raise
+            raise error from e
     
-    async def generate_chat_title(self, first_message: str) -> str:
-        """Generate a title for the chat session based on the first message"""
+    @instrumented("ai.generate_title")
+    async def generate_chat_title(self, first_message: str, raise_errors: bool = False) -> str:
+        """Generate a title for the chat session based on the first message
+        
+        With ``raise_errors`` set, failures propagate instead of falling back to "New Chat"
+        so callers can retry.
+        """
         if not self.client:
             return "New Chat"
         
@@ -85,24 +439,57 @@ class AIService:
             
             deployment = config_manager.settings.azure_openai_deployment
             
-            response = self.client.chat.completions.create(
+            content = await self._complete_text(
+                timeout=config_manager.settings.azure_openai_title_timeout_seconds,
+                priority=PRIORITY_BACKGROUND,
                 model=deployment,
                 messages=title_prompt,
                 max_tokens=50,
                 temperature=0.3
             )
             
-            title = response.choices[0].message.content.strip().strip('"')
+            title = content.strip().strip('"')
             return title[:50]  # Limit title length
             
         except Exception as e:
-            logger.error(f"Failed to generate chat title: {e}")
+            if raise_errors:
+                raise
+            logger.error("Failed to generate chat title: %s", e)
             return "New Chat"
     
+    @instrumented("ai.summarize")
+    async def summarize_conversation(self, previous_summary: Optional[str], messages: List[ChatMessage]) -> str:
+        """Fold messages into a rolling conversation summary (raises on failure)"""
+        if not self.client:
+            raise RuntimeError("Azure OpenAI client not initialized")
+        
+        transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+        summary_prompt = [
+            {
+                "role": "system",
+                "content": "You maintain a concise running summary of a conversation. Update the existing summary with the new messages, keeping facts, decisions and open questions the assistant needs to continue. Only return the updated summary."
+            },
+            {
+                "role": "user",
+                "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+            }
+        ]
+        
+        response = await self._create_completion(
+            timeout=config_manager.settings.azure_openai_title_timeout_seconds,
+            priority=PRIORITY_BACKGROUND,
+            model=config_manager.settings.azure_openai_deployment,
+            messages=summary_prompt,
+            max_tokens=config_manager.settings.context_summary_max_tokens,
+            temperature=0.2
+        )
+        return response.choices[0].message.content.strip()
+    
     def is_available(self) -> bool:
         """Check if AI service is available"""
         return self.client is not None
     
+    @instrumented("ai.test_connection")
     async def test_connection(self) -> Dict[str, Any]:
         """Test connection to Azure OpenAI service"""
         if not self.client:
@@ -113,7 +500,8 @@ class AIService:
         
         try:
             # Simple test call
-            response = self.client.chat.completions.create(
+            response = await self._create_completion(
+                timeout=config_manager.settings.azure_openai_test_timeout_seconds,
                 model=config_manager.settings.azure_openai_deployment,
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=10
@@ -123,12 +511,14 @@ class AIService:
                 "status": "success",
                 "message": "Azure OpenAI connection successful",
                 "model": config_manager.settings.azure_openai_deployment,
-                "response_preview": response.choices[0].message.content[:50]
+                "response_preview": response.choices[0].message.content[:50],
+                "backends": self.router.status()
             }
             
         except Exception as e:
-            logger.error(f"Azure OpenAI connection test failed: {e}")
+            logger.error("Azure OpenAI connection test failed: %s", e)
             return {
                 "status": "error", 
-                "message": f"Connection test failed: {str(e)}"
+                "message": f"Connection test failed: {str(e)}",
+                "backends": self.router.status()
             }
\ No newline at end of file
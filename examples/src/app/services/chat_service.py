@@ -1,187 +1,396 @@
-from azure.cosmos import CosmosClient, exceptions
-from typing import List, Optional
-from app.models import ChatMessage, ChatSession
+from typing import List, Optional, Tuple
 from app.config import config_manager
+from app.models import ChatMessage, ChatSession, SessionSummary
+from app.services.cosmos_store import azure_core, cosmos_store, exceptions, partition_keys
+from app.services.history_cache import SessionHistoryCache, session_history_cache
+from app.services.session_feed import recent_sessions_feed, encode_continuation, decode_continuation
+from app.services.write_buffer import create_write_buffer
+from app.telemetry import instrumented
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Newest message of a session, to check cached history against
+_LATEST_MESSAGE_QUERY = (
+    "SELECT TOP @limit c.id FROM c WHERE c.session_id = @session_id AND NOT IS_DEFINED(c.doc_type) "
+    "ORDER BY c.timestamp DESC"
+)
+
 
 class ChatHistoryService:
-    def __init__(self):
-        self.client = None
-        self.database = None
-        self.container = None
-        self._initialize_cosmos_client()
-    
-    def _initialize_cosmos_client(self):
-        """Initialize Cosmos DB client and container"""
+    def __init__(self, cache: Optional[SessionHistoryCache] = session_history_cache):
+        self.store = cosmos_store
+        self.cache = cache
+        self.verify_cache = config_manager.settings.history_cache_verify
+        self.verify_interval_seconds = config_manager.settings.history_cache_verify_interval_seconds
+        self.feed = recent_sessions_feed
+        # Message and session creates are committed in per-session transactional batches
+        self.writer = create_write_buffer(self.store, on_failure=self._on_write_failed)
+    
+    async def _get_container(self):
+        """Get the shared Cosmos DB container (None when Cosmos DB is not configured)"""
+        return await self.store.get_container()
+    
+    async def is_available(self) -> bool:
+        """Check if Cosmos DB is available"""
+        return await self._get_container() is not None
+    
+    async def ping(self) -> bool:
+        """Check that Cosmos DB is reachable with a lightweight container metadata read"""
+        container = await self._get_container()
+        if not container:
+            return False
+        
         try:
-            config_manager.load_azure_config()
-            endpoint = config_manager.settings.cosmos_db_endpoint
-            key = config_manager.settings.cosmos_db_key
-            
-            if not endpoint or not key:
-                logger.warning("Cosmos DB configuration not available. Chat history will not be persisted.")
-                return
-            
-            self.client = CosmosClient(endpoint, key)
-            
-            # Create database if it doesn't exist
-            database_name = config_manager.settings.cosmos_db_database
-            try:
-                self.database = self.client.create_database_if_not_exists(id=database_name)
-                logger.info(f"Connected to Cosmos DB database: {database_name}")
-            except exceptions.CosmosHttpResponseError as e:
-                logger.error(f"Failed to create/access database {database_name}: {e}")
-                return
-            
-            # Create container if it doesn't exist
-            container_name = config_manager.settings.cosmos_db_container
-            try:
-                self.container = self.database.create_container_if_not_exists(
-                    id=container_name,
-                    partition_key="/session_id",
-                    offer_throughput=400
-                )
-                logger.info(f"Connected to Cosmos DB container: {container_name}")
-            except exceptions.CosmosHttpResponseError as e:
-                logger.error(f"Failed to create/access container {container_name}: {e}")
-                
-        except Exception as e:
-            logger.error(f"Failed to initialize Cosmos DB client: {e}")
+            async with self.store.request_slots:
+                await container.read()
+            return True
+        except exceptions.CosmosHttpResponseError as e:
+            logger.warning("Cosmos DB ping failed: %s", e)
+            return False
+    
+    async def close(self):
+        """Commit queued writes (call on application shutdown, before closing the store)"""
+        await self.writer.flush_all()
+        await self.feed.flush()
+    
+    def _on_write_failed(self, session_id: str):
+        # The cached history no longer matches the store
+        if self.cache:
+            self.cache.invalidate(session_id)
     
+    @instrumented("history.save_message")
     async def save_message(self, message: ChatMessage) -> bool:
-        """Save a chat message to Cosmos DB"""
-        if not self.container:
+        """Save a chat message to Cosmos DB through the write buffer
+        
+        Returns once the message is committed, or once it is queued when
+        ``message_write_durable`` is off.
+        """
+        container = await self._get_container()
+        if not container:
             logger.warning("Cosmos DB not available. Message not saved.")
+            # Keep the in-memory history so the conversation still has context
+            if self.cache:
+                self.cache.append(message.session_id, message)
             return False
         
-        try:
-            message_dict = message.dict()
-            message_dict['timestamp'] = message_dict['timestamp'].isoformat()
-            
-            self.container.create_item(message_dict)
-            logger.debug(f"Saved message {message.id} to Cosmos DB")
+        message_dict = message.to_document()
+        
+        # Write-through so the next history read is served from memory, even before a
+        # write-behind batch commits; a failed write invalidates the session instead
+        if self.cache:
+            self.cache.append(message.session_id, message)
+        
+        saved = await self.writer.create(message.session_id, message_dict)
+        if saved:
+            logger.debug("Saved message %s to Cosmos DB", message.id)
+        return saved
+    
+    @instrumented("history.save_messages")
+    async def save_messages(self, messages: List[ChatMessage]) -> bool:
+        """Save messages of one session (e.g. a user message and its reply) in one batch
+        
+        Returns once all of them are committed, or once they are queued when
+        ``message_write_durable`` is off.
+        """
+        if not messages:
             return True
-            
-        except exceptions.CosmosHttpResponseError as e:
-            logger.error(f"Failed to save message to Cosmos DB: {e}")
+        session_id = messages[0].session_id
+        if self.cache:
+            for message in messages:
+                self.cache.append(session_id, message)
+        
+        container = await self._get_container()
+        if not container:
+            logger.warning("Cosmos DB not available. %s messages not saved.", len(messages))
             return False
+        
+        saved = await self.writer.create_many(session_id, [message.to_document() for message in messages])
+        if saved:
+            logger.debug("Saved %s messages to session %s in Cosmos DB", len(messages), session_id)
+        return saved
     
+    @instrumented("history.get_session_messages")
     async def get_session_messages(self, session_id: str, limit: int = 50) -> List[ChatMessage]:
         """Retrieve messages for a specific chat session"""
-        if not self.container:
+        if self.cache:
+            cached_messages = self.cache.get(session_id)
+            if cached_messages is not None:
+                if await self._is_current(session_id, cached_messages):
+                    logger.debug("Retrieved %s cached messages for session %s", len(cached_messages), session_id)
+                    return cached_messages
+                self.cache.discard_stale(session_id)
+        
+        container = await self._get_container()
+        if not container:
             logger.warning("Cosmos DB not available. Returning empty message list.")
             return []
         
         try:
-            query = "SELECT * FROM c WHERE c.session_id = @session_id ORDER BY c.timestamp"
+            # Queued messages must be in the store before it is queried
+            await self.writer.flush(session_id)
+            
+            query = "SELECT * FROM c WHERE c.session_id = @session_id AND NOT IS_DEFINED(c.doc_type) ORDER BY c.timestamp"
             parameters = [{"name": "@session_id", "value": session_id}]
             
-            items = list(self.container.query_items(
-                query=query,
-                parameters=parameters,
-                max_item_count=limit
-            ))
+            # Messages share the session's partition, so this is a single-partition query
+            async with self.store.request_slots:
+                items = [item async for item in container.query_items(
+                    query=query,
+                    parameters=parameters,
+                    partition_key=session_id,
+                    max_item_count=limit
+                )]
             
-            messages = []
-            for item in items:
-                # Convert timestamp back to datetime
-                if isinstance(item['timestamp'], str):
-                    item['timestamp'] = datetime.fromisoformat(item['timestamp'])
-                messages.append(ChatMessage(**item))
+            messages = [ChatMessage.from_document(item) for item in items]
             
-            logger.debug(f"Retrieved {len(messages)} messages for session {session_id}")
+            logger.debug("Retrieved %s messages for session %s", len(messages), session_id)
+            if self.cache:
+                self.cache.put(session_id, messages)
             return messages
             
         except exceptions.CosmosHttpResponseError as e:
-            logger.error(f"Failed to retrieve messages from Cosmos DB: {e}")
+            logger.error("Failed to retrieve messages from Cosmos DB: %s", e)
             return []
     
+    async def _is_current(self, session_id: str, cached_messages: List[ChatMessage]) -> bool:
+        """Check cached history against the newest stored message (a one-item, single-partition query)
+        
+        Only with ``history_cache_verify`` on, and at most once per verify interval per session.
+        """
+        if not self.verify_cache or self.cache.checked_within(session_id, self.verify_interval_seconds):
+            return True
+        container = await self._get_container()
+        if not container:
+            return True
+        
+        try:
+            await self.writer.flush(session_id)
+            async with self.store.request_slots:
+                items = [item async for item in container.query_items(
+                    query=_LATEST_MESSAGE_QUERY,
+                    parameters=[{"name": "@session_id", "value": session_id}, {"name": "@limit", "value": 1}],
+                    partition_key=session_id
+                )]
+        except exceptions.CosmosHttpResponseError as e:
+            logger.warning("Failed to check cached history for session %s: %s", session_id, e)
+            return False
+        
+        latest_id = items[0]["id"] if items else None
+        if latest_id != (cached_messages[-1].id if cached_messages else None):
+            return False
+        self.cache.mark_checked(session_id)
+        return True
+    
+    @instrumented("history.create_session")
     async def create_session(self, title: str = "New Chat") -> ChatSession:
         """Create a new chat session"""
         session = ChatSession(title=title)
         
-        if not self.container:
+        # A new session has no history yet, so its first read can be served from memory
+        if self.cache:
+            self.cache.put(session.id, [])
+        
+        container = await self._get_container()
+        if not container:
             logger.warning("Cosmos DB not available. Session created in memory only.")
             return session
         
         try:
-            session_dict = session.dict()
-            session_dict['created_at'] = session_dict['created_at'].isoformat()
-            session_dict['updated_at'] = session_dict['updated_at'].isoformat()
+            session_dict = session.to_document()
             session_dict['doc_type'] = 'session'  # Distinguish from messages
+            # Store the session in its own conversation partition so it can be point-read
+            session_dict['session_id'] = session.id
+            
+            # Committed right away with durable writes; with write-behind it shares a batch
+            # with the session's first messages when they arrive within the flush interval
+            if await self.writer.create(session.id, session_dict):
+                logger.debug("Created session %s in Cosmos DB", session.id)
             
-            self.container.create_item(session_dict)
-            logger.debug(f"Created session {session.id} in Cosmos DB")
+            # Applied by the feed's writer task, off the request path
+            self.feed.record(container, session)
             
         except exceptions.CosmosHttpResponseError as e:
-            logger.error(f"Failed to save session to Cosmos DB: {e}")
+            logger.error("Failed to save session to Cosmos DB: %s", e)
         
         return session
     
-    async def get_recent_sessions(self, limit: int = 10) -> List[ChatSession]:
-        """Get recent chat sessions"""
-        if not self.container:
+    @instrumented("history.get_recent_sessions")
+    async def get_recent_sessions(self, limit: int = 10,
+                                  continuation: Optional[str] = None) -> Tuple[List[ChatSession], Optional[str]]:
+        """Get a page of recent chat sessions and the continuation token for the next page
+        
+        Pages are read from the materialized recent-sessions feed (one point read). The
+        feed is built from a full query the first time it is missing; pages past the
+        sessions it holds, or all pages if it cannot be used, come from the ORDER BY query
+        with Cosmos continuation tokens.
+        Raises ValueError for a malformed continuation token.
+        """
+        state = decode_continuation(continuation) if continuation else None
+        
+        container = await self._get_container()
+        if not container:
             logger.warning("Cosmos DB not available. Returning empty session list.")
-            return []
+            return [], None
+        
+        if not state or state.get("source") == "feed":
+            try:
+                document = await self.feed.read(container) or await self.feed.build(container)
+                sessions, next_state = self.feed.page(document, limit, state)
+                logger.debug("Retrieved %s recent sessions from feed", len(sessions))
+                return sessions, encode_continuation(next_state) if next_state else None
+            except exceptions.CosmosHttpResponseError as e:
+                logger.error("Failed to read recent sessions feed, falling back to query: %s", e)
+                state = None
         
         try:
-            query = "SELECT * FROM c WHERE c.doc_type = 'session' ORDER BY c.updated_at DESC"
-            
-            items = list(self.container.query_items(
-                query=query,
-                max_item_count=limit
-            ))
-            
-            sessions = []
-            for item in items:
-                # Convert timestamps back to datetime
-                if isinstance(item['created_at'], str):
-                    item['created_at'] = datetime.fromisoformat(item['created_at'])
-                if isinstance(item['updated_at'], str):
-                    item['updated_at'] = datetime.fromisoformat(item['updated_at'])
-                
-                # Remove doc_type before creating ChatSession
-                item.pop('doc_type', None)
-                sessions.append(ChatSession(**item))
+            return await self._query_recent_sessions(container, limit, state)
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error("Failed to retrieve sessions from Cosmos DB: %s", e)
+            return [], None
+    
+    async def _query_recent_sessions(self, container, limit: int,
+                                     state: Optional[dict]) -> Tuple[List[ChatSession], Optional[str]]:
+        """Page through sessions with a cross-partition query, after the feed's last entry if it ended"""
+        query = "SELECT * FROM c WHERE c.doc_type = 'session' ORDER BY c.updated_at DESC"
+        parameters = []
+        after = state.get("after") if state else None
+        if after:
+            # <= so sessions sharing the last entry's timestamp are not skipped; the rest are dropped below
+            query = ("SELECT * FROM c WHERE c.doc_type = 'session' AND c.updated_at <= @updated_at "
+                     "ORDER BY c.updated_at DESC")
+            parameters = [{"name": "@updated_at", "value": after[0]}]
+        
+        pages = container.query_items(query=query, parameters=parameters, max_item_count=limit).by_page(
+            state.get("token") if state else None
+        )
+        async with self.store.request_slots:
+            try:
+                page = await pages.__anext__()
+                items = [item async for item in page]
+            except StopAsyncIteration:
+                items = []
+        
+        if after:
+            items = [item for item in items if (item["updated_at"], item["id"]) < tuple(after)]
+        sessions = [self._session_from_item(item) for item in items]
+        logger.debug("Retrieved %s recent sessions from query", len(sessions))
+        token = pages.continuation_token
+        if not token:
+            return sessions, None
+        return sessions, encode_continuation({"source": "query", "token": token, "after": after})
+    
+    @staticmethod
+    def _session_from_item(item: dict) -> ChatSession:
+        """Convert a stored session document to a ChatSession"""
+        return ChatSession.from_document(item)
+    
+    async def _read_session_item(self, container, session_id: str) -> Tuple[Optional[dict], object]:
+        """Point-read a session document, returning it with the partition key it lives in
+        
+        Sessions are stored in their own partition (session_id == id). Sessions created
+        before that layout have no session_id and live in the empty partition, which is
+        still a single-partition point read.
+        """
+        await self.writer.flush(session_id)
+        for partition_key in (session_id, partition_keys.NonePartitionKeyValue):
+            try:
+                async with self.store.request_slots:
+                    item = await container.read_item(item=session_id, partition_key=partition_key)
+                return item, partition_key
+            except exceptions.CosmosResourceNotFoundError:
+                continue
+        return None, None
+    
+    @instrumented("history.get_session")
+    async def get_session(self, session_id: str) -> Optional[ChatSession]:
+        """Get a chat session by id"""
+        container = await self._get_container()
+        if not container:
+            return None
+        
+        try:
+            session_item, _ = await self._read_session_item(container, session_id)
+            return self._session_from_item(session_item) if session_item else None
             
-            logger.debug(f"Retrieved {len(sessions)} recent sessions")
-            return sessions
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error("Failed to read session %s: %s", session_id, e)
+            return None
+    
+    @instrumented("history.get_session_summary")
+    async def get_session_summary(self, session_id: str) -> Optional[SessionSummary]:
+        """Get the rolling conversation summary stored with a session
+        
+        The returned summary carries the session document's ETag, so passing it back to
+        update_session only succeeds if the session has not changed in the meantime.
+        """
+        container = await self._get_container()
+        if not container:
+            return None
+        
+        try:
+            session_item, _ = await self._read_session_item(container, session_id)
+            if session_item and session_item.get('summary'):
+                return SessionSummary(**session_item['summary'], etag=session_item.get('_etag'))
+            return None
             
         except exceptions.CosmosHttpResponseError as e:
-            logger.error(f"Failed to retrieve sessions from Cosmos DB: {e}")
-            return []
+            logger.error("Failed to read summary for session %s: %s", session_id, e)
+            return None
     
-    async def update_session(self, session_id: str, title: Optional[str] = None) -> bool:
-        """Update a chat session"""
-        if not self.container:
+    @instrumented("history.update_session")
+    async def update_session(self, session_id: str, title: Optional[str] = None,
+                             summary: Optional[SessionSummary] = None,
+                             if_match: Optional[str] = None) -> bool:
+        """Update a chat session with a single partial-document patch
+        
+        If ``if_match`` is an ETag, the patch only applies when the stored session
+        still has that ETag (optimistic concurrency); otherwise it returns False.
+        """
+        container = await self._get_container()
+        if not container:
             return False
-            
+        
+        patch_operations = []
+        # Summary refreshes are not user activity and do not reorder recent sessions
+        if title or not summary:
+            patch_operations.append({"op": "set", "path": "/updated_at", "value": datetime.utcnow().isoformat()})
+        if title:
+            patch_operations.append({"op": "set", "path": "/title", "value": title})
+        if summary:
+            patch_operations.append({"op": "set", "path": "/summary", "value": summary.model_dump()})
+        
+        conditions = {}
+        if if_match:
+            conditions = {"etag": if_match, "match_condition": azure_core.MatchConditions.IfNotModified}
+        
         try:
-            # First, get the existing session
-            query = "SELECT * FROM c WHERE c.id = @session_id AND c.doc_type = 'session'"
-            parameters = [{"name": "@session_id", "value": session_id}]
-            
-            items = list(self.container.query_items(query=query, parameters=parameters))
-            if not items:
-                logger.warning(f"Session {session_id} not found")
-                return False
+            # A newly created session may still be queued
+            await self.writer.flush(session_id)
+            for partition_key in (session_id, partition_keys.NonePartitionKeyValue):
+                try:
+                    async with self.store.request_slots:
+                        session_item = await container.patch_item(
+                            item=session_id,
+                            partition_key=partition_key,
+                            patch_operations=patch_operations,
+                            **conditions
+                        )
+                    logger.debug("Updated session %s", session_id)
+                    
+                    if title or not summary:
+                        self.feed.record(container, self._session_from_item(session_item))
+                    return True
+                except exceptions.CosmosResourceNotFoundError:
+                    continue
             
-            session_item = items[0]
-            
-            # Update fields
-            if title:
-                session_item['title'] = title
-            session_item['updated_at'] = datetime.utcnow().isoformat()
-            
-            # Replace the item
-            self.container.replace_item(session_item, session_item)
-            logger.debug(f"Updated session {session_id}")
-            return True
+            logger.warning("Session %s not found", session_id)
+            return False
             
+        except exceptions.CosmosAccessConditionFailedError:
+            logger.info("Session %s changed since it was read, update skipped", session_id)
+            return False
         except exceptions.CosmosHttpResponseError as e:
-            logger.error(f"Failed to update session {session_id}: {e}")
+            logger.error("Failed to update session %s: %s", session_id, e)
             return False
\ No newline at end of file
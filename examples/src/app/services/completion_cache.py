@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+from app.config import config_manager
+from app.telemetry import pipeline_metrics
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def completion_key(model: str, messages: List[Dict[str, str]], **params: Any) -> str:
+    """Hash of a completion request with message whitespace and Unicode normalized"""
+    normalized = [
+        {"role": m["role"], "content": " ".join(unicodedata.normalize("NFC", m["content"]).split())}
+        for m in messages
+    ]
+    payload = json.dumps({"model": model, "messages": normalized, "params": params},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class InMemoryCompletionBackend:
+    """Per-process LRU/TTL store for completion text"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        self._entries[key] = (value, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def close(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCompletionBackend:
+    """Completion store shared by all replicas through Redis (or a compatible server).
+
+    Entries expire through Redis TTLs; size is bounded by the server's maxmemory policy.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "completion:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:  # pragma: no cover - redis is only needed for the redis backend
+            raise RuntimeError("The redis package is required for the redis completion cache backend")
+        self.key_prefix = key_prefix
+        self._client = redis.from_url(url, protocol=2)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._client.get(self.key_prefix + key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        await self._client.set(self.key_prefix + key, value, px=int(ttl_seconds * 1000))
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class CompletionCache:
+    """Opt-in cache of completion text for repeated prompts.
+
+    Keys hash the deployment, the sampling parameters and the messages with whitespace
+    and Unicode normalized, so trivially different copies of a prompt share an entry.
+    Requests sampled above ``max_temperature`` bypass the cache because their answers are
+    meant to vary. Backend failures count as misses; caching never fails a request.
+    """
+
+    def __init__(self, backend, ttl_seconds: float, max_temperature: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.errors = 0
+
+    def key_for(self, model: str, messages: List[Dict[str, str]], **params: Any) -> Optional[str]:
+        """Cache key for a completion request, or None if the request must not be cached"""
+        temperature = params.get("temperature", 1.0)
+        if temperature is None or temperature > self.max_temperature:
+            self.bypasses += 1
+            return None
+        return completion_key(model, messages, **params)
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Completion cache read failed: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        try:
+            await self.backend.set(key, value, self.ttl_seconds)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Completion cache write failed: %s", e)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, object]:
+        """Hit ratio and bypass/error counters"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "bypasses": self.bypasses,
+            "errors": self.errors
+        }
+
+
+def _create_completion_cache() -> Optional[CompletionCache]:
+    settings = config_manager.settings
+    if not settings.completion_cache_enabled:
+        return None
+    if settings.completion_cache_backend == "redis":
+        backend = RedisCompletionBackend(settings.completion_cache_redis_url)
+    else:
+        backend = InMemoryCompletionBackend(settings.completion_cache_max_entries)
+    return CompletionCache(
+        backend,
+        ttl_seconds=settings.completion_cache_ttl_seconds,
+        max_temperature=settings.completion_cache_max_temperature
+    )
+
+
+# Global cache instance shared by all AIService instances
+completion_cache = _create_completion_cache()
+if completion_cache:
+    pipeline_metrics.register_stats("completion_cache", completion_cache.stats)
+
+
+def _observe_lookups(options: CallbackOptions):
+    if completion_cache:
+        yield Observation(completion_cache.hits, {"result": "hit"})
+        yield Observation(completion_cache.misses, {"result": "miss"})
+        yield Observation(completion_cache.bypasses, {"result": "bypass"})
+
+
+meter = metrics.get_meter(__name__)
+meter.create_observable_counter(
+    "chat.completion_cache.lookups",
+    callbacks=[_observe_lookups],
+    description="Completion cache lookups by result (bypass = not cacheable)"
+)
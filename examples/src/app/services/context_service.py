@@ -0,0 +1,217 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.models import ChatMessage, SessionSummary
+from app.config import config_manager
+from app.services.ai_service import AIService
+from app.services.chat_service import ChatHistoryService
+from app.telemetry import instrumented
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tokens added by the chat format around each message (role, separators)
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+# Average characters per token, used when no tokenizer encoding is available
+_CHARS_PER_TOKEN = 4
+
+
+def _get_encoding(encoding_name: str):
+    # tiktoken is optional and slow to import, so it is imported here, on a worker thread
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
+
+
+class TokenCounter:
+    """Counts message tokens, caching counts per message id.
+
+    Uses tiktoken when the encoding can be loaded. tiktoken downloads encoding files on
+    first use, which fails in locked-down networks (set TIKTOKEN_CACHE_DIR to a
+    pre-populated directory there), so counts fall back to a character-based estimate
+    until ``load_encoding`` succeeds.
+    """
+
+    def __init__(self, encoding_name: str, max_cached_messages: int):
+        self.encoding_name = encoding_name
+        self.max_cached_messages = max_cached_messages
+        self._encoding = None
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+
+    async def load_encoding(self) -> bool:
+        """Load the tokenizer encoding off the event loop"""
+        if self._encoding is not None:
+            return True
+
+        try:
+            self._encoding = await asyncio.to_thread(_get_encoding, self.encoding_name)
+            # Drop estimates made before the encoding was available
+            self._counts.clear()
+            logger.info("Loaded tokenizer encoding %s", self.encoding_name)
+            return True
+        except ModuleNotFoundError as e:
+            if e.name != "tiktoken":
+                raise
+            logger.info("tiktoken not installed, estimating token counts from message length")
+            return False
+        except Exception as e:
+            logger.warning("Failed to load tokenizer encoding %s, estimating token counts: %s", self.encoding_name, e)
+            return False
+
+    def count_text(self, text: str) -> int:
+        """Count tokens in a piece of text"""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // _CHARS_PER_TOKEN + 1
+
+    def count_message(self, message: ChatMessage) -> int:
+        """Count tokens for a chat message, including per-message formatting overhead"""
+        count = self._counts.get(message.id)
+        if count is not None:
+            self._counts.move_to_end(message.id)
+            return count
+
+        count = self.count_text(message.content) + _MESSAGE_OVERHEAD_TOKENS
+        self._counts[message.id] = count
+        if len(self._counts) > self.max_cached_messages:
+            self._counts.popitem(last=False)
+        return count
+
+
+class ContextWindowBuilder:
+    """Assembles the prompt context for a session within a token budget.
+
+    The newest messages are kept while they fit in ``context_max_tokens``; the newest
+    message is always kept. When rolling summaries are enabled, older turns that no
+    longer fit are folded into a per-session summary in the background, and the latest
+    summary is sent as a system message in their place.
+    """
+
+    def __init__(self, ai_service: AIService, chat_history_service: ChatHistoryService,
+                 token_counter: Optional[TokenCounter] = None):
+        settings = config_manager.settings
+        self.ai_service = ai_service
+        self.chat_history_service = chat_history_service
+        self.token_counter = token_counter or TokenCounter(
+            settings.context_token_encoding,
+            settings.context_token_cache_size
+        )
+        self.max_tokens = settings.context_max_tokens
+        self.summary_enabled = settings.context_summary_enabled
+        self._summaries: "OrderedDict[str, SessionSummary]" = OrderedDict()
+        self._max_cached_summaries = settings.history_cache_max_sessions
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+        self._encoding_task: Optional[asyncio.Task] = None
+
+    @instrumented("context.build")
+    async def build(self, session_id: str, messages: List[ChatMessage]) -> List[ChatMessage]:
+        """Select the messages (and summary) to send for the next completion"""
+        summary = await self._get_summary(session_id) if self.summary_enabled else None
+        budget = self.max_tokens
+        if summary:
+            budget -= self.token_counter.count_text(summary.content) + _MESSAGE_OVERHEAD_TOKENS
+
+        # Walk back from the newest message while it fits
+        start = len(messages)
+        used_tokens = 0
+        while start > 0:
+            message_tokens = self.token_counter.count_message(messages[start - 1])
+            if used_tokens + message_tokens > budget and start < len(messages):
+                break
+            used_tokens += message_tokens
+            start -= 1
+
+        context = messages[start:]
+        dropped = messages[:start]
+        if dropped:
+            logger.debug("Context for session %s: kept %s messages (%s tokens), dropped %s",
+                         session_id, len(context), used_tokens, len(dropped))
+
+        if not self.summary_enabled:
+            return context
+
+        unsummarized = self._unsummarized(messages, start, summary)
+        if unsummarized:
+            self._schedule_summary_update(session_id, summary, unsummarized)
+
+        if summary:
+            context = [ChatMessage(
+                session_id=session_id,
+                role="system",
+                content=f"Summary of the earlier conversation: {summary.content}"
+            )] + context
+        return context
+
+    def start(self):
+        """Load the tokenizer in the background (requires a running event loop)"""
+        self._encoding_task = asyncio.create_task(self.token_counter.load_encoding())
+
+    async def stop(self):
+        """Cancel in-flight summary updates"""
+        tasks = list(self._summary_tasks.values())
+        if self._encoding_task:
+            tasks.append(self._encoding_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._summary_tasks.clear()
+
+    async def _get_summary(self, session_id: str) -> Optional[SessionSummary]:
+        if session_id in self._summaries:
+            self._summaries.move_to_end(session_id)
+            return self._summaries[session_id]
+
+        summary = await self.chat_history_service.get_session_summary(session_id)
+        self._remember_summary(session_id, summary)
+        return summary
+
+    def _remember_summary(self, session_id: str, summary: Optional[SessionSummary]):
+        self._summaries[session_id] = summary
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self._max_cached_summaries:
+            self._summaries.popitem(last=False)
+
+    @staticmethod
+    def _unsummarized(messages: List[ChatMessage], start: int,
+                      summary: Optional[SessionSummary]) -> List[ChatMessage]:
+        """Messages before ``start`` (dropped from the context) that the summary does not cover yet"""
+        if summary:
+            for index, message in enumerate(messages):
+                if message.id == summary.through_message_id:
+                    return messages[index + 1:start]
+        # No summary yet, or it covers messages older than the loaded history
+        return messages[:start]
+
+    def _schedule_summary_update(self, session_id: str, summary: Optional[SessionSummary],
+                                 messages: List[ChatMessage]):
+        if session_id in self._summary_tasks:
+            return
+        task = asyncio.create_task(self._update_summary(session_id, summary, messages))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+
+    @instrumented("context.update_summary")
+    async def _update_summary(self, session_id: str, summary: Optional[SessionSummary],
+                              messages: List[ChatMessage]):
+        """Fold newly dropped messages into the rolling summary"""
+        try:
+            content = await self.ai_service.summarize_conversation(
+                summary.content if summary else None,
+                messages
+            )
+            new_summary = SessionSummary(content=content, through_message_id=messages[-1].id)
+            stored = await self.chat_history_service.update_session(
+                session_id,
+                summary=new_summary,
+                if_match=summary.etag if summary else None
+            )
+            if stored:
+                logger.debug("Folded %s messages into summary for session %s", len(messages), session_id)
+            if await self.chat_history_service.is_available():
+                # Re-read next turn (one point read) to pick up the stored summary and its new
+                # ETag, or the summary that won a concurrent update
+                self._summaries.pop(session_id, None)
+            else:
+                self._remember_summary(session_id, new_summary)
+        except Exception as e:
+            logger.error("Failed to update summary for session %s: %s", session_id, e)
@@ -0,0 +1,144 @@
+from typing import TYPE_CHECKING, List, Optional
+from app.config import config_manager
+from app.startup import DeferredModule, import_modules
+from app.telemetry import record_cosmos_response
+import asyncio
+import logging
+
+if TYPE_CHECKING:
+    from azure.cosmos.aio import CosmosClient, ContainerProxy
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# SDK modules named by the data-access services; they are imported with the client at startup
+exceptions = DeferredModule("azure.cosmos.exceptions")
+partition_keys = DeferredModule("azure.cosmos.partition_key")
+azure_core = DeferredModule("azure.core")
+
+
+class CosmosStore:
+    """Process-wide async Cosmos DB client shared by all data-access services.
+
+    The client, its aiohttp connection pool and the container handle are created once
+    on first use and reused by every request. ``request_slots`` bounds the number of
+    concurrent Cosmos round trips issued from this worker.
+    """
+
+    def __init__(self):
+        self.client: Optional["CosmosClient"] = None
+        self.database = None
+        self.container: Optional["ContainerProxy"] = None
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._retired_clients: List["CosmosClient"] = []
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
+        self.request_slots = asyncio.Semaphore(
+            config_manager.settings.cosmos_db_max_concurrent_requests
+        )
+
+    async def get_container(self) -> Optional["ContainerProxy"]:
+        """Get the chat history container, initializing the shared client on first use"""
+        if not self._initialized:
+            async with self._init_lock:
+                if not self._initialized:
+                    await self._initialize()
+                    self._initialized = True
+        return self.container
+
+    async def _initialize(self):
+        """Initialize Cosmos DB client and container"""
+        try:
+            config_manager.load_azure_config()
+            settings = config_manager.settings
+            endpoint = settings.cosmos_db_endpoint
+            key = settings.cosmos_db_key
+
+            if not endpoint or not key:
+                logger.warning("Cosmos DB configuration not available. Chat history will not be persisted.")
+                return
+
+            # Imported on first use rather than with the app: the SDK and aiohttp are slow to import
+            await import_modules("azure.cosmos.aio", "azure.core.pipeline.transport", "aiohttp")
+            from azure.cosmos import PartitionKey
+            from azure.cosmos.aio import CosmosClient
+            from azure.core.pipeline.transport import AioHttpTransport
+            import aiohttp
+
+            # Pooled keep-alive connections reused across requests (and credential rotations)
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=settings.cosmos_db_max_connections,
+                        ttl_dns_cache=300
+                    )
+                )
+            self.client = CosmosClient(
+                endpoint,
+                key,
+                transport=AioHttpTransport(session=self._session, session_owner=False),
+                raw_response_hook=record_cosmos_response
+            )
+
+            # Create database if it doesn't exist
+            database_name = settings.cosmos_db_database
+            try:
+                self.database = await self.client.create_database_if_not_exists(id=database_name)
+                logger.info("Connected to Cosmos DB database: %s", database_name)
+            except exceptions.CosmosHttpResponseError as e:
+                logger.error("Failed to create/access database %s: %s", database_name, e)
+                return
+
+            # Create container if it doesn't exist
+            container_name = settings.cosmos_db_container
+            try:
+                self.container = await self.database.create_container_if_not_exists(
+                    id=container_name,
+                    partition_key=PartitionKey(path="/session_id"),
+                    offer_throughput=400
+                )
+                logger.info("Connected to Cosmos DB container: %s", container_name)
+            except exceptions.CosmosHttpResponseError as e:
+                logger.error("Failed to create/access container %s: %s", container_name, e)
+
+        except Exception as e:
+            logger.error("Failed to initialize Cosmos DB client: %s", e)
+
+    def use_container(self, container):
+        """Serve every request from the given container instead of connecting (load tests, local runs)"""
+        self.container = container
+        self._initialized = True
+
+    async def refresh_credentials(self):
+        """Reconnect with rotated Key Vault credentials on next use.
+        
+        Requests already holding the old container handle finish on the previous client,
+        which is closed on shutdown.
+        """
+        async with self._init_lock:
+            if self.client is not None:
+                self._retired_clients.append(self.client)
+            self.client = None
+            self.database = None
+            self.container = None
+            self._initialized = False
+        logger.info("Cosmos DB credentials changed, reconnecting on next request")
+
+    async def close(self):
+        """Close the client and its connection pool (call on application shutdown)"""
+        for client in self._retired_clients:
+            await client.close()
+        self._retired_clients.clear()
+        if self.client is not None:
+            await self.client.close()
+        if self._session is not None:
+            await self._session.close()
+        self.client = None
+        self.database = None
+        self.container = None
+        self._session = None
+        self._initialized = False
+
+
+# Global store instance
+cosmos_store = CosmosStore()
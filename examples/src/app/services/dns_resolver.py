@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.config import config_manager
+from app.models import DnsResolutionResult
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DnsResolver:
+    """Resolves hostnames to their full A/AAAA answer sets with a TTL-respecting cache.
+
+    With dnspython installed (imported on the first lookup), answers are cached for the record TTL (capped by
+    ``dns_cache_max_ttl_seconds``) and report the canonical name, which shows whether a
+    name went through its ``privatelink`` CNAME. Without it, the system resolver is used
+    and answers are cached for ``dns_cache_ttl_seconds``. Failed lookups are cached
+    briefly so a broken name is not re-queried by every probe.
+    """
+
+    def __init__(self):
+        settings = config_manager.settings
+        self.default_ttl_seconds = settings.dns_cache_ttl_seconds
+        self.max_ttl_seconds = settings.dns_cache_max_ttl_seconds
+        self.negative_ttl_seconds = settings.dns_negative_cache_ttl_seconds
+        self.max_entries = settings.dns_cache_max_entries
+        self.private_networks = [ipaddress.ip_network(cidr) for cidr in settings.dns_private_cidrs]
+        self._cache: "OrderedDict[str, Tuple[float, DnsResolutionResult]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._resolver = None
+        self._resolver_ready: Optional[asyncio.Future] = None
+
+    async def resolve(self, hostname: str, use_cache: bool = True) -> DnsResolutionResult:
+        """Resolve a hostname, serving unexpired answers from the cache"""
+        hostname = hostname.lower().rstrip(".")
+        if use_cache:
+            cached = self._cache.get(hostname)
+            if cached:
+                expires_at, result = cached
+                remaining = expires_at - time.monotonic()
+                if remaining > 0:
+                    self._cache.move_to_end(hostname)
+                    return result.model_copy(update={"cached": True, "ttl_seconds": remaining})
+                del self._cache[hostname]
+
+        # Concurrent lookups of the same name share one query
+        task = self._inflight.get(hostname)
+        if task is None:
+            task = asyncio.create_task(self._lookup(hostname))
+            self._inflight[hostname] = task
+            task.add_done_callback(lambda _: self._inflight.pop(hostname, None))
+        return await asyncio.shield(task)
+
+    def is_private(self, address: str) -> bool:
+        """Whether an address falls inside the configured private ranges"""
+        ip = ipaddress.ip_address(address)
+        return any(ip in network for network in self.private_networks)
+
+    def clear(self):
+        self._cache.clear()
+
+    @staticmethod
+    def _is_address(hostname: str) -> bool:
+        try:
+            ipaddress.ip_address(hostname)
+            return True
+        except ValueError:
+            return False
+
+    async def _lookup(self, hostname: str) -> DnsResolutionResult:
+        start_time = time.perf_counter()
+        if self._is_address(hostname):
+            result = DnsResolutionResult(hostname=hostname, resolver="literal", addresses=[hostname])
+        elif await self._get_resolver() is not None:
+            result = await self._lookup_dnspython(hostname)
+            if not result.addresses:
+                # Names only in the hosts file (or other NSS sources) are invisible to DNS queries
+                system_result = await self._lookup_system(hostname)
+                if system_result.addresses:
+                    result = system_result
+        else:
+            result = await self._lookup_system(hostname)
+        result.resolution_time_ms = (time.perf_counter() - start_time) * 1000
+
+        if result.addresses:
+            private = [a for a in result.addresses if self.is_private(a)]
+            result.private_addresses = private
+            result.is_private = len(private) == len(result.addresses)
+            ttl = min(result.ttl_seconds, self.max_ttl_seconds) if result.ttl_seconds is not None else self.default_ttl_seconds
+        else:
+            ttl = self.negative_ttl_seconds
+        result.ttl_seconds = ttl
+
+        self._cache[hostname] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(hostname)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return result
+
+    async def _get_resolver(self):
+        """The dnspython resolver, or None without dnspython; created on a worker thread on first use"""
+        if self._resolver_ready is None:
+            self._resolver_ready = asyncio.ensure_future(asyncio.to_thread(self._create_resolver))
+        await asyncio.shield(self._resolver_ready)
+        return self._resolver
+
+    def _create_resolver(self):
+        try:
+            import dns.asyncresolver
+            import dns.resolver
+        except ImportError:  # pragma: no cover - dnspython is optional
+            return
+        try:
+            self._resolver = dns.asyncresolver.Resolver()
+        except dns.resolver.NoResolverConfiguration as e:
+            logger.warning("No DNS resolver configuration, using the system resolver: %s", e)
+
+    async def _lookup_dnspython(self, hostname: str) -> DnsResolutionResult:
+        answers = await asyncio.gather(
+            self._resolver.resolve(hostname, "A"),
+            self._resolver.resolve(hostname, "AAAA"),
+            return_exceptions=True
+        )
+        result = DnsResolutionResult(hostname=hostname, resolver="dnspython")
+        errors = []
+        for answer in answers:
+            if isinstance(answer, BaseException):
+                errors.append(str(answer) or answer.__class__.__name__)
+                continue
+            result.addresses.extend(rdata.address for rdata in answer)
+            result.canonical_name = answer.canonical_name.to_text(omit_final_dot=True)
+            ttl = answer.rrset.ttl
+            result.ttl_seconds = ttl if result.ttl_seconds is None else min(result.ttl_seconds, ttl)
+        if not result.addresses:
+            result.error_message = f"DNS resolution failed: {', '.join(dict.fromkeys(errors))}"
+        return result
+
+    async def _lookup_system(self, hostname: str) -> DnsResolutionResult:
+        result = DnsResolutionResult(hostname=hostname, resolver="system")
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            result.error_message = f"DNS resolution failed: {str(e)}"
+            return result
+        result.addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        return result
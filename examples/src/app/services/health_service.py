@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from app.config import config_manager
+from app.services.ai_service import AIService
+from app.services.chat_service import ChatHistoryService
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Checks dependency health in the background and caches the result.
+
+    Probe endpoints only read the cached state, so liveness and readiness checks never
+    construct clients or make network calls.
+    """
+
+    def __init__(self, ai_service: AIService, chat_history_service: ChatHistoryService):
+        settings = config_manager.settings
+        self.ai_service = ai_service
+        self.chat_history_service = chat_history_service
+        self.interval_seconds = settings.health_check_interval_seconds
+        self.require_dependencies = settings.health_require_dependencies
+        self.background_startup = settings.startup_background_init
+        self.started = False
+        self.ai_service_available = False
+        self.cosmos_db_available = False
+        self.last_checked: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Run the first check, then keep checking in the background"""
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+        self.started = True
+
+    async def stop(self):
+        self.started = False
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self):
+        """Re-check dependencies and update the cached state"""
+        self.ai_service_available = self.ai_service.is_available()
+        try:
+            self.cosmos_db_available = await self.chat_history_service.ping()
+        except Exception as e:
+            logger.warning("Cosmos DB health check failed: %s", e)
+            self.cosmos_db_available = False
+        self.last_checked = datetime.utcnow()
+
+    @property
+    def dependencies_available(self) -> bool:
+        return self.ai_service_available and self.cosmos_db_available
+
+    @property
+    def ready(self) -> bool:
+        """Ready to serve traffic; dependency outages only count when configured to"""
+        if not self.started:
+            # With background startup, traffic is accepted while the clients are being created
+            return self.background_startup and not self.require_dependencies
+        return self.dependencies_available or not self.require_dependencies
+
+    def status(self) -> Dict[str, Any]:
+        """Cached health state"""
+        return {
+            "status": "healthy" if self.dependencies_available else "degraded",
+            "ready": self.ready,
+            "app_name": config_manager.settings.app_name,
+            "ai_service_available": self.ai_service_available,
+            "cosmos_db_available": self.cosmos_db_available,
+            "last_checked": self.last_checked
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.refresh()
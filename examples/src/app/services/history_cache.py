@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+from app.models import ChatMessage
+from app.config import config_manager
+from app.telemetry import pipeline_metrics
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-message overhead (model object, ids, timestamp) on top of the content
+_MESSAGE_OVERHEAD_BYTES = 256
+
+
+class _CacheEntry:
+    __slots__ = ("messages", "size_bytes", "expires_at", "checked_at")
+
+    def __init__(self, messages: List[ChatMessage], size_bytes: int, expires_at: float, checked_at: float):
+        self.messages = messages
+        self.size_bytes = size_bytes
+        self.expires_at = expires_at
+        self.checked_at = checked_at
+
+
+def _message_size(message: ChatMessage) -> int:
+    return _MESSAGE_OVERHEAD_BYTES + len(message.content)
+
+
+class SessionHistoryCache:
+    """In-process LRU/TTL cache of conversation history keyed by session id.
+
+    Bounded by session count and approximate memory use. Entries expire ``ttl_seconds``
+    after they were last written. Other replicas and workers do not update this cache, so
+    without session affinity callers check a hit against the store (see
+    ``ChatHistoryService``), record it with ``mark_checked`` and drop stale entries with
+    ``discard_stale``. All operations are synchronous and run on the event
+    loop, so no locking is needed.
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, ttl_seconds: float):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions: Dict[str, int] = {"expired": 0, "stale": 0, "session_limit": 0, "memory_limit": 0}
+
+    def get(self, session_id: str) -> Optional[List[ChatMessage]]:
+        """Get cached history for a session, or None on a miss"""
+        entry = self._entries.get(session_id)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(session_id, "expired")
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(session_id)
+        return list(entry.messages)
+
+    def put(self, session_id: str, messages: List[ChatMessage]):
+        """Cache the full history of a session, replacing any existing entry"""
+        if session_id in self._entries:
+            self._remove(session_id)
+
+        now = time.monotonic()
+        entry = _CacheEntry(
+            messages=list(messages),
+            size_bytes=sum(_message_size(m) for m in messages),
+            expires_at=now + self.ttl_seconds,
+            checked_at=now
+        )
+        self._entries[session_id] = entry
+        self._total_bytes += entry.size_bytes
+        self._enforce_limits()
+
+    def append(self, session_id: str, message: ChatMessage) -> bool:
+        """Write-through a new message to a cached session; returns False if the session is not cached"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return False
+
+        if any(m.id == message.id for m in entry.messages):
+            return True
+
+        entry.messages.append(message)
+        size = _message_size(message)
+        entry.size_bytes += size
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        self._total_bytes += size
+        self._entries.move_to_end(session_id)
+        self._enforce_limits()
+        return True
+
+    def checked_within(self, session_id: str, seconds: float) -> bool:
+        """Whether the session's history was loaded from or checked against the store in the last ``seconds``"""
+        entry = self._entries.get(session_id)
+        return entry is not None and time.monotonic() - entry.checked_at < seconds
+
+    def mark_checked(self, session_id: str):
+        """Record that the cached history was found to match the store"""
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.checked_at = time.monotonic()
+
+    def discard_stale(self, session_id: str):
+        """Drop a session whose cached history was found out of date, counting the hit as a miss"""
+        if session_id in self._entries:
+            self._remove(session_id, "stale")
+            self.hits -= 1
+            self.misses += 1
+
+    def invalidate(self, session_id: str):
+        """Drop a session from the cache"""
+        if session_id in self._entries:
+            self._remove(session_id)
+
+    @property
+    def size_bytes(self) -> int:
+        """Approximate memory held by cached history"""
+        return self._total_bytes
+
+    def stats(self) -> Dict[str, object]:
+        """Cache size, hit ratio and eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "evictions": dict(self.evictions)
+        }
+
+    def _remove(self, session_id: str, reason: Optional[str] = None):
+        entry = self._entries.pop(session_id)
+        self._total_bytes -= entry.size_bytes
+        if reason:
+            self.evictions[reason] += 1
+            logger.debug("Evicted session %s from history cache (%s)", session_id, reason)
+
+    def _enforce_limits(self):
+        while len(self._entries) > self.max_sessions:
+            self._remove(next(iter(self._entries)), "session_limit")
+        # Always keep the most recently used session, even if it alone exceeds the limit
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)), "memory_limit")
+
+
+def _create_history_cache() -> Optional[SessionHistoryCache]:
+    settings = config_manager.settings
+    if not settings.history_cache_enabled:
+        return None
+    return SessionHistoryCache(
+        max_sessions=settings.history_cache_max_sessions,
+        max_bytes=settings.history_cache_max_bytes,
+        ttl_seconds=settings.history_cache_ttl_seconds
+    )
+
+
+# Global cache instance shared by all ChatHistoryService instances
+session_history_cache = _create_history_cache()
+if session_history_cache:
+    pipeline_metrics.register_stats("history_cache", session_history_cache.stats)
+
+
+def _observe_lookups(options: CallbackOptions):
+    if session_history_cache:
+        yield Observation(session_history_cache.hits, {"result": "hit"})
+        yield Observation(session_history_cache.misses, {"result": "miss"})
+
+
+def _observe_evictions(options: CallbackOptions):
+    if session_history_cache:
+        for reason, count in session_history_cache.evictions.items():
+            yield Observation(count, {"reason": reason})
+
+
+def _observe_size(options: CallbackOptions):
+    if session_history_cache:
+        yield Observation(session_history_cache.size_bytes)
+
+
+meter = metrics.get_meter(__name__)
+meter.create_observable_counter(
+    "chat.history_cache.lookups",
+    callbacks=[_observe_lookups],
+    description="Conversation history cache lookups by result"
+)
+meter.create_observable_counter(
+    "chat.history_cache.evictions",
+    callbacks=[_observe_evictions],
+    description="Conversation history cache evictions by reason"
+)
+meter.create_observable_gauge(
+    "chat.history_cache.size",
+    callbacks=[_observe_size],
+    unit="By",
+    description="Approximate memory held by the conversation history cache"
+)
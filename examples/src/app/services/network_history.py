@@ -0,0 +1,120 @@
+from array import array
+from typing import Dict, List, Optional
+from app.config import config_manager
+from app.models import EndpointLatencyStats, NetworkTestResult
+import math
+import time
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class EndpointHistory:
+    """Fixed-size ring buffer of probe samples for one endpoint.
+
+    Samples live in preallocated typed arrays (timestamp, latency, reachable), so memory
+    stays constant no matter how long the process runs.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._timestamps = array("d", [0.0] * capacity)
+        self._latencies_ms = array("d", [math.nan] * capacity)
+        self._reachable = array("B", [0] * capacity)
+        self._next = 0
+        self.count = 0
+
+    def add(self, timestamp: float, reachable: bool, latency_ms: Optional[float]):
+        i = self._next
+        self._timestamps[i] = timestamp
+        self._latencies_ms[i] = latency_ms if reachable and latency_ms is not None else math.nan
+        self._reachable[i] = 1 if reachable else 0
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def stats(self, endpoint: str, window_seconds: float, now: Optional[float] = None) -> EndpointLatencyStats:
+        """Availability, latency percentiles and jitter over the samples inside the window"""
+        cutoff = (now or time.time()) - window_seconds
+        samples = 0
+        reachable = 0
+        latencies = []  # Newest first
+        for offset in range(1, self.count + 1):
+            i = (self._next - offset) % self.capacity
+            if self._timestamps[i] < cutoff:
+                break
+            samples += 1
+            if self._reachable[i]:
+                reachable += 1
+                if not math.isnan(self._latencies_ms[i]):
+                    latencies.append(self._latencies_ms[i])
+
+        stats = EndpointLatencyStats(
+            endpoint=endpoint,
+            window_seconds=window_seconds,
+            samples=samples,
+            availability_percent=reachable / samples * 100 if samples else None
+        )
+        if latencies:
+            ordered = sorted(latencies)
+            stats.mean_ms = sum(latencies) / len(latencies)
+            stats.p50_ms = _percentile(ordered, 50)
+            stats.p95_ms = _percentile(ordered, 95)
+            stats.p99_ms = _percentile(ordered, 99)
+            # Mean absolute difference between consecutive samples (RFC 3550 style)
+            if len(latencies) > 1:
+                stats.jitter_ms = sum(abs(a - b) for a, b in zip(latencies, latencies[1:])) / (len(latencies) - 1)
+        return stats
+
+
+class ConnectivityHistory:
+    """Rolling probe history for every endpoint, used to grade connectivity over time"""
+
+    def __init__(self, capacity: int):
+        settings = config_manager.settings
+        self.capacity = capacity
+        self.healthy_availability_percent = settings.network_healthy_availability_percent
+        self.degraded_availability_percent = settings.network_degraded_availability_percent
+        self.latency_threshold_ms = settings.network_latency_threshold_ms
+        self._endpoints: Dict[str, EndpointHistory] = {}
+
+    def record(self, results: List[NetworkTestResult]):
+        """Add one sweep's results, stamped with the current time"""
+        now = time.time()
+        for result in results:
+            history = self._endpoints.get(result.endpoint)
+            if history is None:
+                history = self._endpoints[result.endpoint] = EndpointHistory(self.capacity)
+            history.add(now, result.is_reachable, result.response_time_ms)
+
+    def stats(self, endpoints: List[str], window_seconds: float) -> List[EndpointLatencyStats]:
+        now = time.time()
+        empty = EndpointHistory(1)
+        return [self._endpoints.get(endpoint, empty).stats(endpoint, window_seconds, now) for endpoint in endpoints]
+
+    def endpoint_status(self, stats: EndpointLatencyStats) -> str:
+        """Grade one endpoint from its availability and tail latency"""
+        if not stats.samples:
+            return "unknown"
+        if stats.availability_percent < self.degraded_availability_percent:
+            return "unhealthy"
+        if (stats.availability_percent < self.healthy_availability_percent
+                or (stats.p95_ms is not None and stats.p95_ms > self.latency_threshold_ms)):
+            return "degraded"
+        return "healthy"
+
+    def overall_status(self, stats: List[EndpointLatencyStats]) -> str:
+        """Healthy when every endpoint is healthy, unhealthy when at least half are unhealthy, degraded otherwise"""
+        statuses = [self.endpoint_status(s) for s in stats if s.samples]
+        if not statuses:
+            return "unknown"
+        if all(status == "healthy" for status in statuses):
+            return "healthy"
+        unhealthy = sum(1 for status in statuses if status == "unhealthy")
+        if unhealthy >= len(statuses) / 2:
+            return "unhealthy"
+        return "degraded"
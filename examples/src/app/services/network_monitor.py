@@ -0,0 +1,72 @@
+from typing import Optional
+from app.config import config_manager
+from app.models import NetworkTestSummary
+from app.services.network_service import NetworkTestService
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkStatusMonitor:
+    """Keeps a recent connectivity sweep cached and refreshes it in the background.
+
+    Concurrent refresh requests share the sweep that is already in flight, so polling
+    clients never multiply outbound probes.
+    """
+
+    def __init__(self, network_service: NetworkTestService):
+        self.network_service = network_service
+        self.interval_seconds = config_manager.settings.network_status_refresh_seconds
+        self.summary: Optional[NetworkTestSummary] = None
+        self._updated_at: Optional[float] = None
+        self._sweep: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Run sweeps in the background, starting with one right away"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [t for t in (self._task, self._sweep) if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._sweep = None
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the cached summary was produced"""
+        if self._updated_at is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    async def refresh(self) -> NetworkTestSummary:
+        """Run a sweep, or join the one already in flight"""
+        if self._sweep is None or self._sweep.done():
+            self._sweep = asyncio.create_task(self._run_sweep())
+        # Shielded so a disconnecting caller does not cancel the sweep for everyone else
+        return await asyncio.shield(self._sweep)
+
+    async def get_summary(self, force_refresh: bool = False) -> NetworkTestSummary:
+        """Get the cached summary, sweeping first if forced or nothing is cached yet"""
+        if force_refresh or self.summary is None:
+            return await self.refresh()
+        return self.summary
+
+    async def _run_sweep(self) -> NetworkTestSummary:
+        summary = await self.network_service.run_connectivity_tests()
+        self.summary = summary
+        self._updated_at = time.monotonic()
+        return summary
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Background network sweep failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
@@ -1,80 +1,184 @@
-import socket
+import ssl
 import time
 import asyncio
-from typing import List
-from app.models import NetworkTestResult, NetworkTestSummary
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+from app.models import NetworkTestResult, NetworkTestSummary, NetworkHistorySummary, DnsCheckSummary
 from app.config import settings
+from app.services.dns_resolver import DnsResolver
+from app.services.network_history import ConnectivityHistory
 import logging
 
 logger = logging.getLogger(__name__)
 
+PROBE_MODES = ("tcp", "tls", "https")
+
 
 class NetworkTestService:
     def __init__(self):
         self.endpoints = settings.test_endpoints
+        self.probe_port = settings.network_probe_port
+        self.probe_timeout_seconds = settings.network_probe_timeout_seconds
+        self.sweep_timeout_seconds = settings.network_sweep_timeout_seconds
+        self.probe_mode = settings.network_probe_mode
+        self.https_path = settings.network_probe_https_path
+        # Trust the system store plus the extra bundle; passing cafile to
+        # create_default_context would replace the system store instead
+        self._ssl_context = ssl.create_default_context()
+        if settings.network_probe_ca_file:
+            self._ssl_context.load_verify_locations(cafile=settings.network_probe_ca_file)
+        self.resolver = DnsResolver()
+        self._probe_slots = asyncio.Semaphore(settings.network_probe_max_concurrency)
+        self.status_window_seconds = settings.network_status_window_seconds
+        self.history = ConnectivityHistory(settings.network_history_size)
     
-    async def test_endpoint_connectivity(self, endpoint: str, port: int = 443, timeout: float = 5.0) -> NetworkTestResult:
-        """Test connectivity to a specific endpoint"""
+    async def test_endpoint_connectivity(self, endpoint: str, port: Optional[int] = None,
+                                         timeout: Optional[float] = None,
+                                         mode: Optional[str] = None) -> NetworkTestResult:
+        """Test connectivity to a specific endpoint ("host" or "host:port")
+        
+        Modes: "tcp" (DNS + TCP connect), "tls" (adds a verified TLS handshake with SNI) and
+        "https" (adds a HEAD request and time to first byte).
+        """
+        timeout = timeout or self.probe_timeout_seconds
+        mode = mode or self.probe_mode
+        if mode not in PROBE_MODES:
+            return NetworkTestResult(
+                endpoint=endpoint,
+                is_reachable=False,
+                error_message=f"Unknown probe mode: {mode}"
+            )
         try:
-            start_time = time.time()
-            
-            # Resolve DNS first
-            try:
-                ip_address = socket.gethostbyname(endpoint)
-            except socket.gaierror as e:
-                return NetworkTestResult(
-                    endpoint=endpoint,
-                    is_reachable=False,
-                    error_message=f"DNS resolution failed: {str(e)}"
-                )
-            
-            # Test TCP connectivity
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
-                result = sock.connect_ex((ip_address, port))
-                sock.close()
-                
-                end_time = time.time()
-                response_time_ms = (end_time - start_time) * 1000
-                
-                if result == 0:
-                    return NetworkTestResult(
-                        endpoint=endpoint,
-                        is_reachable=True,
-                        response_time_ms=response_time_ms,
-                        ip_address=ip_address
-                    )
-                else:
-                    return NetworkTestResult(
-                        endpoint=endpoint,
-                        is_reachable=False,
-                        ip_address=ip_address,
-                        error_message=f"Connection failed (code: {result})"
-                    )
-                    
-            except Exception as e:
-                return NetworkTestResult(
-                    endpoint=endpoint,
-                    is_reachable=False,
-                    ip_address=ip_address,
-                    error_message=f"Connection error: {str(e)}"
-                )
-                
+            async with self._probe_slots:
+                return await self._probe(endpoint, port, timeout, mode)
         except Exception as e:
             return NetworkTestResult(
                 endpoint=endpoint,
                 is_reachable=False,
+                probe_mode=mode,
                 error_message=f"Test failed: {str(e)}"
             )
     
-    async def run_connectivity_tests(self) -> NetworkTestSummary:
+    def _split_endpoint(self, endpoint: str, port: Optional[int]) -> Tuple[str, int]:
+        """Split an optional port off an endpoint: "host", "host:443", "10.0.0.4:443" or "[::1]:443"
+        
+        A bare IPv6 address (no brackets) is taken as a host without a port.
+        """
+        if endpoint.count(":") > 1 and not endpoint.startswith("["):
+            return endpoint, port or self.probe_port
+        try:
+            parts = urlsplit(f"//{endpoint}")
+            return parts.hostname or endpoint, port or parts.port or self.probe_port
+        except ValueError:
+            # Not a valid port
+            return endpoint, port or self.probe_port
+    
+    async def _probe(self, endpoint: str, port: Optional[int], timeout: float, mode: str) -> NetworkTestResult:
+        """Run the probe phases without blocking the event loop; all phases share one deadline"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        host, port = self._split_endpoint(endpoint, port)
+        result = NetworkTestResult(endpoint=endpoint, is_reachable=False, probe_mode=mode)
+        
+        def remaining() -> float:
+            return max(deadline - loop.time(), 0)
+        
+        start_time = time.perf_counter()
+        phase = "DNS resolution"
+        writer = None
+        try:
+            # Resolve DNS first (served from the resolver cache within the record TTL)
+            resolution = await asyncio.wait_for(self.resolver.resolve(host), remaining())
+            if not resolution.addresses:
+                result.error_message = resolution.error_message
+                return result
+            # Prefer IPv4, matching what the private endpoint DNS zones publish
+            result.ip_address = next((a for a in resolution.addresses if ":" not in a), resolution.addresses[0])
+            result.dns_cached = resolution.cached
+            result.private_address = self.resolver.is_private(result.ip_address)
+            phase_end = time.perf_counter()
+            result.dns_time_ms = (phase_end - start_time) * 1000
+            
+            # Test TCP connectivity
+            phase, phase_start = "Connection", phase_end
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(result.ip_address, port),
+                remaining()
+            )
+            phase_end = time.perf_counter()
+            result.connect_time_ms = (phase_end - phase_start) * 1000
+            
+            if mode in ("tls", "https"):
+                phase, phase_start = "TLS handshake", phase_end
+                await asyncio.wait_for(
+                    writer.start_tls(self._ssl_context, server_hostname=host),
+                    remaining()
+                )
+                phase_end = time.perf_counter()
+                result.tls_time_ms = (phase_end - phase_start) * 1000
+                result.tls_version = writer.get_extra_info("ssl_object").version()
+            
+            if mode == "https":
+                phase, phase_start = "HTTPS request", phase_end
+                writer.write(
+                    f"HEAD {self.https_path} HTTP/1.1\r\nHost: {host}\r\n"
+                    f"User-Agent: ai-landing-zone-network-probe\r\nConnection: close\r\n\r\n".encode()
+                )
+                status_line = await asyncio.wait_for(reader.readline(), remaining())
+                phase_end = time.perf_counter()
+                result.ttfb_ms = (phase_end - phase_start) * 1000
+                # Any HTTP status proves the endpoint is serving; auth errors are expected here
+                try:
+                    result.http_status_code = int(status_line.split()[1])
+                except (IndexError, ValueError):
+                    raise ValueError(f"invalid HTTP response {status_line[:40]!r}")
+        except asyncio.TimeoutError:
+            result.error_message = f"{phase} timed out after {timeout:.1f}s"
+            return result
+        except ssl.SSLCertVerificationError as e:
+            result.error_message = f"TLS certificate verification failed: {e.verify_message}"
+            return result
+        except (OSError, ValueError) as e:
+            result.error_message = f"{phase} failed: {str(e) or type(e).__name__}"
+            return result
+        finally:
+            if writer is not None:
+                await self._close(writer)
+        
+        result.is_reachable = True
+        result.response_time_ms = (phase_end - start_time) * 1000
+        return result
+    
+    @staticmethod
+    async def _close(writer: asyncio.StreamWriter):
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), 1.0)
+        except (OSError, asyncio.TimeoutError):
+            pass
+    
+    async def run_connectivity_tests(self, mode: Optional[str] = None) -> NetworkTestSummary:
         """Run connectivity tests for all configured endpoints"""
-        logger.info(f"Running connectivity tests for {len(self.endpoints)} endpoints")
+        logger.info("Running connectivity tests for %s endpoints", len(self.endpoints))
+        
+        # Run tests concurrently, bounded by the sweep deadline
+        tasks = [asyncio.create_task(self.test_endpoint_connectivity(endpoint, mode=mode)) for endpoint in self.endpoints]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.sweep_timeout_seconds)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
         
-        # Run tests concurrently
-        tasks = [self.test_endpoint_connectivity(endpoint) for endpoint in self.endpoints]
-        test_results = await asyncio.gather(*tasks)
+        test_results = []
+        for endpoint, task in zip(self.endpoints, tasks):
+            if task.cancelled():
+                test_results.append(NetworkTestResult(
+                    endpoint=endpoint,
+                    is_reachable=False,
+                    error_message=f"Test exceeded sweep deadline of {self.sweep_timeout_seconds:.1f}s"
+                ))
+            else:
+                test_results.append(task.result())
         
         # Calculate summary statistics
         reachable_count = sum(1 for result in test_results if result.is_reachable)
@@ -84,13 +188,9 @@ class NetworkTestService:
         reachable_times = [r.response_time_ms for r in test_results if r.is_reachable and r.response_time_ms]
         avg_response_time = sum(reachable_times) / len(reachable_times) if reachable_times else None
         
-        # Determine overall status
-        if reachable_count == len(test_results):
-            overall_status = "healthy"
-        elif reachable_count > len(test_results) / 2:
-            overall_status = "degraded"
-        else:
-            overall_status = "unhealthy"
+        # Determine overall status from the rolling history rather than this sweep alone
+        self.history.record(test_results)
+        overall_status = self.get_history().overall_status
         
         summary = NetworkTestSummary(
             total_endpoints=len(test_results),
@@ -101,10 +201,38 @@ class NetworkTestService:
             overall_status=overall_status
         )
         
-        logger.info(f"Network test completed: {reachable_count}/{len(test_results)} endpoints reachable")
+        logger.info("Network test completed: %s/%s endpoints reachable", reachable_count, len(test_results))
         return summary
     
-    async def test_specific_service_connectivity(self, service_name: str) -> NetworkTestResult:
+    def configured_hostnames(self) -> List[str]:
+        """Hostnames of the configured test endpoints, in order and without duplicates"""
+        return list(dict.fromkeys(self._split_endpoint(e, None)[0].lower() for e in self.endpoints))
+    
+    async def check_dns(self, hostnames: Optional[List[str]] = None, use_cache: bool = True) -> DnsCheckSummary:
+        """Resolve endpoints and check that every answer is a private address"""
+        hosts = hostnames or self.configured_hostnames()
+        results = await asyncio.gather(*(self.resolver.resolve(host, use_cache) for host in hosts))
+        private_count = sum(1 for r in results if r.is_private)
+        return DnsCheckSummary(
+            total_hostnames=len(results),
+            private_hostnames=private_count,
+            results=results,
+            all_private=private_count == len(results)
+        )
+    
+    def get_history(self, window_seconds: Optional[float] = None) -> NetworkHistorySummary:
+        """Latency percentiles, jitter and availability per endpoint over a recent window"""
+        window_seconds = window_seconds or self.status_window_seconds
+        stats = self.history.stats(self.endpoints, window_seconds)
+        for endpoint_stats in stats:
+            endpoint_stats.status = self.history.endpoint_status(endpoint_stats)
+        return NetworkHistorySummary(
+            window_seconds=window_seconds,
+            overall_status=self.history.overall_status(stats),
+            endpoints=stats
+        )
+    
+    async def test_specific_service_connectivity(self, service_name: str, mode: Optional[str] = None) -> NetworkTestResult:
         """Test connectivity to a specific Azure service"""
         service_endpoints = {
             "openai": "privatelink.openai.azure.com",
@@ -122,4 +250,4 @@ class NetworkTestService:
                 error_message=f"Unknown service: {service_name}"
             )
         
-        return await self.test_endpoint_connectivity(endpoint)
\ No newline at end of file
+        return await self.test_endpoint_connectivity(endpoint, mode=mode)
\ No newline at end of file
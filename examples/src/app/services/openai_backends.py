@@ -0,0 +1,245 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+from app.config import AzureOpenAIBackend, config_manager
+from app.services.rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+from app.startup import DeferredModule
+import httpx
+import logging
+import random
+import time
+
+if TYPE_CHECKING:
+    from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+openai = DeferredModule("openai")
+
+# Weight of the newest sample in the latency and error rate moving averages
+_EWMA_ALPHA = 0.2
+# How much a backend's recent error rate inflates its score (an always-failing one scores 5x)
+_ERROR_PENALTY = 4.0
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops routing to a backend after consecutive failures.
+
+    After ``failure_threshold`` failures in a row the circuit opens and the backend is
+    skipped for ``reset_seconds``; then one trial request is let through (half open),
+    which closes the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def available(self, now: float) -> bool:
+        """Whether a request may be sent now (no side effects)"""
+        if self.state == CIRCUIT_CLOSED:
+            return True
+        if self.state == CIRCUIT_OPEN:
+            return now - self.opened_at >= self.reset_seconds
+        return not self._trial_in_flight
+
+    def on_dispatch(self, now: float):
+        if self.state == CIRCUIT_OPEN and now - self.opened_at >= self.reset_seconds:
+            self.state = CIRCUIT_HALF_OPEN
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self.state = CIRCUIT_CLOSED
+
+    def record_failure(self, now: float):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = CIRCUIT_OPEN
+            self.opened_at = now
+
+    def release(self):
+        """Finish a dispatch that says nothing about the backend's health (e.g. a 400)"""
+        self._trial_in_flight = False
+
+
+class OpenAIBackend:
+    """One Azure OpenAI deployment with its client, rate limiter, breaker and load statistics"""
+
+    def __init__(self, name: str, client: "AsyncAzureOpenAI", deployment: str, weight: float,
+                 rate_limiter: AdaptiveRateLimiter, breaker: CircuitBreaker):
+        self.name = name
+        self.client = client
+        self.deployment = deployment
+        self.weight = weight
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+
+    def model_for(self, model: str) -> str:
+        """Deployment to call for a requested model: the default deployment maps to this backend's"""
+        return self.deployment if model == config_manager.settings.azure_openai_deployment else model
+
+    def score(self, now: float) -> float:
+        """Expected cost of sending a request here; lower is better.
+
+        Latency scaled by the requests already in flight or queued, plus any
+        throttling pause, inflated by the recent error rate. Backends without latency
+        samples score by load alone so they get tried.
+        """
+        latency_ms = self.latency_ms or 0.0
+        throttled_ms = max(0.0, self.rate_limiter.blocked_until - now) * 1000
+        load = 1 + self.inflight + self.rate_limiter.queue_depth
+        return (latency_ms * load + throttled_ms) * (1 + _ERROR_PENALTY * self.error_rate)
+
+    def record(self, latency_ms: Optional[float], ok: bool):
+        if latency_ms is not None:
+            self.latency_ms = latency_ms if self.latency_ms is None else (
+                _EWMA_ALPHA * latency_ms + (1 - _EWMA_ALPHA) * self.latency_ms
+            )
+        self.error_rate = _EWMA_ALPHA * (0.0 if ok else 1.0) + (1 - _EWMA_ALPHA) * self.error_rate
+        if not ok:
+            self.failures += 1
+
+    def status(self, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "deployment": self.deployment,
+            "weight": self.weight,
+            "circuit": self.breaker.state,
+            "available": self.breaker.available(now),
+            "latency_ms": self.latency_ms,
+            "error_rate": self.error_rate,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "throttled_responses": self.rate_limiter.throttled_responses
+        }
+
+
+class BackendRouter:
+    """Spreads requests across Azure OpenAI backends.
+
+    Each request samples two distinct available backends in proportion to their weights
+    and goes to the one with the lower score (power of two choices), so traffic follows the
+    configured weights while steering away from slow, loaded, throttled or failing
+    backends. Backends with an open circuit are skipped until their trial request.
+    """
+
+    def __init__(self, backends: List[OpenAIBackend]):
+        self.backends = backends
+
+    def select(self, exclude: Optional[Set[str]] = None) -> Optional[OpenAIBackend]:
+        """Pick a backend for the next attempt, or None if none is available"""
+        now = time.monotonic()
+        candidates = [
+            b for b in self.backends
+            if b.weight > 0 and b.breaker.available(now) and (not exclude or b.name not in exclude)
+        ]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            backend = candidates[0]
+        else:
+            first = random.choices(candidates, weights=[b.weight for b in candidates])[0]
+            others = [b for b in candidates if b is not first]
+            second = random.choices(others, weights=[b.weight for b in others])[0]
+            backend = first if first.score(now) <= second.score(now) else second
+        backend.breaker.on_dispatch(now)
+        return backend
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [backend.status(now) for backend in self.backends]
+
+
+# Breakers outlive client rebuilds (credential rotation) so an open circuit stays open
+_breakers: Dict[str, CircuitBreaker] = {}
+# Latest router, reported by the circuit state gauge
+_current_router: Optional[BackendRouter] = None
+
+
+def _get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        settings = config_manager.settings
+        breaker = CircuitBreaker(settings.azure_openai_breaker_failure_threshold,
+                                 settings.azure_openai_breaker_reset_seconds)
+        _breakers[name] = breaker
+    return breaker
+
+
+def _backend_configs() -> List[AzureOpenAIBackend]:
+    """Configured backends, or the single azure_openai_endpoint deployment"""
+    settings = config_manager.settings
+    if settings.azure_openai_backends:
+        return settings.azure_openai_backends
+    if not settings.azure_openai_endpoint:
+        return []
+    return [AzureOpenAIBackend(name="default", endpoint=settings.azure_openai_endpoint)]
+
+
+def create_backend_router(http_client: httpx.AsyncClient) -> BackendRouter:
+    """Build clients for every configured backend; breakers and limiters are per backend"""
+    global _current_router
+    settings = config_manager.settings
+    backends = []
+    for config in _backend_configs():
+        api_key = config.api_key or settings.azure_openai_api_key
+        if not api_key:
+            logger.error("No API key for Azure OpenAI backend %s, skipping it", config.name)
+            continue
+        client = openai.AsyncAzureOpenAI(
+            azure_endpoint=config.endpoint,
+            api_key=api_key,
+            api_version=settings.azure_openai_api_version,
+            max_retries=0,  # Retries and failover are handled by AIService._upstream
+            http_client=http_client
+        )
+        backends.append(OpenAIBackend(
+            name=config.name,
+            client=client,
+            deployment=config.deployment or settings.azure_openai_deployment,
+            weight=config.weight,
+            rate_limiter=get_rate_limiter(config.name, config.requests_per_minute, config.tokens_per_minute),
+            breaker=_get_breaker(config.name)
+        ))
+    _current_router = BackendRouter(backends)
+    return _current_router
+
+
+def _observe_circuit_state(options: CallbackOptions):
+    if _current_router:
+        for backend in _current_router.backends:
+            yield Observation(0 if backend.breaker.state == CIRCUIT_CLOSED else 1, {"backend": backend.name})
+
+
+meter = metrics.get_meter(__name__)
+backend_requests_counter = meter.create_counter(
+    "chat.ai.backend_requests",
+    description="Azure OpenAI requests by backend and outcome (success, failure, throttled, failover)"
+)
+backend_latency_histogram = meter.create_histogram(
+    "chat.ai.backend_latency",
+    unit="ms",
+    description="Time to response headers from each Azure OpenAI backend"
+)
+meter.create_observable_gauge(
+    "chat.ai.backend_circuit_open",
+    callbacks=[_observe_circuit_state],
+    description="1 while a backend's circuit breaker is open or half open"
+)
@@ -0,0 +1,241 @@
+from typing import Dict, List, Mapping, Optional
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+from app.config import config_manager
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Lower values are dispatched first
+PRIORITY_CHAT = 0
+PRIORITY_BACKGROUND = 1
+_PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_BACKGROUND: "background"}
+
+# Average characters per token, used to estimate a request's token cost up front
+_CHARS_PER_TOKEN = 4
+
+
+class RateLimitTimeoutError(RuntimeError):
+    """The rate limit budget would not be available before the caller's deadline"""
+
+
+class _TokenBucket:
+    """Per-minute budget that refills continuously. A capacity of None means no known limit."""
+
+    def __init__(self, per_minute: Optional[float]):
+        self.capacity = per_minute or None
+        self.level = self.capacity or 0.0
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self._updated_at) * self.capacity / 60)
+        self._updated_at = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` is available"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A request bigger than the whole budget only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def consume(self, amount: float):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+    def observe(self, remaining: Optional[float], limit: Optional[float], now: float):
+        """Adopt the limit and remaining budget reported by the service"""
+        if not self.capacity:
+            # First sighting of the quota: start from what the service says is left
+            self.level = remaining if remaining is not None else (limit or 0.0)
+            self._updated_at = now
+        if limit:
+            self.capacity = limit
+        elif remaining is not None and remaining > (self.capacity or 0):
+            # No limit header: the largest remaining value seen is the best estimate of the quota
+            self.capacity = remaining
+        if remaining is not None and self.capacity:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+
+class _Waiter:
+    __slots__ = ("priority", "sequence", "event")
+
+    def __init__(self, priority: int, sequence: int):
+        self.priority = priority
+        self.sequence = sequence
+        self.event = asyncio.Event()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class AdaptiveRateLimiter:
+    """Client-side request and token budgets for one Azure OpenAI deployment.
+
+    Callers queue in priority order (then FIFO) and are released when both the
+    requests-per-minute and tokens-per-minute buckets can cover them. Budgets start from
+    the configured limits, or are learned from the ``x-ratelimit-*`` response headers
+    when none are configured, and are corrected by the remaining counts the service
+    reports. A 429 pauses dispatch for its Retry-After (or an exponential backoff when
+    the response has none).
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, default_backoff_seconds: float):
+        self.requests = _TokenBucket(requests_per_minute)
+        self.tokens = _TokenBucket(tokens_per_minute)
+        self.default_backoff_seconds = default_backoff_seconds
+        self.blocked_until = 0.0
+        self.throttled_responses = 0
+        self._consecutive_throttles = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @staticmethod
+    def estimate_tokens(messages: List[dict], max_tokens: Optional[int]) -> int:
+        """Rough token cost of a request: prompt characters plus the completion allowance"""
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        return prompt_chars // _CHARS_PER_TOKEN + (max_tokens or 0)
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_CHAT, deadline: Optional[float] = None) -> float:
+        """Wait for this request's turn and budget, then consume it; returns the seconds waited.
+
+        With a ``deadline`` (``time.monotonic()``), raises RateLimitTimeoutError as soon as the
+        budget is known to arrive too late, or once the deadline passes while queued.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, next(self._sequence))
+        heapq.heappush(self._waiters, waiter)
+        start = loop.time()
+        try:
+            while True:
+                delay = None
+                now = time.monotonic()
+                if self._waiters[0] is waiter:
+                    delay = max(self.blocked_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+                    if delay <= 0:
+                        break
+                if deadline is not None:
+                    if now + (delay or 0) >= deadline:
+                        raise RateLimitTimeoutError(
+                            f"Rate limit budget not available within {max(deadline - now, 0):.1f}s"
+                        )
+                    delay = deadline - now if delay is None else delay
+                # The head sleeps until its budget refills; everyone else until they become head
+                waiter.event.clear()
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._remove(waiter)
+            raise
+
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self._remove(waiter)
+        waited = loop.time() - start
+        wait_time_histogram.record(waited * 1000, {"priority": _PRIORITY_NAMES.get(priority, str(priority))})
+        return waited
+
+    def release_unused(self, estimated_tokens: int, used_tokens: Optional[int]):
+        """Return over-estimated tokens once the actual usage is known"""
+        if used_tokens is not None and used_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - used_tokens)
+            self._wake_head()
+
+    def observe_headers(self, headers: Mapping[str, str]):
+        """Correct the budgets from a successful response's rate limit headers"""
+        now = time.monotonic()
+        self.requests.observe(_header_number(headers, "x-ratelimit-remaining-requests"),
+                              _header_number(headers, "x-ratelimit-limit-requests"), now)
+        self.tokens.observe(_header_number(headers, "x-ratelimit-remaining-tokens"),
+                            _header_number(headers, "x-ratelimit-limit-tokens"), now)
+        self._consecutive_throttles = 0
+
+    def throttled(self, retry_after_seconds: Optional[float]):
+        """Pause dispatch after a 429"""
+        self.throttled_responses += 1
+        self._consecutive_throttles += 1
+        throttled_counter.add(1)
+        if retry_after_seconds is None or retry_after_seconds < 0:
+            retry_after_seconds = self.default_backoff_seconds * 2 ** (self._consecutive_throttles - 1)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after_seconds)
+        logger.warning("Azure OpenAI throttled the request, pausing dispatch for %.1fs", retry_after_seconds)
+
+    def _remove(self, waiter: _Waiter):
+        was_head = bool(self._waiters) and self._waiters[0] is waiter
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+        if was_head:
+            self._wake_head()
+
+    def _wake_head(self):
+        if self._waiters:
+            self._waiters[0].event.set()
+
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+# One limiter per backend: the quota belongs to the deployment, so every AIService in the process shares it
+_rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+
+def get_rate_limiter(backend: str, requests_per_minute: Optional[int] = None,
+                     tokens_per_minute: Optional[int] = None) -> AdaptiveRateLimiter:
+    """Get the process-wide limiter for a backend, creating it on first use"""
+    limiter = _rate_limiters.get(backend)
+    if limiter is None:
+        settings = config_manager.settings
+        limiter = AdaptiveRateLimiter(
+            requests_per_minute=requests_per_minute if requests_per_minute is not None else settings.azure_openai_requests_per_minute,
+            tokens_per_minute=tokens_per_minute if tokens_per_minute is not None else settings.azure_openai_tokens_per_minute,
+            default_backoff_seconds=settings.azure_openai_retry_backoff_seconds
+        )
+        _rate_limiters[backend] = limiter
+    return limiter
+
+
+def _observe_queue_depth(options: CallbackOptions):
+    for backend, limiter in list(_rate_limiters.items()):
+        yield Observation(limiter.queue_depth, {"backend": backend})
+
+
+meter = metrics.get_meter(__name__)
+wait_time_histogram = meter.create_histogram(
+    "chat.ai.rate_limit.wait_time",
+    unit="ms",
+    description="Time requests waited for Azure OpenAI rate limit budget, by priority"
+)
+throttled_counter = meter.create_counter(
+    "chat.ai.rate_limit.throttled",
+    description="Azure OpenAI responses rejected with 429"
+)
+meter.create_observable_gauge(
+    "chat.ai.rate_limit.queue_depth",
+    callbacks=[_observe_queue_depth],
+    description="Requests waiting for Azure OpenAI rate limit budget, by backend"
+)
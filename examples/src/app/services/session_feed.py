@@ -0,0 +1,219 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.models import ChatSession
+from app.config import config_manager
+from app.services.cosmos_store import CosmosStore, azure_core, cosmos_store, exceptions
+from app.telemetry import pipeline_metrics
+import asyncio
+import base64
+import json
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# Base delay between feed write retries, and the cap on the backoff after errors
+_RETRY_DELAY_SECONDS = 0.05
+_MAX_RETRY_DELAY_SECONDS = 5.0
+# How long shutdown waits for queued feed updates
+_FLUSH_TIMEOUT_SECONDS = 5.0
+
+
+def encode_continuation(state: Dict[str, Any]) -> str:
+    """Encode pagination state as an opaque continuation token"""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def decode_continuation(token: str) -> Dict[str, Any]:
+    """Decode a continuation token produced by encode_continuation"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid continuation token") from e
+
+
+def _sort_key(entry: Dict[str, Any]) -> Tuple[str, str]:
+    return entry["updated_at"], entry["id"]
+
+
+class RecentSessionsFeed:
+    """Materialized most-recent-first index of sessions for one tenant.
+
+    The index is a single document in its own partition, so listing recent sessions is
+    one point read instead of a cross-partition ORDER BY query. It holds only the newest
+    ``max_entries`` sessions, which bounds the size, and so the RU charge, of every write
+    to that one partition; pages past it continue from the query. Updates are queued and
+    applied off the request path by one writer task per process, which merges everything
+    pending into a single read-modify-replace guarded by the document ETag, so writers in
+    the same process never conflict. Conflicts with other processes are retried; after
+    ``max_write_attempts`` failures in a row, or when the document is missing, the feed is
+    rebuilt from a query. Queued entries are overlaid on pages so this process sees its
+    own updates immediately.
+    """
+
+    def __init__(self, store: CosmosStore):
+        settings = config_manager.settings
+        self.store = store
+        self.feed_id = f"session-feed-{settings.session_feed_tenant}"
+        self.max_entries = settings.session_feed_max_entries
+        self.max_write_attempts = settings.session_feed_max_write_attempts
+        self._document: Optional[Dict[str, Any]] = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._container = None
+        self._writer: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.conflicts = 0
+        self.rebuilds = 0
+        pipeline_metrics.register_stats("session_feed", self.stats)
+
+    async def read(self, container) -> Optional[Dict[str, Any]]:
+        """Point-read the feed document, or None if it has not been built yet"""
+        try:
+            async with self.store.request_slots:
+                self._document = await container.read_item(item=self.feed_id, partition_key=self.feed_id)
+            return self._document
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    async def build(self, container) -> Dict[str, Any]:
+        """Build the missing feed document from the stored sessions"""
+        document = self._new_document(await self._query_entries(container))
+        try:
+            async with self.store.request_slots:
+                self._document = await container.create_item(document)
+            logger.info("Built recent sessions feed %s with %s sessions", self.feed_id, len(document['sessions']))
+        except exceptions.CosmosResourceExistsError:
+            # Another worker built it first
+            await self.read(container)
+        return self._document
+
+    def record(self, container, session: ChatSession):
+        """Queue a session insert or update for the writer task"""
+        self._pending[session.id] = self._entry(session)
+        self._container = container
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+
+    async def flush(self, timeout: float = _FLUSH_TIMEOUT_SECONDS):
+        """Wait for queued updates to be written (call on shutdown, before closing the store)"""
+        if self._writer is None or self._writer.done():
+            return
+        done, _ = await asyncio.wait([self._writer], timeout=timeout)
+        if not done:
+            self._writer.cancel()
+            logger.warning("Recent sessions feed not updated for %s sessions at shutdown", len(self._pending))
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self._pending), "writes": self.writes, "conflicts": self.conflicts,
+                "rebuilds": self.rebuilds}
+
+    async def _write_pending(self):
+        """Write queued entries until none are left, merging all of them into each replace"""
+        failures = 0
+        while self._pending:
+            batch = dict(self._pending)
+            try:
+                if failures >= self.max_write_attempts:
+                    await self._rebuild(self._container, batch, "after repeated write conflicts")
+                elif not await self._apply(self._container, batch):
+                    failures += 1
+                    self.conflicts += 1
+                    # Another process updated the feed; back off a little so the writers interleave
+                    await asyncio.sleep(random.uniform(0, _RETRY_DELAY_SECONDS * failures))
+                    continue
+            except exceptions.CosmosHttpResponseError as e:
+                failures += 1
+                logger.warning("Failed to update recent sessions feed (attempt %s): %s", failures, e)
+                await asyncio.sleep(min(_RETRY_DELAY_SECONDS * 2 ** failures, _MAX_RETRY_DELAY_SECONDS))
+                continue
+            failures = 0
+            # Entries recorded again while the write was in flight stay queued
+            for session_id, entry in batch.items():
+                if self._pending.get(session_id) is entry:
+                    del self._pending[session_id]
+
+    async def _apply(self, container, batch: Dict[str, Dict[str, Any]]) -> bool:
+        """One ETag-guarded replace merging the batch; False when another writer got there first"""
+        document = self._document or await self.read(container)
+        if document is None:
+            await self._rebuild(container, batch, "because it was missing")
+            return True
+
+        updated = {**document, "sessions": self._merge(document["sessions"], batch)}
+        try:
+            async with self.store.request_slots:
+                self._document = await container.replace_item(
+                    item=self.feed_id,
+                    body=updated,
+                    etag=document["_etag"],
+                    match_condition=azure_core.MatchConditions.IfNotModified
+                )
+        except exceptions.CosmosAccessConditionFailedError:
+            self._document = None
+            return False
+        except exceptions.CosmosResourceNotFoundError:
+            await self._rebuild(container, batch, "because it was deleted")
+            return True
+        self.writes += 1
+        return True
+
+    async def _rebuild(self, container, batch: Dict[str, Dict[str, Any]], reason: str):
+        """Rewrite the feed from the stored sessions plus the queued entries, without an ETag check.
+
+        Sessions other processes added concurrently are stored documents, so the query
+        picks them up.
+        """
+        document = self._new_document(self._merge(await self._query_entries(container), batch))
+        async with self.store.request_slots:
+            self._document = await container.upsert_item(document)
+        self.rebuilds += 1
+        logger.warning("Rebuilt recent sessions feed %s %s", self.feed_id, reason)
+
+    async def _query_entries(self, container) -> List[Dict[str, Any]]:
+        query = "SELECT TOP @limit * FROM c WHERE c.doc_type = 'session' ORDER BY c.updated_at DESC"
+        parameters = [{"name": "@limit", "value": self.max_entries}]
+        async with self.store.request_slots:
+            items = [item async for item in container.query_items(query=query, parameters=parameters)]
+        return [self._entry(ChatSession.from_document(item)) for item in items]
+
+    def _merge(self, entries: List[Dict[str, Any]], updates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        sessions = [e for e in entries if e["id"] not in updates]
+        sessions.extend(updates.values())
+        sessions.sort(key=_sort_key, reverse=True)
+        return sessions[:self.max_entries]
+
+    def _new_document(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "id": self.feed_id,
+            "session_id": self.feed_id,
+            "doc_type": "session_feed",
+            "sessions": sorted(entries, key=_sort_key, reverse=True)[:self.max_entries]
+        }
+
+    def page(self, document: Dict[str, Any], limit: int,
+             continuation: Optional[Dict[str, Any]]) -> Tuple[List[ChatSession], Optional[Dict[str, Any]]]:
+        """Return one page of sessions after the continuation cursor, plus the next cursor"""
+        feed_entries = self._merge(document["sessions"], self._pending) if self._pending else document["sessions"]
+        entries = feed_entries
+        after = None
+        if continuation and continuation.get("after"):
+            after = list(continuation["after"])
+            entries = [e for e in entries if _sort_key(e) < tuple(after)]
+
+        page_entries = entries[:limit]
+        if page_entries:
+            after = list(_sort_key(page_entries[-1]))
+        next_continuation = None
+        if len(entries) > limit:
+            next_continuation = {"source": "feed", "after": after}
+        elif len(feed_entries) >= self.max_entries and after:
+            # Older sessions did not fit in the feed: the query lists them
+            next_continuation = {"source": "query", "after": after}
+        return [ChatSession.from_document(e) for e in page_entries], next_continuation
+
+    @staticmethod
+    def _entry(session: ChatSession) -> Dict[str, Any]:
+        return session.to_document()
+
+
+# Global feed instance shared by all ChatHistoryService instances
+recent_sessions_feed = RecentSessionsFeed(cosmos_store)
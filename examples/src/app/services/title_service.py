@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from app.config import config_manager
+from app.services.ai_service import AIService
+from app.services.chat_service import ChatHistoryService
+from app.telemetry import instrumented, pipeline_metrics
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of recently titled sessions remembered for deduplication
+_TITLED_SESSIONS_MEMORY = 10000
+
+
+class TitleGenerationQueue:
+    """Generates session titles in background workers, off the chat request path.
+
+    Requests are deduplicated per session: a session that is already queued, in progress
+    or recently titled is not queued again. Failed attempts are retried with exponential
+    backoff. When the queue is full new requests are dropped and the session keeps its
+    default title.
+    """
+
+    def __init__(self, ai_service: AIService, chat_history_service: ChatHistoryService):
+        settings = config_manager.settings
+        self.ai_service = ai_service
+        self.chat_history_service = chat_history_service
+        self.worker_count = settings.title_generation_workers
+        self.max_queue_size = settings.title_generation_queue_size
+        self.max_attempts = settings.title_generation_max_attempts
+        self.retry_delay_seconds = settings.title_generation_retry_delay_seconds
+        self._queue: Optional["asyncio.Queue[Tuple[str, str]]"] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending: Set[str] = set()
+        self._titled: "OrderedDict[str, None]" = OrderedDict()
+        self.counters: Dict[str, int] = {
+            "enqueued": 0, "deduplicated": 0, "dropped": 0, "succeeded": 0, "failed": 0, "retried": 0
+        }
+        pipeline_metrics.register_stats("title_generation", self.stats)
+
+    def start(self):
+        """Start the worker tasks (requires a running event loop)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"title-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info("Started %s title generation workers", self.worker_count)
+
+    async def stop(self):
+        """Cancel the workers; queued requests are discarded"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._pending.clear()
+
+    def enqueue(self, session_id: str, first_message: str) -> bool:
+        """Queue title generation for a session; returns False if deduplicated or dropped"""
+        if session_id in self._pending or session_id in self._titled:
+            self.counters["deduplicated"] += 1
+            return False
+
+        self.start()
+        try:
+            self._queue.put_nowait((session_id, first_message))
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            logger.warning("Title generation queue full, keeping default title for session %s", session_id)
+            return False
+
+        self._pending.add(session_id)
+        self.counters["enqueued"] += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and outcome counters"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "in_flight": len(self._pending),
+            **self.counters
+        }
+
+    async def _worker(self):
+        while True:
+            session_id, first_message = await self._queue.get()
+            try:
+                if await self._generate_title(session_id, first_message):
+                    self.counters["succeeded"] += 1
+                    self._remember_titled(session_id)
+                else:
+                    self.counters["failed"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.error("Title generation failed for session %s: %s", session_id, e)
+            finally:
+                self._pending.discard(session_id)
+                self._queue.task_done()
+
+    @instrumented("title.generate")
+    async def _generate_title(self, session_id: str, first_message: str) -> bool:
+        """Generate and store a session title, retrying transient failures"""
+        if not self.ai_service.is_available():
+            return False
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                title = await self.ai_service.generate_chat_title(first_message, raise_errors=True)
+                if await self.chat_history_service.update_session(session_id, title=title):
+                    logger.debug("Set title for session %s", session_id)
+                    return True
+                if not await self.chat_history_service.is_available():
+                    # In-memory sessions cannot be updated, retrying would not help
+                    return False
+                error = "session update failed"
+            except Exception as e:
+                error = str(e)
+
+            if attempt < self.max_attempts:
+                self.counters["retried"] += 1
+                delay = self.retry_delay_seconds * (2 ** (attempt - 1))
+                logger.warning(
+                    "Title generation attempt %s for session %s failed (%s), retrying in %.1fs",
+                    attempt, session_id, error, delay
+                )
+                await asyncio.sleep(delay)
+
+        logger.error("Giving up on title generation for session %s after %s attempts", session_id, self.max_attempts)
+        return False
+
+    def _remember_titled(self, session_id: str):
+        self._titled[session_id] = None
+        while len(self._titled) > _TITLED_SESSIONS_MEMORY:
+            self._titled.popitem(last=False)
@@ -0,0 +1,238 @@
+from typing import Callable, Dict, List, Optional, Set
+from opentelemetry import metrics
+from app.config import config_manager
+from app.services.cosmos_store import CosmosStore, exceptions
+from app.telemetry import instrumented, pipeline_metrics
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cosmos DB transactional batches hold at most 100 operations
+MAX_TRANSACTIONAL_BATCH_SIZE = 100
+
+
+class WriteCancelledError(RuntimeError):
+    """The commit holding the write was cancelled (e.g. at shutdown) before it was saved"""
+
+
+class _PendingWrite:
+    __slots__ = ("document", "future")
+
+    def __init__(self, document: dict, future: asyncio.Future):
+        self.document = document
+        self.future = future
+
+
+class CosmosWriteBuffer:
+    """Groups document creates per partition key into Cosmos DB transactional batches.
+
+    ``create_many`` commits documents that belong together (e.g. a chat turn) as one batch
+    right away. Single creates are committed together once ``flush_interval_seconds``
+    has passed since the first of them was queued, or as soon as ``max_batch_size`` are
+    pending. Commits for the same partition run in order. A batch that fails as a whole
+    (e.g. one duplicate id) is retried item by item so the other documents still land.
+
+    With ``durable`` set, ``create`` returns only after the document's batch has
+    committed, so concurrent writes share a round trip without weakening the
+    acknowledgement; a create for a partition with no commit in flight is committed
+    immediately rather than waiting out the interval alone. Otherwise ``create`` returns
+    once the document is queued (write-behind): queued writes are lost if the process
+    dies before they flush, and failures are only reported to ``on_failure``.
+    """
+
+    def __init__(self, store: CosmosStore, max_batch_size: int, flush_interval_seconds: float,
+                 durable: bool, on_failure: Optional[Callable[[str], None]] = None):
+        self.store = store
+        self.max_batch_size = min(max_batch_size, MAX_TRANSACTIONAL_BATCH_SIZE)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.durable = durable
+        self.on_failure = on_failure
+        self._pending: Dict[str, List[_PendingWrite]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._commits: Dict[str, asyncio.Task] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.documents = 0
+        self.failures = 0
+        pipeline_metrics.register_stats("history_write_buffer", self.stats)
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(writes) for writes in self._pending.values())
+
+    async def create(self, partition_key: str, document: dict) -> bool:
+        """Queue a document create; see the class docstring for when this returns"""
+        loop = asyncio.get_running_loop()
+        write = self._queue(partition_key, document)
+        writes = self._pending[partition_key]
+        if len(writes) >= self.max_batch_size or (self.durable and partition_key not in self._commits):
+            self._start_commit(partition_key)
+        elif len(writes) == 1:
+            self._timers[partition_key] = loop.call_later(
+                self.flush_interval_seconds, self._start_commit, partition_key
+            )
+
+        if not self.durable:
+            return True
+        # Shielded so a cancelled request does not drop a write other callers share a batch with
+        return await asyncio.shield(write.future)
+
+    async def create_many(self, partition_key: str, documents: List[dict]) -> bool:
+        """Commit documents together in one batch now, with anything already queued for the partition.
+
+        Returns whether all of them were saved (once committed, or once queued when not durable).
+        """
+        writes = [self._queue(partition_key, document) for document in documents]
+        self._start_commit(partition_key)
+
+        if not self.durable:
+            return True
+        results = await asyncio.shield(asyncio.gather(*(write.future for write in writes)))
+        return all(results)
+
+    def _queue(self, partition_key: str, document: dict) -> _PendingWrite:
+        write = _PendingWrite(document, asyncio.get_running_loop().create_future())
+        self._pending.setdefault(partition_key, []).append(write)
+        return write
+
+    async def flush(self, partition_key: str):
+        """Commit a partition's pending writes now and wait for them (read-your-writes)"""
+        self._start_commit(partition_key)
+        commit = self._commits.get(partition_key)
+        if commit is not None:
+            await asyncio.shield(commit)
+
+    async def flush_all(self):
+        """Commit every pending write and wait until no commit is in flight (e.g. on shutdown)"""
+        while self._pending or self._in_flight:
+            for partition_key in list(self._pending):
+                self._start_commit(partition_key)
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _start_commit(self, partition_key: str):
+        timer = self._timers.pop(partition_key, None)
+        if timer is not None:
+            timer.cancel()
+        writes = self._pending.pop(partition_key, None)
+        if not writes:
+            return
+        for start in range(0, len(writes), self.max_batch_size):
+            batch = writes[start:start + self.max_batch_size]
+            previous = self._commits.get(partition_key)
+            commit = asyncio.create_task(self._commit(partition_key, batch, previous))
+            self._commits[partition_key] = commit
+            self._in_flight.add(commit)
+            commit.add_done_callback(lambda done, batch=batch: self._finish_commit(partition_key, batch, done))
+
+    def _finish_commit(self, partition_key: str, writes: List[_PendingWrite], commit: asyncio.Task):
+        self._in_flight.discard(commit)
+        if self._commits.get(partition_key) is commit:
+            del self._commits[partition_key]
+        # A commit cancelled (e.g. at shutdown), even before it started, must not leave
+        # durable callers awaiting their writes forever
+        unresolved = [write for write in writes if not write.future.done()]
+        for write in unresolved:
+            if self.durable:
+                write.future.set_exception(WriteCancelledError(
+                    f"Commit to partition {partition_key} was cancelled before it was saved"
+                ))
+            else:
+                write.future.set_result(False)  # Nobody awaits write-behind futures
+        if unresolved:
+            self.failures += len(unresolved)
+            if self.on_failure:
+                self.on_failure(partition_key)
+
+    @instrumented("history.write_batch")
+    async def _commit(self, partition_key: str, writes: List[_PendingWrite], previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        start_time = time.perf_counter()
+        results = [False] * len(writes)
+        try:
+            container = await self.store.get_container()
+            if container is None:
+                logger.warning("Cosmos DB not available. %s queued documents not saved.", len(writes))
+            elif len(writes) == 1:
+                results = await self._create_individually(container, writes)
+            else:
+                try:
+                    async with self.store.request_slots:
+                        await container.execute_item_batch(
+                            [("create", (write.document,)) for write in writes],
+                            partition_key=partition_key
+                        )
+                    results = [True] * len(writes)
+                except exceptions.CosmosBatchOperationError as e:
+                    # The batch is atomic, so nothing was written
+                    logger.warning(
+                        "Batch of %s writes to partition %s failed at operation %s, retrying individually",
+                        len(writes), partition_key, e.error_index
+                    )
+                    results = await self._create_individually(container, writes)
+        except exceptions.CosmosHttpResponseError as e:
+            logger.error("Failed to save %s documents to partition %s: %s", len(writes), partition_key, e)
+        except Exception as e:
+            logger.error("Unexpected error saving documents to partition %s: %s", partition_key, e)
+
+        flush_time_histogram.record((time.perf_counter() - start_time) * 1000)
+        batch_size_histogram.record(len(writes))
+        self.batches += 1
+        self.documents += len(writes)
+        for write, saved in zip(writes, results):
+            if not write.future.done():
+                write.future.set_result(saved)
+        if not all(results):
+            self.failures += results.count(False)
+            if self.on_failure:
+                self.on_failure(partition_key)
+
+    async def _create_individually(self, container, writes: List[_PendingWrite]) -> List[bool]:
+        async def create(write: _PendingWrite) -> bool:
+            try:
+                async with self.store.request_slots:
+                    await container.create_item(write.document)
+                return True
+            except exceptions.CosmosResourceExistsError:
+                return True  # Already stored by an earlier attempt
+            except exceptions.CosmosHttpResponseError as e:
+                logger.error("Failed to save document %s to Cosmos DB: %s", write.document.get('id'), e)
+                return False
+
+        return list(await asyncio.gather(*(create(write) for write in writes)))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "durable": self.durable,
+            "pending": self.pending_count,
+            "batches": self.batches,
+            "documents": self.documents,
+            "average_batch_size": self.documents / self.batches if self.batches else None,
+            "failures": self.failures
+        }
+
+
+def create_write_buffer(store: CosmosStore, on_failure: Optional[Callable[[str], None]] = None) -> CosmosWriteBuffer:
+    settings = config_manager.settings
+    return CosmosWriteBuffer(
+        store,
+        max_batch_size=settings.message_write_max_batch_size,
+        flush_interval_seconds=settings.message_write_flush_interval_ms / 1000,
+        durable=settings.message_write_durable,
+        on_failure=on_failure
+    )
+
+
+meter = metrics.get_meter(__name__)
+flush_time_histogram = meter.create_histogram(
+    "chat.history.write_batch.flush_time",
+    unit="ms",
+    description="Time to commit one batch of queued chat history writes"
+)
+batch_size_histogram = meter.create_histogram(
+    "chat.history.write_batch.size",
+    description="Documents committed per chat history write batch"
+)
@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, Optional
+import asyncio
+import importlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _process_start() -> float:
+    """``perf_counter()`` reading at process start (Linux), else now"""
+    now = time.perf_counter()
+    try:
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        with open("/proc/self/stat") as stat_file:
+            # Field 22 (starttime, in clock ticks since boot); the command name may contain spaces
+            started = int(stat_file.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return now
+    return now - max(0.0, uptime - started)
+
+
+class DeferredModule:
+    """A module that is imported on first attribute access.
+
+    Services name SDK exception types through it (``except exceptions.CosmosHttpResponseError``)
+    so importing the app does not import the SDK; the clients that raise those errors load
+    it during startup.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+async def import_modules(*names: str):
+    """Import slow modules on a worker thread so the event loop keeps serving"""
+    await asyncio.to_thread(lambda: [importlib.import_module(name) for name in names])
+
+
+class StartupTimer:
+    """Breakdown of the time from process start until the app serves with its clients created.
+
+    ``ready`` is when the app started serving and ``connected`` when the dependency clients
+    were created and first health-checked; they differ only with background initialization.
+    Phases may overlap (clients are created concurrently), so their durations do not add up.
+    """
+
+    def __init__(self):
+        self.process_started = _process_start()
+        self._last_mark = time.perf_counter()
+        # Interpreter and server start-up until the app package began importing
+        self.phases: Dict[str, float] = {"interpreter": self._last_mark - self.process_started}
+        self.ready_at: Optional[float] = None
+        self.connected_at: Optional[float] = None
+
+    def mark(self, name: str):
+        """Record the time since the previous mark as a phase"""
+        now = time.perf_counter()
+        self.phases[name] = now - self._last_mark
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start_time
+
+    async def timed(self, name: str, awaitable: Awaitable) -> Any:
+        """Await as a phase (for use with ``asyncio.gather``)"""
+        with self.phase(name):
+            return await awaitable
+
+    def ready(self):
+        """The app has started serving"""
+        self.ready_at = time.perf_counter()
+        self._log_when_complete()
+
+    def connected(self):
+        """The dependency clients are created"""
+        self.connected_at = time.perf_counter()
+        self._log_when_complete()
+
+    def _log_when_complete(self):
+        if self.ready_at is None or self.connected_at is None:
+            return
+        report = self.report()
+        logger.info(
+            "Ready %.0fms and connected %.0fms after process start (%s)",
+            report["ready_after_ms"], report["connected_after_ms"],
+            ", ".join(f"{name} {ms:.0f}ms" for name, ms in report["phases_ms"].items()),
+            extra={"startup": report}
+        )
+
+    def _since_start_ms(self, moment: Optional[float]) -> Optional[float]:
+        return round((moment - self.process_started) * 1000, 1) if moment is not None else None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready_after_ms": self._since_start_ms(self.ready_at),
+            "connected_after_ms": self._since_start_ms(self.connected_at),
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()}
+        }
+
+
+# Created when the app package starts importing, before any heavy dependency
+startup_timer = StartupTimer()
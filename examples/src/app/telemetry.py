@@ -0,0 +1,222 @@
+from array import array
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from opentelemetry import metrics, trace
+import functools
+import math
+import threading
+import time
+
+# Recent samples kept per latency series for the percentiles on /metrics
+_LATENCY_SAMPLES = 2048
+_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# Stage whose Cosmos DB requests are being charged (innermost active stage)
+_current_stage: ContextVar[str] = ContextVar("chat_pipeline_stage", default="other")
+
+tracer = trace.get_tracer(__name__)
+meter = metrics.get_meter(__name__)
+stage_duration_histogram = meter.create_histogram(
+    "chat.stage.duration",
+    unit="ms",
+    description="Duration of each chat pipeline stage (Cosmos DB, Azure OpenAI, context, titles)"
+)
+request_charge_counter = meter.create_counter(
+    "cosmos.request_charge",
+    unit="RU",
+    description="Cosmos DB request units consumed, by pipeline stage"
+)
+token_usage_counter = meter.create_counter(
+    "chat.ai.tokens",
+    unit="{token}",
+    description="Azure OpenAI token usage by backend and type (prompt, completion)"
+)
+
+
+class LatencySummary:
+    """Count, sum and a ring buffer of recent samples for one latency series"""
+
+    def __init__(self, capacity: int = _LATENCY_SAMPLES):
+        self.capacity = capacity
+        self._samples = array("d")
+        self._next = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        if len(self._samples) < self.capacity:
+            self._samples.append(seconds)
+        else:
+            self._samples[self._next] = seconds
+            self._next = (self._next + 1) % self.capacity
+        self.count += 1
+        self.sum += seconds
+
+    def quantiles(self) -> List[Tuple[float, float]]:
+        """Nearest-rank quantiles over the recent samples"""
+        if not self._samples:
+            return [(q, math.nan) for q in _QUANTILES]
+        ordered = sorted(self._samples)
+        return [(q, ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]) for q in _QUANTILES]
+
+
+class PipelineMetrics:
+    """In-process view of request and stage latency, RU charge and token usage for /metrics"""
+
+    def __init__(self):
+        self.stage_latency: Dict[str, LatencySummary] = {}
+        self.request_latency: Dict[Tuple[str, str], LatencySummary] = {}
+        self.request_charge: Dict[str, float] = {}
+        self.cosmos_requests: Dict[str, int] = {}
+        self.tokens: Dict[Tuple[str, str], int] = {}
+        self.component_stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        # The Cosmos DB response hook may run outside the event loop thread
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.stage_latency.setdefault(stage, LatencySummary()).observe(seconds)
+
+    def observe_request(self, method: str, route: str, seconds: float):
+        self.request_latency.setdefault((method, route), LatencySummary()).observe(seconds)
+
+    def add_request_charge(self, stage: str, request_units: float):
+        with self._lock:
+            self.request_charge[stage] = self.request_charge.get(stage, 0.0) + request_units
+            self.cosmos_requests[stage] = self.cosmos_requests.get(stage, 0) + 1
+
+    def add_tokens(self, backend: str, token_type: str, count: int):
+        self.tokens[(backend, token_type)] = self.tokens.get((backend, token_type), 0) + count
+
+    def register_stats(self, component: str, collect: Callable[[], Dict[str, Any]]):
+        """Expose a component's ``stats()`` on /metrics; a later registration replaces an earlier one"""
+        self.component_stats[component] = collect
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        _render_summary(lines, "chat_stage_duration_seconds",
+                        "Duration of chat pipeline stages (quantiles over recent samples)",
+                        {(("stage", stage),): summary for stage, summary in self.stage_latency.items()})
+        _render_summary(lines, "http_request_duration_seconds",
+                        "HTTP request duration by route (quantiles over recent samples)",
+                        {(("method", method), ("route", route)): summary
+                         for (method, route), summary in self.request_latency.items()})
+        with self._lock:
+            charge = dict(self.request_charge)
+            requests = dict(self.cosmos_requests)
+        _render_counter(lines, "cosmos_request_charge_total", "Cosmos DB request units consumed, by pipeline stage",
+                        {(("stage", stage),): value for stage, value in charge.items()})
+        _render_counter(lines, "cosmos_requests_total", "Cosmos DB requests, by pipeline stage",
+                        {(("stage", stage),): value for stage, value in requests.items()})
+        _render_counter(lines, "openai_tokens_total", "Azure OpenAI tokens used, by backend and type",
+                        {(("backend", backend), ("type", token_type)): value
+                         for (backend, token_type), value in self.tokens.items()})
+        for component, collect in sorted(self.component_stats.items()):
+            _render_stats(lines, component, collect())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+
+def _render_summary(lines: List[str], name: str, help_text: str,
+                    series: Dict[Tuple[Tuple[str, str], ...], LatencySummary]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} summary")
+    for labels, summary in sorted(series.items()):
+        for quantile, value in summary.quantiles():
+            lines.append(f"{name}{_labels(labels + (('quantile', str(quantile)),))} {value!r}")
+        lines.append(f"{name}_sum{_labels(labels)} {summary.sum!r}")
+        lines.append(f"{name}_count{_labels(labels)} {summary.count}")
+
+
+def _render_stats(lines: List[str], component: str, stats: Dict[str, Any]):
+    """One gauge per numeric stat (``<component>_<key>``); a dict of numbers becomes a ``type`` label"""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            series = {(("type", str(label)),): v for label, v in value.items() if isinstance(v, (int, float))}
+        elif isinstance(value, (int, float)):
+            series = {(): float(value) if isinstance(value, bool) else value}
+        else:
+            continue  # Descriptive strings and ratios not yet defined (None)
+        name = f"{component}_{key}"
+        lines.append(f"# HELP {name} {component.replace('_', ' ')}: {key.replace('_', ' ')}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, number in sorted(series.items()):
+            lines.append(f"{name}{_labels(labels)} {number!r}")
+
+
+def _render_counter(lines: List[str], name: str, help_text: str, series: Dict[Tuple[Tuple[str, str], ...], float]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in sorted(series.items()):
+        lines.append(f"{name}{_labels(labels)} {value!r}")
+
+
+# Global metrics shared by the whole process
+pipeline_metrics = PipelineMetrics()
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[trace.Span]:
+    """Time a pipeline stage as an OpenTelemetry span and a latency sample.
+
+    Cosmos DB request charges incurred inside the block are attributed to the stage.
+    """
+    token = _current_stage.set(name)
+    start_time = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
+    finally:
+        elapsed = time.perf_counter() - start_time
+        try:
+            _current_stage.reset(token)
+        except ValueError:
+            pass  # A streaming response closed from another task, whose context is discarded anyway
+        stage_duration_histogram.record(elapsed * 1000, {"stage": name})
+        pipeline_metrics.observe_stage(name, elapsed)
+
+
+def instrumented(name: str):
+    """Decorator running an async method inside ``stage(name)``"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cosmos_response(response):
+    """Cosmos DB client ``raw_response_hook``: charge the response's RUs to the current stage"""
+    charge = response.http_response.headers.get("x-ms-request-charge")
+    if charge is None:
+        return
+    try:
+        request_units = float(charge)
+    except ValueError:
+        return
+    current = _current_stage.get()
+    request_charge_counter.add(request_units, {"stage": current})
+    pipeline_metrics.add_request_charge(current, request_units)
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.add_event("cosmos.response", {"request_charge": request_units})
+
+
+def record_token_usage(backend: str, usage):
+    """Count the prompt and completion tokens reported by an Azure OpenAI response"""
+    if usage is None:
+        return
+    for token_type, count in (("prompt", usage.prompt_tokens), ("completion", usage.completion_tokens)):
+        if count:
+            token_usage_counter.add(count, {"backend": backend, "type": token_type})
+            pipeline_metrics.add_tokens(backend, token_type, count)
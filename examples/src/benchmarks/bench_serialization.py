@@ -0,0 +1,119 @@
+"""Compare the per-message cost of the chat model serialization paths.
+
+Measures the previous conversions (``__init__`` overrides filling ids and
+timestamps, ``.dict()`` plus manual ``isoformat()`` on writes, and
+``fromisoformat()`` plus full validation on reads, with the stdlib JSON
+response) against the current ones (default factories, ``to_document`` /
+``from_document`` validating stored documents in one pydantic-core pass, and
+``ORJSONResponse``).
+
+Usage (from examples/src):
+
+    python -m benchmarks.bench_serialization --messages 50 --repeat 200
+"""
+from datetime import datetime
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import Callable, List
+import argparse
+import statistics
+import time
+import uuid
+import warnings
+
+from app.models import ChatMessage
+
+
+class LegacyChatMessage(BaseModel):
+    """ChatMessage as it was defined before default factories"""
+    id: str = None
+    session_id: str
+    role: str
+    content: str
+    timestamp: datetime = None
+
+    def __init__(self, **data):
+        if data.get('id') is None:
+            data['id'] = str(uuid.uuid4())
+        if data.get('timestamp') is None:
+            data['timestamp'] = datetime.utcnow()
+        super().__init__(**data)
+
+
+def _legacy_to_document(message: LegacyChatMessage) -> dict:
+    message_dict = message.dict()
+    message_dict['timestamp'] = message_dict['timestamp'].isoformat()
+    return message_dict
+
+
+def _legacy_from_document(item: dict) -> LegacyChatMessage:
+    if isinstance(item['timestamp'], str):
+        item['timestamp'] = datetime.fromisoformat(item['timestamp'])
+    return LegacyChatMessage(**item)
+
+
+def _stored(document: dict) -> dict:
+    """A document as Cosmos DB returns it, with its system properties"""
+    return dict(document, _rid="AAAAAA==", _self="dbs/x/colls/y/docs/z/", _etag='"00000000-0000"',
+                _attachments="attachments/", _ts=int(time.time()))
+
+
+def _measure(operation: Callable[[], object], repeat: int, per_call: int) -> float:
+    """Median microseconds per message over ``repeat`` runs of an operation covering ``per_call`` messages"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - start) * 1e6 / per_call)
+    return statistics.median(samples)
+
+
+def run(message_count: int, repeat: int):
+    # .dict() warns on every call under pydantic 2; the cost stays in the measurement
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    session_id = str(uuid.uuid4())
+    contents = [f"Message {i} " + "lorem ipsum dolor sit amet " * 8 for i in range(message_count)]
+    roles = ["user", "assistant"] * (message_count // 2 + 1)
+
+    legacy_messages = [LegacyChatMessage(session_id=session_id, role=r, content=c) for r, c in zip(roles, contents)]
+    messages = [ChatMessage(session_id=session_id, role=r, content=c) for r, c in zip(roles, contents)]
+    legacy_documents = [_stored(_legacy_to_document(m)) for m in legacy_messages]
+    documents = [_stored(m.to_document()) for m in messages]
+    response_adapter = TypeAdapter(List[ChatMessage])
+    legacy_response_adapter = TypeAdapter(List[LegacyChatMessage])
+
+    rows = [
+        ("create message",
+         lambda: [LegacyChatMessage(session_id=session_id, role=r, content=c) for r, c in zip(roles, contents)],
+         lambda: [ChatMessage(session_id=session_id, role=r, content=c) for r, c in zip(roles, contents)]),
+        ("to Cosmos document",
+         lambda: [_legacy_to_document(m) for m in legacy_messages],
+         lambda: [m.to_document() for m in messages]),
+        # The read path mutated the queried items in place, so give it fresh copies
+        ("from Cosmos document",
+         lambda: [_legacy_from_document(dict(d)) for d in legacy_documents],
+         lambda: [ChatMessage.from_document(d) for d in documents]),
+        ("HTTP response body",
+         lambda: JSONResponse(legacy_response_adapter.dump_python(legacy_messages, mode="json")),
+         lambda: ORJSONResponse(response_adapter.dump_python(messages, mode="json"))),
+    ]
+
+    print(f"{message_count} messages, median of {repeat} runs (microseconds per message)")
+    print(f"{'operation':<24} {'previous':>10} {'current':>10} {'speedup':>8}")
+    for name, legacy, current in rows:
+        before = _measure(legacy, repeat, message_count)
+        after = _measure(current, repeat, message_count)
+        print(f"{name:<24} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50, help="messages per conversation (one history read)")
+    parser.add_argument("--repeat", type=int, default=200, help="timed runs per operation")
+    args = parser.parse_args()
+    run(args.messages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""In-memory stand-in for the chat history Cosmos DB container.
+
+Implements the ``ContainerProxy`` calls the app makes (point reads, creates,
+replaces, patches, transactional batches and its three queries), including
+partition keys, etags with ``IfNotModified`` and the Cosmos exception types,
+with an optional per-operation latency. Install it in place of a real account
+with ``cosmos_store.use_container(InMemoryContainer())``.
+"""
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from azure.cosmos.partition_key import NonePartitionKeyValue
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import copy
+import time
+import uuid
+
+_Key = Tuple[Any, str]
+
+
+def _error(error_type, status_code: int, message: str):
+    return error_type(status_code=status_code, message=message)
+
+
+class _Page:
+    def __init__(self, items: List[dict]):
+        self._items = items
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self._items:
+            yield item
+
+
+class _Pages:
+    def __init__(self, container: "InMemoryContainer", items: List[dict], page_size: int, offset: int):
+        self._container = container
+        self._items = items
+        self._page_size = page_size
+        self._offset = offset
+        self._started = False
+        self.continuation_token: Optional[str] = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> _Page:
+        if self._started and self._offset >= len(self._items):
+            raise StopAsyncIteration
+        self._started = True
+        await self._container._delay()
+        page = self._items[self._offset:self._offset + self._page_size]
+        self._offset += self._page_size
+        self.continuation_token = str(self._offset) if self._offset < len(self._items) else None
+        return _Page(page)
+
+
+class _QueryResult:
+    def __init__(self, container: "InMemoryContainer", items: List[dict], page_size: Optional[int]):
+        self._container = container
+        self._items = items
+        self._page_size = page_size or 100
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._container._delay()
+        for item in self._items:
+            yield item
+
+    def by_page(self, continuation_token: Optional[str] = None) -> _Pages:
+        return _Pages(self._container, self._items, self._page_size, int(continuation_token or 0))
+
+
+class InMemoryContainer:
+    """Dict-backed container partitioned on ``partition_key_path`` (``session_id`` by default)"""
+
+    def __init__(self, latency_ms: float = 0.0, partition_key_path: str = "session_id"):
+        self.latency_ms = latency_ms
+        self.partition_key_path = partition_key_path
+        self.items: Dict[_Key, dict] = {}
+        self.operations: Dict[str, int] = {}
+
+    async def _delay(self):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    async def _begin(self, operation: str):
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+        await self._delay()
+
+    def _key(self, body: dict) -> _Key:
+        return body.get(self.partition_key_path, NonePartitionKeyValue), body["id"]
+
+    @staticmethod
+    def _stored(body: dict) -> dict:
+        item = copy.deepcopy(body)
+        item["_etag"] = f'"{uuid.uuid4()}"'
+        item["_ts"] = int(time.time())
+        return item
+
+    def _check_condition(self, key: _Key, etag: Optional[str], match_condition: Optional[MatchConditions]):
+        if etag and match_condition == MatchConditions.IfNotModified and self.items[key]["_etag"] != etag:
+            raise _error(exceptions.CosmosAccessConditionFailedError, 412, "Precondition failed")
+
+    def _existing(self, key: _Key) -> dict:
+        item = self.items.get(key)
+        if item is None:
+            raise _error(exceptions.CosmosResourceNotFoundError, 404, f"Item {key[1]} not found")
+        return item
+
+    async def read(self, **kwargs) -> dict:
+        await self._begin("read")
+        return {"id": "chat_history", "partitionKey": {"paths": [f"/{self.partition_key_path}"]}}
+
+    async def read_item(self, item: str, partition_key: Any, **kwargs) -> dict:
+        await self._begin("read_item")
+        return copy.deepcopy(self._existing((partition_key, item)))
+
+    async def create_item(self, body: dict, **kwargs) -> dict:
+        await self._begin("create_item")
+        key = self._key(body)
+        if key in self.items:
+            raise _error(exceptions.CosmosResourceExistsError, 409, f"Item {key[1]} already exists")
+        self.items[key] = self._stored(body)
+        return copy.deepcopy(self.items[key])
+
+    async def upsert_item(self, body: dict, **kwargs) -> dict:
+        await self._begin("upsert_item")
+        key = self._key(body)
+        self.items[key] = self._stored(body)
+        return copy.deepcopy(self.items[key])
+
+    async def replace_item(self, item: Any, body: dict, etag: Optional[str] = None,
+                           match_condition: Optional[MatchConditions] = None, **kwargs) -> dict:
+        await self._begin("replace_item")
+        key = self._key(body)
+        self._existing(key)
+        self._check_condition(key, etag, match_condition)
+        self.items[key] = self._stored(body)
+        return copy.deepcopy(self.items[key])
+
+    async def patch_item(self, item: str, partition_key: Any, patch_operations: List[dict],
+                         etag: Optional[str] = None, match_condition: Optional[MatchConditions] = None,
+                         **kwargs) -> dict:
+        await self._begin("patch_item")
+        key = (partition_key, item)
+        document = copy.deepcopy(self._existing(key))
+        self._check_condition(key, etag, match_condition)
+        for operation in patch_operations:
+            field = operation["path"].strip("/")
+            if operation["op"] in ("add", "set", "replace"):
+                document[field] = copy.deepcopy(operation["value"])
+            elif operation["op"] == "incr":
+                document[field] = document.get(field, 0) + operation["value"]
+            elif operation["op"] == "remove":
+                document.pop(field, None)
+        self.items[key] = self._stored(document)
+        return copy.deepcopy(self.items[key])
+
+    async def delete_item(self, item: str, partition_key: Any, **kwargs):
+        await self._begin("delete_item")
+        self._existing((partition_key, item))
+        del self.items[(partition_key, item)]
+
+    async def execute_item_batch(self, batch_operations: List[tuple], partition_key: Any, **kwargs) -> List[dict]:
+        """Transactional batch of creates and upserts: all land or none do"""
+        await self._begin("execute_item_batch")
+        staged: Dict[_Key, dict] = {}
+        for index, (operation, args, *_) in enumerate(batch_operations):
+            body = args[0]
+            key = (partition_key, body["id"])
+            if operation == "create" and (key in self.items or key in staged):
+                raise exceptions.CosmosBatchOperationError(
+                    error_index=index, headers={}, status_code=409,
+                    message=f"Item {body['id']} already exists", operation_responses=[]
+                )
+            if operation not in ("create", "upsert"):
+                raise _error(exceptions.CosmosHttpResponseError, 400, f"Unsupported batch operation {operation}")
+            staged[key] = self._stored(body)
+        self.items.update(staged)
+        return [{"statusCode": 201, "resourceBody": copy.deepcopy(item)} for item in staged.values()]
+
+    def query_items(self, query: str, parameters: Optional[List[dict]] = None, partition_key: Any = None,
+                    max_item_count: Optional[int] = None, **kwargs) -> _QueryResult:
+        """Evaluate the chat history queries the app issues (messages by session, recent sessions)"""
+        self.operations["query_items"] = self.operations.get("query_items", 0) + 1
+        values = {p["name"]: p["value"] for p in parameters or []}
+        items = [item for (pk, _), item in self.items.items() if partition_key is None or pk == partition_key]
+
+        if "c.session_id = @session_id" in query:
+            items = [i for i in items if i.get("session_id") == values["@session_id"] and "doc_type" not in i]
+            items.sort(key=lambda i: i["timestamp"], reverse="ORDER BY c.timestamp DESC" in query)
+        elif "c.doc_type = 'session'" in query:
+            items = [i for i in items if i.get("doc_type") == "session"]
+            if "c.updated_at <= @updated_at" in query:
+                items = [i for i in items if i["updated_at"] <= values["@updated_at"]]
+            items.sort(key=lambda i: i["updated_at"], reverse=True)
+        else:
+            raise _error(exceptions.CosmosHttpResponseError, 400, f"Query not supported by the fake: {query}")
+        if "TOP @limit" in query:
+            items = items[:values["@limit"]]
+        return _QueryResult(self, [copy.deepcopy(i) for i in items], max_item_count)
@@ -0,0 +1,214 @@
+"""Local Azure OpenAI stand-in for exercising backend balancing, failover and rate limiting.
+
+Serves ``POST /openai/deployments/{deployment}/chat/completions`` (plain and
+streamed) with a configurable latency, error rate and throttling, and reports
+``x-ratelimit-*`` headers like the real service. A requests-per-minute budget
+is enforced with 429s carrying ``retry-after-ms``. Behaviour can be changed
+while running:
+
+    POST /fake/config   {"latency_ms": 800, "error_rate": 0.5}   -> current config
+    GET  /fake/stats                                             -> request counters
+
+Usage (from examples/src), e.g. two backends where one is slow:
+
+    python -m benchmarks.fakes.openai_server --port 9901 --latency-ms 50
+    python -m benchmarks.fakes.openai_server --port 9902 --latency-ms 400
+
+Then run the app with:
+
+    AZURE_OPENAI_API_KEY=x AZURE_OPENAI_BACKENDS='[{"name": "a", "endpoint": "http://127.0.0.1:9901"},
+        {"name": "b", "endpoint": "http://127.0.0.1:9902"}]' uvicorn app.main:app
+"""
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import Deque, Dict, Optional, Tuple
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+@dataclass
+class FakeOpenAIConfig:
+    latency_ms: float = 50.0  # Before the response headers (time to first byte)
+    chunk_delay_ms: float = 5.0  # Between streamed chunks
+    error_rate: float = 0.0  # Share of requests answered with a 500
+    throttle_rate: float = 0.0  # Share of requests answered with a 429 regardless of budget
+    requests_per_minute: int = 0  # Enforced budget reported in x-ratelimit-*; 0 for none
+    tokens_per_minute: int = 100000  # Reported only
+    retry_after_ms: int = 1000
+    completion_words: int = 20
+
+
+class FakeOpenAI:
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None):
+        self.config = config or FakeOpenAIConfig()
+        self.stats: Dict[str, int] = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0, "streams": 0}
+        self._recent: Deque[float] = deque()
+
+    def _remaining_requests(self, now: float) -> Optional[int]:
+        if not self.config.requests_per_minute:
+            return None
+        while self._recent and self._recent[0] <= now - 60:
+            self._recent.popleft()
+        return self.config.requests_per_minute - len(self._recent)
+
+    def _rate_limit_headers(self, remaining_requests: Optional[int]) -> Dict[str, str]:
+        headers = {"x-ratelimit-limit-tokens": str(self.config.tokens_per_minute),
+                   "x-ratelimit-remaining-tokens": str(self.config.tokens_per_minute)}
+        if remaining_requests is not None:
+            headers["x-ratelimit-limit-requests"] = str(self.config.requests_per_minute)
+            headers["x-ratelimit-remaining-requests"] = str(max(remaining_requests, 0))
+        return headers
+
+    def _completion_text(self, deployment: str, body: dict) -> str:
+        prompt = body["messages"][-1]["content"] if body.get("messages") else ""
+        words = [deployment] + prompt.split()[:5] + ["lorem"] * self.config.completion_words
+        return " ".join(words[:self.config.completion_words])
+
+    async def chat_completion(self, deployment: str, body: dict, writer: asyncio.StreamWriter):
+        self.stats["requests"] += 1
+        now = time.monotonic()
+        remaining = self._remaining_requests(now)
+        if (remaining is not None and remaining <= 0) or random.random() < self.config.throttle_rate:
+            self.stats["throttled"] += 1
+            await _write_json(writer, 429, {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                              {"retry-after-ms": str(self.config.retry_after_ms),
+                               "retry-after": str(max(1, self.config.retry_after_ms // 1000))})
+            return
+        if remaining is not None:
+            self._recent.append(now)
+            remaining -= 1
+
+        await asyncio.sleep(self.config.latency_ms / 1000)
+        if random.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            await _write_json(writer, 500, {"error": {"code": "InternalServerError", "message": "Injected failure"}})
+            return
+
+        text = self._completion_text(deployment, body)
+        headers = self._rate_limit_headers(remaining)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        prompt_tokens = sum(len((m.get("content") or "").split()) for m in body.get("messages", []))
+        completion_tokens = len(text.split())
+        self.stats["ok"] += 1
+
+        if not body.get("stream"):
+            await _write_json(writer, 200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": deployment,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            }, headers)
+            return
+
+        self.stats["streams"] += 1
+        _write_head(writer, 200, dict(headers, **{"content-type": "text/event-stream", "transfer-encoding": "chunked"}))
+        for i, word in enumerate(text.split()):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": deployment,
+                     "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}]}
+            _write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(self.config.chunk_delay_ms / 1000)
+        _write_chunk(writer, b"data: [DONE]\n\n")
+        _write_chunk(writer, b"")
+        await writer.drain()
+
+    def update_config(self, changes: dict) -> dict:
+        known = {f.name for f in fields(FakeOpenAIConfig)}
+        for name, value in changes.items():
+            if name in known:
+                setattr(self.config, name, type(getattr(self.config, name))(value))
+        return asdict(self.config)
+
+
+def _write_head(writer: asyncio.StreamWriter, status: int, headers: Dict[str, str]):
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"] + [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+
+def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+    writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+async def _write_json(writer: asyncio.StreamWriter, status: int, payload: dict, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps(payload).encode()
+    _write_head(writer, status, dict(headers or {}, **{"content-type": "application/json", "content-length": str(len(body))}))
+    writer.write(body)
+    await writer.drain()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, target.split("?", 1)[0], headers, body
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 0, fake: Optional[FakeOpenAI] = None):
+    """Serve the fake on host:port (port 0 picks a free port); returns (server, fake)"""
+    fake = fake or FakeOpenAI()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                parts = path.strip("/").split("/")
+                if method == "POST" and len(parts) == 5 and parts[:2] == ["openai", "deployments"] and parts[3:] == ["chat", "completions"]:
+                    await fake.chat_completion(parts[2], json.loads(body or b"{}"), writer)
+                elif method == "POST" and path == "/fake/config":
+                    await _write_json(writer, 200, fake.update_config(json.loads(body or b"{}")))
+                elif method == "GET" and path == "/fake/stats":
+                    await _write_json(writer, 200, dict(fake.stats, config=asdict(fake.config)))
+                else:
+                    await _write_json(writer, 404, {"error": {"code": "404", "message": f"No route for {method} {path}"}})
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    return server, fake
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9901)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Delay before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests rejected with 429")
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Enforced request budget (0 for none)")
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(latency_ms=args.latency_ms, error_rate=args.error_rate,
+                              throttle_rate=args.throttle_rate, requests_per_minute=args.requests_per_minute)
+    server, _ = await start_server(args.host, args.port, FakeOpenAI(config))
+    print(f"Serving fake Azure OpenAI on http://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,147 @@
+"""Minimal Redis-compatible (RESP2) server for exercising the redis completion cache backend.
+
+Supports the commands the app and redis-py's connection setup use: PING, GET,
+SET (with EX/PX/NX/XX), DEL, EXISTS, DBSIZE, FLUSHDB/FLUSHALL, SELECT and
+CLIENT. Data lives in memory and expires lazily.
+
+Usage (from examples/src):
+
+    python -m benchmarks.fakes.redis_server --port 6379
+
+Then run the app with COMPLETION_CACHE_ENABLED=true COMPLETION_CACHE_BACKEND=redis.
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import time
+
+
+class RespError(Exception):
+    pass
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, bool):
+        return b"+OK\r\n" if value else b"$-1\r\n"
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:])):
+        header = await reader.readline()
+        length = int(header[1:])
+        data = await reader.readexactly(length + 2)
+        args.append(data[:-2])
+    return args
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: List[bytes]):
+        self.commands += 1
+        command = args[0].upper().decode()
+        if command == "PING":
+            return args[1] if len(args) > 1 else "PONG"
+        if command == "GET":
+            return self._get(args[1])
+        if command == "SET":
+            return self._set(args[1:])
+        if command == "DEL":
+            return sum(1 for key in args[1:] if self._get(key) is not None and self.data.pop(key))
+        if command == "EXISTS":
+            return sum(1 for key in args[1:] if self._get(key) is not None)
+        if command == "DBSIZE":
+            return len(self.data)
+        if command in ("FLUSHDB", "FLUSHALL"):
+            self.data.clear()
+            return "OK"
+        if command in ("SELECT", "CLIENT"):
+            return "OK"
+        return RespError(f"ERR unknown command '{command}'")
+
+    def _set(self, args: List[bytes]):
+        key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+        expires_at = None
+        if b"EX" in options:
+            expires_at = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+        elif b"PX" in options:
+            expires_at = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+        exists = self._get(key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        return "OK"
+
+
+async def start_server(host: str = "127.0.0.1", port: int = 0, store: Optional[FakeRedis] = None):
+    """Serve RESP on host:port (port 0 picks a free port); returns (server, store)"""
+    store = store or FakeRedis()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                try:
+                    reply = store.execute(args)
+                except (IndexError, ValueError):
+                    reply = RespError("ERR syntax error")
+                writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    return server, store
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    server, _ = await start_server(args.host, args.port)
+    print(f"Serving RESP on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,133 @@
+"""Local TLS/HTTPS stand-in for exercising the network probe modes.
+
+Generates a throwaway CA and a "localhost" server certificate, then serves TLS
+on the given port. Plain TLS connections are accepted and closed; HTTP
+requests get an empty 204 response after an optional delay, so TTFB can be
+checked against a known value.
+
+Usage (from examples/src):
+
+    python -m benchmarks.fakes.tls_server --port 8443 --delay-ms 50
+
+Then point the probes at it, for example:
+
+    NETWORK_PROBE_CA_FILE=<printed CA file> TEST_ENDPOINTS='["localhost:8443"]' \
+        NETWORK_PROBE_MODE=https uvicorn app.main:app
+"""
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+import argparse
+import asyncio
+import ipaddress
+import os
+import ssl
+import tempfile
+
+
+def _write_pem(path: str, data: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def generate_certificates(directory: str, hostname: str = "localhost") -> Tuple[str, str, str]:
+    """Create a CA and a server certificate for hostname; returns (ca_file, cert_file, key_file)"""
+    now = datetime.now(timezone.utc)
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Network probe test CA")])
+    ca_cert = (
+        x509.CertificateBuilder()
+        .subject_name(ca_name)
+        .issuer_name(ca_name)
+        .public_key(ca_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(
+            digital_signature=True, content_commitment=False, key_encipherment=False,
+            data_encipherment=False, key_agreement=False, key_cert_sign=True, crl_sign=True,
+            encipher_only=False, decipher_only=False
+        ), critical=True)
+        .add_extension(x509.SubjectKeyIdentifier.from_public_key(ca_key.public_key()), critical=False)
+        .sign(ca_key, hashes.SHA256())
+    )
+
+    server_key = ec.generate_private_key(ec.SECP256R1())
+    server_cert = (
+        x509.CertificateBuilder()
+        .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)]))
+        .issuer_name(ca_name)
+        .public_key(server_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName(hostname),
+            x509.IPAddress(ipaddress.ip_address("127.0.0.1"))
+        ]), critical=False)
+        .add_extension(x509.ExtendedKeyUsage([x509.oid.ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
+        .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(ca_key.public_key()), critical=False)
+        .sign(ca_key, hashes.SHA256())
+    )
+
+    ca_file = _write_pem(os.path.join(directory, "ca.pem"), ca_cert.public_bytes(serialization.Encoding.PEM))
+    cert_file = _write_pem(os.path.join(directory, "server.pem"), server_cert.public_bytes(serialization.Encoding.PEM))
+    key_file = _write_pem(os.path.join(directory, "server-key.pem"), server_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ))
+    return ca_file, cert_file, key_file
+
+
+async def start_server(cert_file: str, key_file: str, host: str = "127.0.0.1", port: int = 0,
+                       delay_ms: float = 0.0) -> asyncio.AbstractServer:
+    """Serve TLS with a minimal HTTP responder; port 0 picks a free port"""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_file, key_file)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            if request_line:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                await asyncio.sleep(delay_ms / 1000)
+                writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port, ssl=context)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--hostname", default="localhost", help="Name the server certificate is issued for")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Delay before each HTTP response")
+    parser.add_argument("--cert-dir", help="Where to write certificates (a temporary directory by default)")
+    args = parser.parse_args()
+
+    cert_dir = args.cert_dir or tempfile.mkdtemp(prefix="tls-stand-in-")
+    ca_file, cert_file, key_file = generate_certificates(cert_dir, args.hostname)
+    server = await start_server(cert_file, key_file, args.host, args.port, args.delay_ms)
+    print(f"Serving TLS on {args.host}:{args.port} for {args.hostname}")
+    print(f"CA file: {ca_file}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,373 @@
+"""Load test the chat application against local fakes, without any Azure resources.
+
+Boots the app with uvicorn on a local port, backed by the fake Azure OpenAI
+server (benchmarks.fakes.openai_server) and an in-memory Cosmos DB container
+(benchmarks.fakes.cosmos_container), then drives it with concurrent clients
+for a fixed duration. Each client holds a conversation for a few turns before
+starting a new session, and picks its next request from the scenario mix:
+
+    chat      POST /api/chat/
+    stream    POST /api/chat/stream (read to the end)
+    sessions  GET  /api/chat/sessions
+    network   GET  /api/network/test (probes the fake OpenAI port)
+
+Reports requests/sec, p50/p99 latency and errors per scenario, and the lag of
+the app's event loop sampled while the load runs. The app, the fake OpenAI
+server and the load generator each run on their own event loop thread, so
+client-side work does not show up as server lag.
+
+Usage (from examples/src):
+
+    python -m benchmarks.loadtest --concurrency 32 --duration 30
+    python -m benchmarks.loadtest --mix chat=1,stream=1 --openai-latency-ms 400 --throttle-rate 0.05
+    python -m benchmarks.loadtest --json before.json   # keep the report to compare runs
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import threading
+import time
+
+import httpx
+
+SCENARIOS = ("chat", "stream", "sessions", "network")
+
+# Interval of the event loop lag probe
+_LAG_INTERVAL_SECONDS = 0.01
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return math.nan
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoopThread:
+    """An event loop running in a daemon thread, for hosting a server next to the load generator"""
+
+    def __init__(self, name: str):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine, timeout: Optional[float] = None):
+        """Run a coroutine on the thread's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def stop(self):
+        """Let in-flight work finish briefly, cancel the rest (e.g. background title jobs), then stop the loop"""
+        self.run(self._drain(), 10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self.loop.close()
+
+    @staticmethod
+    async def _drain(grace_seconds: float = 1.0):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a short sleep"""
+
+    def __init__(self, interval: float = _LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def reset(self):
+        self.samples_ms = []
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, (loop.time() - start - self.interval) * 1000))
+
+
+class ScenarioStats:
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.first_token_ms: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def error(self, reason: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, object]:
+        latencies = sorted(self.latencies_ms)
+        result = {
+            "requests": len(latencies),
+            "errors": sum(self.errors.values()),
+            "error_reasons": dict(self.errors),
+            "requests_per_second": len(latencies) / duration,
+            "p50_ms": _percentile(latencies, 0.5),
+            "p99_ms": _percentile(latencies, 0.99)
+        }
+        if self.first_token_ms:
+            first_tokens = sorted(self.first_token_ms)
+            result["first_token_p50_ms"] = _percentile(first_tokens, 0.5)
+            result["first_token_p99_ms"] = _percentile(first_tokens, 0.99)
+        return result
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, mix: Dict[str, float], concurrency: int, turns_per_session: int):
+        self.base_url = base_url
+        self.mix = mix
+        self.concurrency = concurrency
+        self.turns_per_session = turns_per_session
+        self.stats: Dict[str, ScenarioStats] = {name: ScenarioStats() for name in mix}
+        self.recording = False
+        self._requests: Dict[str, Callable] = {
+            "chat": self._chat, "stream": self._stream, "sessions": self._sessions, "network": self._network
+        }
+
+    async def run(self, warmup: float, duration: float, on_measure_start: Callable):
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=60) as client:
+            deadline = time.monotonic() + warmup + duration
+            workers = [asyncio.create_task(self._worker(client, deadline)) for _ in range(self.concurrency)]
+            await asyncio.sleep(warmup)
+            await on_measure_start()
+            self.recording = True
+            await asyncio.gather(*workers)
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float):
+        names, weights = list(self.mix), list(self.mix.values())
+        conversation = {"session_id": None, "turns": 0}
+        while time.monotonic() < deadline:
+            name = random.choices(names, weights)[0]
+            stats = self.stats[name]
+            start = time.perf_counter()
+            try:
+                first_token = await self._requests[name](client, conversation, start)
+            except httpx.HTTPStatusError as e:
+                if self.recording:
+                    stats.error(f"http {e.response.status_code}")
+                continue
+            except (httpx.HTTPError, ValueError) as e:
+                if self.recording:
+                    stats.error(type(e).__name__)
+                continue
+            if self.recording:
+                stats.latencies_ms.append((time.perf_counter() - start) * 1000)
+                if first_token is not None:
+                    stats.first_token_ms.append(first_token)
+
+    def _next_turn(self, conversation: dict) -> Optional[str]:
+        if conversation["turns"] >= self.turns_per_session:
+            conversation["session_id"], conversation["turns"] = None, 0
+        conversation["turns"] += 1
+        return conversation["session_id"]
+
+    async def _chat(self, client: httpx.AsyncClient, conversation: dict, start: float):
+        payload = {"message": f"Question {random.randint(1, 10 ** 6)} about the landing zone",
+                   "session_id": self._next_turn(conversation)}
+        response = await client.post("/api/chat/", json=payload)
+        response.raise_for_status()
+        conversation["session_id"] = response.json()["session_id"]
+        return None
+
+    async def _stream(self, client: httpx.AsyncClient, conversation: dict, start: float):
+        payload = {"message": f"Question {random.randint(1, 10 ** 6)} about the landing zone",
+                   "session_id": self._next_turn(conversation)}
+        first_token = None
+        event = None
+        async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "session":
+                    conversation["session_id"] = json.loads(line[6:])["session_id"]
+                elif line.startswith("data: ") and event == "token" and first_token is None:
+                    first_token = (time.perf_counter() - start) * 1000
+                elif event == "error":
+                    raise ValueError("stream error event")
+        return first_token
+
+    async def _sessions(self, client: httpx.AsyncClient, conversation: dict, start: float):
+        response = await client.get("/api/chat/sessions", params={"limit": 10})
+        response.raise_for_status()
+        return None
+
+    async def _network(self, client: httpx.AsyncClient, conversation: dict, start: float):
+        response = await client.get("/api/network/test")
+        response.raise_for_status()
+        return None
+
+
+def _configure_environment(openai_port: int):
+    """Point the app at the fakes; must run before any app module is imported"""
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{openai_port}",
+        "AZURE_OPENAI_API_KEY": "loadtest",
+        "TEST_ENDPOINTS": json.dumps([f"127.0.0.1:{openai_port}"]),
+        "NETWORK_PROBE_MODE": "tcp"
+    })
+    for name in ("AZURE_OPENAI_BACKENDS", "COSMOS_DB_ENDPOINT", "COSMOS_DB_KEY", "KEY_VAULT_URL",
+                 "APPLICATIONINSIGHTS_CONNECTION_STRING"):
+        os.environ.pop(name, None)
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from benchmarks.fakes.openai_server import FakeOpenAI, FakeOpenAIConfig, start_server
+
+    openai_port, app_port = _free_port(), _free_port()
+    _configure_environment(openai_port)
+
+    fake = FakeOpenAI(FakeOpenAIConfig(
+        latency_ms=args.openai_latency_ms,
+        chunk_delay_ms=args.chunk_delay_ms,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after_ms=args.retry_after_ms
+    ))
+    upstream = LoopThread("fake-openai")
+    upstream_server, _ = upstream.run(start_server("127.0.0.1", openai_port, fake))
+
+    # Imported only now so the settings pick up the environment above
+    import uvicorn
+    from app.main import app
+    from app.services.cosmos_store import cosmos_store
+    from benchmarks.fakes.cosmos_container import InMemoryContainer
+
+    container = InMemoryContainer(latency_ms=args.cosmos_latency_ms)
+    cosmos_store.use_container(container)
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=app_port, log_level="warning"))
+    monitor = LoopLagMonitor()
+    app_loop = LoopThread("app")
+    app_loop.run(monitor.start())
+    serving = asyncio.run_coroutine_threadsafe(server.serve(), app_loop.loop)
+    while not server.started:
+        if serving.done():
+            serving.result()
+        time.sleep(0.05)
+
+    generator = LoadGenerator(f"http://127.0.0.1:{app_port}", args.mix, args.concurrency, args.turns)
+
+    async def measure_start():
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(monitor.reset(), app_loop.loop))
+        fake.stats.update({key: 0 for key in fake.stats})
+
+    try:
+        asyncio.run(generator.run(args.warmup, args.duration, measure_start))
+    finally:
+        lag = sorted(monitor.samples_ms)
+        server.should_exit = True
+        serving.result(30)
+        app_loop.run(monitor.stop())
+        app_loop.stop()
+        upstream.loop.call_soon_threadsafe(upstream_server.close)
+        upstream.stop()
+
+    scenarios = {name: stats.summary(args.duration) for name, stats in generator.stats.items()}
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "requests_per_second": sum(s["requests"] for s in scenarios.values()) / args.duration,
+        "scenarios": scenarios,
+        "event_loop_lag_ms": {"p50": _percentile(lag, 0.5), "p99": _percentile(lag, 0.99),
+                              "max": lag[-1] if lag else math.nan},
+        "openai": dict(fake.stats),
+        "cosmos_operations": dict(container.operations),
+        "session_feed": _feed_coverage(container)
+    }
+
+
+def _feed_coverage(container) -> Dict[str, int]:
+    """How many stored sessions the recent-sessions feed lists (it keeps at most its max entries)"""
+    sessions = [item for item in container.items.values() if item.get("doc_type") == "session"]
+    feeds = [item for item in container.items.values() if item.get("doc_type") == "session_feed"]
+    listed = {entry["id"] for feed in feeds for entry in feed["sessions"]}
+    return {"built": bool(feeds), "sessions": len(sessions), "listed": sum(1 for s in sessions if s["id"] in listed)}
+
+
+def print_report(report: Dict[str, object]):
+    config = report["config"]
+    print(f"{config['concurrency']} clients for {config['duration']:.0f}s "
+          f"(OpenAI latency {config['openai_latency_ms']:.0f} ms, Cosmos latency {config['cosmos_latency_ms']:.0f} ms)")
+    print(f"{'scenario':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'TTFT p50':>9}")
+    for name, s in report["scenarios"].items():
+        first_token = f"{s['first_token_p50_ms']:>9.1f}" if "first_token_p50_ms" in s else f"{'':>9}"
+        print(f"{name:<10} {s['requests']:>9} {s['errors']:>7} {s['requests_per_second']:>9.1f} "
+              f"{s['p50_ms']:>9.1f} {s['p99_ms']:>9.1f} {first_token}")
+        if s["error_reasons"]:
+            print(f"{'':<10} errors: {', '.join(f'{k} x{v}' for k, v in s['error_reasons'].items())}")
+    lag = report["event_loop_lag_ms"]
+    print(f"total {report['requests_per_second']:.1f} req/s; "
+          f"event loop lag p50 {lag['p50']:.2f} ms, p99 {lag['p99']:.2f} ms, max {lag['max']:.2f} ms")
+    print(f"upstream OpenAI: {report['openai']}")
+    print(f"Cosmos operations: {report['cosmos_operations']}")
+    feed = report["session_feed"]
+    if feed["built"]:
+        print(f"recent sessions feed: {feed['listed']} of {feed['sessions']} sessions listed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before the measurement")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("chat=4,stream=2,sessions=3,network=1"),
+                        help="scenario weights, e.g. chat=4,stream=2,sessions=3,network=1")
+    parser.add_argument("--turns", type=int, default=5, help="messages per conversation before a new session")
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0, help="fake OpenAI time to first byte")
+    parser.add_argument("--chunk-delay-ms", type=float, default=5.0, help="fake OpenAI delay between streamed chunks")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of OpenAI requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of OpenAI requests answered with 500")
+    parser.add_argument("--retry-after-ms", type=int, default=200, help="retry-after-ms on fake 429s")
+    parser.add_argument("--cosmos-latency-ms", type=float, default=5.0, help="in-memory Cosmos DB latency per call")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Compare RU charge and latency of session lookups and updates in Cosmos DB.
+
+Measures the previous access pattern (cross-partition query by id, then
+read-modify-replace) against the current one (single-partition point read and
+partial-document patch) on the configured chat history container.
+
+Usage (from examples/src, with COSMOS_DB_ENDPOINT and COSMOS_DB_KEY set):
+
+    python -m benchmarks.session_access_benchmark --sessions 20 --iterations 50
+
+The benchmark creates its own session documents and deletes them afterwards.
+"""
+from azure.cosmos.aio import CosmosClient
+from azure.cosmos.partition_key import NonePartitionKeyValue
+from datetime import datetime
+from typing import Dict, List
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+from app.config import config_manager
+
+
+class Measurement:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies_ms: List[float] = []
+        self.request_charges: List[float] = []
+
+    def report(self) -> str:
+        latencies = sorted(self.latencies_ms)
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return (f"{self.name:<32} {statistics.mean(self.request_charges):>8.2f} RU "
+                f"{p50:>9.2f} ms p50 {p95:>9.2f} ms p95")
+
+
+async def _timed(measurement: Measurement, operation):
+    """Run an operation, recording its latency and total request charge"""
+    charges: List[float] = []
+
+    def response_hook(headers, _):
+        charges.append(float(headers.get("x-ms-request-charge", 0)))
+
+    start = time.perf_counter()
+    await operation(response_hook)
+    measurement.latencies_ms.append((time.perf_counter() - start) * 1000)
+    measurement.request_charges.append(sum(charges))
+
+
+def _session_document(legacy: bool) -> Dict[str, object]:
+    now = datetime.utcnow().isoformat()
+    document = {
+        "id": f"bench-{uuid.uuid4()}",
+        "title": "Benchmark session",
+        "created_at": now,
+        "updated_at": now,
+        "message_count": 0,
+        "doc_type": "session"
+    }
+    if not legacy:
+        document["session_id"] = document["id"]
+    return document
+
+
+async def run(session_count: int, iterations: int):
+    settings = config_manager.settings
+    config_manager.load_azure_config()
+    if not settings.cosmos_db_endpoint or not settings.cosmos_db_key:
+        sys.exit("COSMOS_DB_ENDPOINT and COSMOS_DB_KEY must be set")
+
+    async with CosmosClient(settings.cosmos_db_endpoint, settings.cosmos_db_key) as client:
+        container = client.get_database_client(settings.cosmos_db_database) \
+            .get_container_client(settings.cosmos_db_container)
+
+        legacy_sessions = [_session_document(legacy=True) for _ in range(session_count)]
+        sessions = [_session_document(legacy=False) for _ in range(session_count)]
+        for document in legacy_sessions + sessions:
+            await container.create_item(document)
+
+        query_read = Measurement("query by id (previous)")
+        point_read = Measurement("point read (current)")
+        replace_update = Measurement("query + replace (previous)")
+        patch_update = Measurement("patch (current)")
+
+        try:
+            for i in range(iterations):
+                legacy = legacy_sessions[i % session_count]
+                session = sessions[i % session_count]
+
+                async def query_by_id(hook, session_id=legacy["id"]):
+                    query = "SELECT * FROM c WHERE c.id = @session_id AND c.doc_type = 'session'"
+                    parameters = [{"name": "@session_id", "value": session_id}]
+                    return [item async for item in container.query_items(
+                        query=query, parameters=parameters, response_hook=hook)]
+
+                async def read_by_id(hook, session_id=session["id"]):
+                    return await container.read_item(
+                        item=session_id, partition_key=session_id, response_hook=hook)
+
+                async def query_and_replace(hook):
+                    items = await query_by_id(hook)
+                    item = items[0]
+                    item["title"] = f"Title {i}"
+                    item["updated_at"] = datetime.utcnow().isoformat()
+                    await container.replace_item(item, item, response_hook=hook)
+
+                async def patch(hook, session_id=session["id"]):
+                    await container.patch_item(
+                        item=session_id,
+                        partition_key=session_id,
+                        patch_operations=[
+                            {"op": "set", "path": "/title", "value": f"Title {i}"},
+                            {"op": "set", "path": "/updated_at", "value": datetime.utcnow().isoformat()}
+                        ],
+                        response_hook=hook
+                    )
+
+                await _timed(query_read, query_by_id)
+                await _timed(point_read, read_by_id)
+                await _timed(replace_update, query_and_replace)
+                await _timed(patch_update, patch)
+
+        finally:
+            for document in legacy_sessions:
+                await container.delete_item(document["id"], partition_key=NonePartitionKeyValue)
+            for document in sessions:
+                await container.delete_item(document["id"], partition_key=document["id"])
+
+    print(f"{iterations} iterations over {session_count} sessions per layout")
+    for measurement in (query_read, point_read, replace_update, patch_update):
+        print(measurement.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="session documents per layout")
+    parser.add_argument("--iterations", type=int, default=50, help="lookups and updates per pattern")
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Chat endpoints when Azure OpenAI cannot answer: status codes and what is saved"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.dependencies import get_services
+from app.routers import chat
+from app.services.ai_service import AIService, NoBackendAvailableError, ThrottledError
+from app.services.chat_service import ChatHistoryService
+from app.services.context_service import ContextWindowBuilder
+from app.services.cosmos_store import cosmos_store
+from benchmarks.fakes.cosmos_container import InMemoryContainer
+
+
+class FailingAIService(AIService):
+    """Raises ``error`` in place of calling Azure OpenAI"""
+
+    def __init__(self, error: Exception):
+        super().__init__(cache=None)
+        self.error = error
+
+    async def generate_response(self, messages, deployment_name: str = None) -> str:
+        raise self.error
+
+    async def stream_response(self, messages, deployment_name: str = None):
+        raise self.error
+        yield
+
+
+@pytest.fixture
+def container():
+    container = InMemoryContainer()
+    cosmos_store.use_container(container)
+    yield container
+    asyncio.run(cosmos_store.close())
+
+
+def _post(error: Exception, path: str = "/api/chat/", message: str = "hello"):
+    ai_service = FailingAIService(error)
+    chat_history_service = ChatHistoryService(cache=None)
+    services = SimpleNamespace(
+        ai_service=ai_service,
+        chat_history_service=chat_history_service,
+        context_builder=ContextWindowBuilder(ai_service, chat_history_service),
+        title_queue=None
+    )
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[get_services] = lambda: services
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(path, json={"message": message})
+        await chat_history_service.writer.flush_all()
+        return response
+
+    return asyncio.run(scenario())
+
+
+def test_unavailable_upstream_is_a_503_with_retry_after(container):
+    response = _post(NoBackendAvailableError("every circuit is open", retry_after=12.5))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "13"
+    assert "every circuit is open" in response.json()["detail"]
+
+
+def test_throttled_upstream_is_a_429_with_retry_after(container):
+    response = _post(ThrottledError("throttled", retry_after=None))
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+
+def _saved_messages(container: InMemoryContainer):
+    return [item for item in container.items.values() if item.get("role")]
+
+
+@pytest.mark.parametrize("path", ["/api/chat/", "/api/chat/stream"])
+def test_failed_reply_saves_only_the_user_message(container, path):
+    response = _post(NoBackendAvailableError("every circuit is open"), path=path, message="still there?")
+    if path.endswith("stream"):
+        assert response.status_code == 200
+        assert "event: error" in response.text
+        assert '"status_code":503' in response.text
+    else:
+        assert response.status_code == 503
+    saved = _saved_messages(container)
+    assert [(message["role"], message["content"]) for message in saved] == [("user", "still there?")]
@@ -0,0 +1,109 @@
+"""Completion cache: key normalization, temperature bypass, backends and AIService use"""
+import asyncio
+from types import SimpleNamespace
+
+from app.services.ai_service import AIService
+from app.services.completion_cache import (
+    CompletionCache, InMemoryCompletionBackend, RedisCompletionBackend, completion_key
+)
+from benchmarks.fakes.redis_server import start_server
+
+
+def _messages(content: str):
+    return [{"role": "user", "content": content}]
+
+
+def test_key_ignores_whitespace_and_unicode_form():
+    key = completion_key("chat", _messages("café  menu \n"), temperature=0.2)
+    assert completion_key("chat", _messages("café menu"), temperature=0.2) == key
+    assert completion_key("chat", _messages("cafe menu"), temperature=0.2) != key
+    assert completion_key("other", _messages("café menu"), temperature=0.2) != key
+    assert completion_key("chat", _messages("café menu"), temperature=0.3) != key
+
+
+def test_sampled_requests_bypass_the_cache():
+    cache = CompletionCache(InMemoryCompletionBackend(10), ttl_seconds=60, max_temperature=0.3)
+    assert cache.key_for(model="chat", messages=_messages("hi"), temperature=0.2)
+    assert cache.key_for(model="chat", messages=_messages("hi"), temperature=0.7) is None
+    assert cache.key_for(model="chat", messages=_messages("hi")) is None, "the API default temperature is 1"
+    assert cache.stats()["bypasses"] == 2
+
+
+def test_memory_backend_expires_and_evicts():
+    async def scenario():
+        backend = InMemoryCompletionBackend(max_entries=2)
+        await backend.set("old", "a", ttl_seconds=0.01)
+        await backend.set("b", "b", ttl_seconds=60)
+        await asyncio.sleep(0.02)
+        expired = await backend.get("old")
+        await backend.set("c", "c", ttl_seconds=60)
+        await backend.set("d", "d", ttl_seconds=60)
+        return backend, expired, await backend.get("b"), await backend.get("d")
+
+    backend, expired, evicted, kept = asyncio.run(scenario())
+    assert expired is None and evicted is None and kept == "d"
+    assert backend.evictions == 2
+
+
+def test_backend_failures_count_as_misses():
+    class BrokenBackend(InMemoryCompletionBackend):
+        async def get(self, key: str):
+            raise ConnectionError("cache down")
+
+        async def set(self, key: str, value: str, ttl_seconds: float):
+            raise ConnectionError("cache down")
+
+    async def scenario():
+        cache = CompletionCache(BrokenBackend(10), ttl_seconds=60, max_temperature=0.3)
+        await cache.set("key", "value")
+        return cache, await cache.get("key")
+
+    cache, value = asyncio.run(scenario())
+    assert value is None
+    assert cache.stats()["misses"] == 1 and cache.errors == 2
+
+
+def test_redis_backend_round_trip():
+    async def scenario():
+        server, _ = await start_server()
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisCompletionBackend(f"redis://127.0.0.1:{port}/0")
+        try:
+            await backend.set("key", "café", ttl_seconds=60)
+            return await backend.get("key"), await backend.get("missing")
+        finally:
+            await backend.close()
+            server.close()
+            await server.wait_closed()
+
+    assert asyncio.run(scenario()) == ("café", None)
+
+
+class CountingAIService(AIService):
+    """Answers completions locally, counting upstream calls"""
+
+    def __init__(self, cache: CompletionCache):
+        super().__init__(cache=cache)
+        self.upstream_calls = 0
+
+    async def _create_completion(self, timeout: float, priority: int, **kwargs):
+        self.upstream_calls += 1
+        message = SimpleNamespace(content=f"answer {self.upstream_calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_repeated_prompts_are_answered_from_the_cache():
+    async def scenario():
+        service = CountingAIService(CompletionCache(InMemoryCompletionBackend(10), ttl_seconds=60, max_temperature=0.3))
+        cold = await service._complete_text(5.0, model="chat", messages=_messages("title  please"), temperature=0.3)
+        warm = await service._complete_text(5.0, model="chat", messages=_messages("title please"), temperature=0.3)
+        sampled = [
+            await service._complete_text(5.0, model="chat", messages=_messages("hi"), temperature=0.7)
+            for _ in range(2)
+        ]
+        return service, cold, warm, sampled
+
+    service, cold, warm, sampled = asyncio.run(scenario())
+    assert cold == warm == "answer 1"
+    assert sampled == ["answer 2", "answer 3"]
+    assert service.upstream_calls == 3
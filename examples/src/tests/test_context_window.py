@@ -0,0 +1,96 @@
+"""Token-budgeted context window: which messages are kept and the rolling summary"""
+import asyncio
+
+from app.models import ChatMessage, SessionSummary
+from app.services.context_service import ContextWindowBuilder, TokenCounter
+
+# Estimated without tiktoken: 40 characters are 11 tokens, plus 4 for the message format
+MESSAGE_TOKENS = 15
+
+
+class StubAIService:
+    def __init__(self):
+        self.summarized = []
+
+    async def summarize_conversation(self, previous_summary, messages):
+        self.summarized.append((previous_summary, [m.content for m in messages]))
+        return f"{previous_summary or ''}+{len(messages)}"
+
+
+class StubChatHistoryService:
+    def __init__(self, summary: SessionSummary = None):
+        self.summary = summary
+        self.updates = []
+
+    async def get_session_summary(self, session_id: str):
+        return self.summary
+
+    async def update_session(self, session_id: str, summary: SessionSummary = None, if_match: str = None, **kwargs):
+        self.updates.append((summary, if_match))
+        return True
+
+    async def is_available(self) -> bool:
+        return True
+
+
+def _messages(count: int):
+    return [ChatMessage(session_id="s1", role="user", content=f"{i:02d}".ljust(40, "x")) for i in range(count)]
+
+
+def _builder(max_tokens: int, summary_enabled: bool = False, summary: SessionSummary = None) -> ContextWindowBuilder:
+    builder = ContextWindowBuilder(StubAIService(), StubChatHistoryService(summary), TokenCounter("cl100k_base", 100))
+    builder.max_tokens = max_tokens
+    builder.summary_enabled = summary_enabled
+    return builder
+
+
+def test_token_counts_are_cached_per_message():
+    counter = TokenCounter("cl100k_base", max_cached_messages=2)
+    messages = _messages(3)
+    assert [counter.count_message(m) for m in messages] == [MESSAGE_TOKENS] * 3
+    assert list(counter._counts) == [messages[1].id, messages[2].id]
+
+
+def test_newest_messages_that_fit_are_kept():
+    messages = _messages(10)
+    context = asyncio.run(_builder(max_tokens=MESSAGE_TOKENS * 3 + 1).build("s1", messages))
+    assert context == messages[-3:]
+
+
+def test_newest_message_is_kept_even_over_budget():
+    messages = _messages(3)
+    context = asyncio.run(_builder(max_tokens=1).build("s1", messages))
+    assert context == messages[-1:]
+
+
+def test_dropped_messages_are_folded_into_the_summary():
+    async def scenario():
+        builder = _builder(max_tokens=MESSAGE_TOKENS * 2, summary_enabled=True)
+        messages = _messages(5)
+        context = await builder.build("s1", messages)
+        await asyncio.gather(*builder._summary_tasks.values())
+        return builder, messages, context
+
+    builder, messages, context = asyncio.run(scenario())
+    assert context == messages[-2:]
+    assert builder.ai_service.summarized == [(None, [m.content for m in messages[:3]])]
+    summary, _ = builder.chat_history_service.updates[0]
+    assert summary.through_message_id == messages[2].id
+
+
+def test_stored_summary_replaces_the_messages_it_covers():
+    async def scenario():
+        messages = _messages(6)
+        summary = SessionSummary(content="earlier", through_message_id=messages[1].id, etag="etag-1")
+        builder = _builder(max_tokens=MESSAGE_TOKENS * 4, summary_enabled=True, summary=summary)
+        context = await builder.build("s1", messages)
+        await asyncio.gather(*builder._summary_tasks.values())
+        return builder, messages, context
+
+    builder, messages, context = asyncio.run(scenario())
+    assert context[0].role == "system" and "earlier" in context[0].content
+    # The summary's tokens come out of the budget, leaving room for three messages
+    assert context[1:] == messages[-3:]
+    # Only the dropped message the summary does not cover yet is folded in, guarded by the ETag
+    assert builder.ai_service.summarized == [("earlier", [messages[2].content])]
+    assert builder.chat_history_service.updates[0][1] == "etag-1"
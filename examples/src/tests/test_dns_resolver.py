@@ -0,0 +1,105 @@
+"""DNS resolver cache and the private address check"""
+import asyncio
+
+from app.models import DnsResolutionResult
+from app.services.dns_resolver import DnsResolver
+
+ANSWERS = {
+    "myopenai.openai.azure.com": ["10.0.1.4"],
+    "mixed.example": ["10.0.1.5", "20.50.1.1"],
+    "v6.example": ["fd00::4"],
+}
+
+
+class StubResolver(DnsResolver):
+    """Answers from ANSWERS through the system resolver path, counting lookups"""
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    async def _get_resolver(self):
+        return None
+
+    async def _lookup_system(self, hostname: str) -> DnsResolutionResult:
+        self.lookups += 1
+        await asyncio.sleep(0.01)
+        result = DnsResolutionResult(hostname=hostname, resolver="system")
+        if hostname in ANSWERS:
+            result.addresses = list(ANSWERS[hostname])
+        else:
+            result.error_message = "DNS resolution failed: not found"
+        return result
+
+
+def test_private_ranges():
+    resolver = DnsResolver()
+    assert resolver.is_private("10.2.3.4")
+    assert resolver.is_private("172.16.0.1")
+    assert resolver.is_private("192.168.1.1")
+    assert resolver.is_private("fd00::4")
+    assert not resolver.is_private("20.50.1.1")
+    assert not resolver.is_private("172.32.0.1")
+
+
+def test_answers_are_cached_for_their_ttl():
+    async def scenario():
+        resolver = StubResolver()
+        resolver.default_ttl_seconds = 60
+        first = await resolver.resolve("MyOpenAI.openai.azure.com.")
+        second = await resolver.resolve("myopenai.openai.azure.com")
+        bypassed = await resolver.resolve("myopenai.openai.azure.com", use_cache=False)
+        return resolver, first, second, bypassed
+
+    resolver, first, second, bypassed = asyncio.run(scenario())
+    assert resolver.lookups == 2
+    assert not first.cached and second.cached and not bypassed.cached
+    assert 0 < second.ttl_seconds <= 60
+    assert first.is_private and first.private_addresses == ["10.0.1.4"]
+
+
+def test_concurrent_lookups_share_one_query():
+    async def scenario():
+        resolver = StubResolver()
+        results = await asyncio.gather(*(resolver.resolve("v6.example", use_cache=False) for _ in range(5)))
+        return resolver, results
+
+    resolver, results = asyncio.run(scenario())
+    assert resolver.lookups == 1
+    assert all(result.addresses == ["fd00::4"] and result.is_private for result in results)
+
+
+def test_public_answers_are_flagged():
+    result = asyncio.run(StubResolver().resolve("mixed.example"))
+    assert not result.is_private
+    assert result.private_addresses == ["10.0.1.5"]
+
+
+def test_failures_are_cached_briefly():
+    async def scenario():
+        resolver = StubResolver()
+        resolver.negative_ttl_seconds = 0.05
+        failed = await resolver.resolve("missing.example")
+        await resolver.resolve("missing.example")
+        await asyncio.sleep(0.06)
+        await resolver.resolve("missing.example")
+        return resolver, failed
+
+    resolver, failed = asyncio.run(scenario())
+    assert failed.error_message and not failed.addresses
+    assert failed.ttl_seconds == 0.05
+    assert resolver.lookups == 2
+
+
+def test_address_literals_and_cache_bound():
+    async def scenario():
+        resolver = StubResolver()
+        resolver.max_entries = 2
+        literal = await resolver.resolve("10.9.9.9")
+        for hostname in ANSWERS:
+            await resolver.resolve(hostname)
+        return resolver, literal
+
+    resolver, literal = asyncio.run(scenario())
+    assert literal.resolver == "literal" and literal.is_private
+    assert list(resolver._cache) == ["mixed.example", "v6.example"]
@@ -0,0 +1,96 @@
+"""Cached health state and the liveness/readiness probes"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers import health
+from app.services.health_service import HealthMonitor
+
+
+class StubAIService:
+    def __init__(self, available: bool = True):
+        self.available = available
+
+    def is_available(self) -> bool:
+        return self.available
+
+
+class StubChatHistoryService:
+    def __init__(self, available: bool = True):
+        self.available = available
+        self.pings = 0
+
+    async def ping(self) -> bool:
+        self.pings += 1
+        if self.available is None:
+            raise ConnectionError("Cosmos DB unreachable")
+        return self.available
+
+
+def _monitor(ai_available: bool = True, cosmos_available: bool = True, require_dependencies: bool = False,
+             background_startup: bool = False) -> HealthMonitor:
+    monitor = HealthMonitor(StubAIService(ai_available), StubChatHistoryService(cosmos_available))
+    monitor.require_dependencies = require_dependencies
+    monitor.background_startup = background_startup
+    monitor.interval_seconds = 3600
+    return monitor
+
+
+def _get(monitor: HealthMonitor, path: str) -> httpx.Response:
+    app = FastAPI()
+    app.include_router(health.router)
+    app.state.services = SimpleNamespace(health_monitor=monitor)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get(path)
+
+    return asyncio.run(scenario())
+
+
+def test_not_ready_until_started():
+    monitor = _monitor()
+    assert not monitor.ready
+    assert _get(monitor, "/health/ready").status_code == 503
+    assert _get(monitor, "/health/live").status_code == 200
+
+
+def test_background_startup_serves_while_connecting():
+    assert _monitor(background_startup=True).ready
+    assert not _monitor(background_startup=True, require_dependencies=True).ready
+
+
+def test_dependency_outage_only_fails_readiness_when_required():
+    async def scenario(require_dependencies: bool):
+        monitor = _monitor(cosmos_available=None, require_dependencies=require_dependencies)
+        await monitor.start()
+        await monitor.stop()
+        monitor.started = True  # As if still running
+        return monitor
+
+    tolerant = asyncio.run(scenario(False))
+    assert tolerant.ready and not tolerant.cosmos_db_available
+    assert tolerant.status()["status"] == "degraded"
+    strict = asyncio.run(scenario(True))
+    assert not strict.ready
+    response = _get(strict, "/health/ready")
+    assert response.status_code == 503
+    assert response.json()["cosmos_db_available"] is False
+
+
+def test_probes_read_the_cached_state():
+    async def scenario():
+        monitor = _monitor()
+        await monitor.start()
+        await monitor.stop()
+        monitor.started = True
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    for _ in range(3):
+        response = _get(monitor, "/health")
+        assert response.json()["status"] == "healthy"
+    assert _get(monitor, "/health/ready").status_code == 200
+    assert monitor.chat_history_service.pings == 1
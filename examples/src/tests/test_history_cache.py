@@ -0,0 +1,109 @@
+"""Conversation history cache: limits, write-through and checks against the store"""
+import asyncio
+import time
+
+import pytest
+
+from app.models import ChatMessage
+from app.services.chat_service import ChatHistoryService
+from app.services.cosmos_store import cosmos_store
+from app.services.history_cache import SessionHistoryCache
+from benchmarks.fakes.cosmos_container import InMemoryContainer
+
+
+def _message(session_id: str, content: str, role: str = "user") -> ChatMessage:
+    return ChatMessage(session_id=session_id, role=role, content=content)
+
+
+def test_least_recently_used_sessions_are_evicted():
+    cache = SessionHistoryCache(max_sessions=2, max_bytes=10 ** 6, ttl_seconds=60)
+    for session_id in ("a", "b"):
+        cache.put(session_id, [_message(session_id, "hi")])
+    cache.get("a")
+    cache.put("c", [_message("c", "hi")])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"]["session_limit"] == 1
+
+
+def test_memory_limit_keeps_the_newest_session():
+    cache = SessionHistoryCache(max_sessions=10, max_bytes=1000, ttl_seconds=60)
+    cache.put("a", [_message("a", "x" * 600)])
+    cache.put("b", [_message("b", "x" * 2000)])
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.stats()["evictions"]["memory_limit"] == 1
+
+
+def test_entries_expire():
+    cache = SessionHistoryCache(max_sessions=10, max_bytes=10 ** 6, ttl_seconds=0.01)
+    cache.put("a", [_message("a", "hi")])
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"]["expired"] == 1
+
+
+def test_append_writes_through_once():
+    cache = SessionHistoryCache(max_sessions=10, max_bytes=10 ** 6, ttl_seconds=60)
+    assert not cache.append("a", _message("a", "not cached"))
+    cache.put("a", [])
+    message = _message("a", "hi")
+    assert cache.append("a", message)
+    assert cache.append("a", message)
+    assert [m.content for m in cache.get("a")] == ["hi"]
+
+
+@pytest.fixture
+def container():
+    container = InMemoryContainer()
+    cosmos_store.use_container(container)
+    yield container
+    asyncio.run(cosmos_store.close())
+
+
+def _service(verify: bool, interval: float = 5.0) -> ChatHistoryService:
+    service = ChatHistoryService(cache=SessionHistoryCache(max_sessions=10, max_bytes=10 ** 6, ttl_seconds=60))
+    service.verify_cache = verify
+    service.verify_interval_seconds = interval
+    return service
+
+
+def test_cached_history_is_served_without_a_query(container):
+    async def scenario():
+        service = _service(verify=False)
+        await service.save_message(_message("s1", "first"))
+        await service.get_session_messages("s1")
+        await service.save_messages([_message("s1", "second"), _message("s1", "reply", role="assistant")])
+        container.operations.clear()
+        return await service.get_session_messages("s1")
+
+    messages = asyncio.run(scenario())
+    assert [m.content for m in messages] == ["first", "second", "reply"]
+    assert "query_items" not in container.operations
+
+
+def test_verification_finds_messages_written_by_another_replica(container):
+    async def scenario():
+        service = _service(verify=True, interval=0)
+        other_replica = _service(verify=True, interval=0)
+        await service.save_message(_message("s1", "first"))
+        await service.get_session_messages("s1")
+        await other_replica.save_message(_message("s1", "from elsewhere"))
+        return service, await service.get_session_messages("s1")
+
+    service, messages = asyncio.run(scenario())
+    assert [m.content for m in messages] == ["first", "from elsewhere"]
+    assert service.cache.stats()["evictions"]["stale"] == 1
+
+
+def test_verification_runs_at_most_once_per_interval(container):
+    async def scenario():
+        service = _service(verify=True, interval=60)
+        await service.save_message(_message("s1", "first"))
+        await service.get_session_messages("s1")
+        container.operations.clear()
+        for _ in range(3):
+            await service.get_session_messages("s1")
+
+    asyncio.run(scenario())
+    assert "query_items" not in container.operations
@@ -0,0 +1,55 @@
+"""Sampled, non-blocking structured logging"""
+import json
+import logging
+import queue
+
+from app.logging_config import JsonFormatter, NonBlockingQueueHandler, SamplingFilter
+
+
+def _record(level: int = logging.INFO, msg: str = "hello %s", args=("world",), **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_sampling_keeps_an_exact_share_of_info_records():
+    sampler = SamplingFilter(0.25)
+    kept = [sampler.filter(_record()) for _ in range(100)]
+    assert sum(kept) == 25
+    assert kept[:8] == [False, False, False, True] * 2
+
+
+def test_sampling_never_drops_warnings():
+    sampler = SamplingFilter(0.0)
+    assert not sampler.filter(_record(logging.DEBUG))
+    assert sampler.filter(_record(logging.WARNING))
+    assert sampler.filter(_record(logging.ERROR))
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    for _ in range(5):
+        handler.handle(_record())
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_message_is_rendered_when_logged():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    items = ["a"]
+    record = _record(msg="items %s", args=(items,))
+    handler.handle(record)
+    items.append("b")
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "items ['a']"
+    assert queued.args is None
+    # Other handlers still see the original record
+    assert record.args == (items,)
+
+
+def test_json_lines_carry_extra_fields():
+    entry = json.loads(JsonFormatter().format(_record(session_id="s1", color_message="ignored")))
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO" and entry["logger"] == "app.test"
+    assert entry["session_id"] == "s1"
+    assert "color_message" not in entry
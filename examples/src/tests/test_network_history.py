@@ -0,0 +1,76 @@
+"""Rolling connectivity history: ring buffer, window percentiles and status grading"""
+import math
+
+import pytest
+
+from app.models import NetworkTestResult
+from app.services.network_history import ConnectivityHistory, EndpointHistory, _percentile
+
+
+def test_percentile_interpolates_between_samples():
+    values = [10.0, 20.0, 30.0, 40.0]
+    assert _percentile(values, 50) == 25.0
+    assert _percentile(values, 0) == 10.0
+    assert _percentile(values, 100) == 40.0
+    assert _percentile([7.0], 99) == 7.0
+
+
+def test_ring_buffer_keeps_only_the_newest_samples():
+    history = EndpointHistory(capacity=5)
+    for i in range(12):
+        history.add(timestamp=1000 + i, reachable=True, latency_ms=float(i))
+    stats = history.stats("a", window_seconds=100, now=1011)
+    assert history.count == 5
+    assert stats.samples == 5
+    assert stats.p50_ms == 9.0
+    assert stats.mean_ms == 9.0
+    assert stats.jitter_ms == 1.0
+
+
+def test_window_excludes_old_samples_and_counts_unreachable():
+    history = EndpointHistory(capacity=10)
+    history.add(timestamp=0, reachable=True, latency_ms=500.0)  # Outside the window
+    history.add(timestamp=100, reachable=True, latency_ms=10.0)
+    history.add(timestamp=101, reachable=False, latency_ms=None)
+    history.add(timestamp=102, reachable=True, latency_ms=30.0)
+    history.add(timestamp=103, reachable=False, latency_ms=None)
+    stats = history.stats("a", window_seconds=10, now=105)
+    assert stats.samples == 4
+    assert stats.availability_percent == 50.0
+    assert stats.p99_ms == pytest.approx(29.8)
+    assert stats.mean_ms == 20.0
+
+
+def test_empty_window_has_no_latency():
+    stats = EndpointHistory(capacity=3).stats("a", window_seconds=60)
+    assert stats.samples == 0
+    assert stats.availability_percent is None and stats.p50_ms is None
+
+
+def _sweep(history: ConnectivityHistory, latencies):
+    history.record([
+        NetworkTestResult(endpoint=endpoint, is_reachable=latency is not None, response_time_ms=latency)
+        for endpoint, latency in latencies.items()
+    ])
+
+
+def test_endpoints_are_graded_by_availability_and_tail_latency():
+    history = ConnectivityHistory(capacity=20)
+    history.healthy_availability_percent = 99
+    history.degraded_availability_percent = 90
+    history.latency_threshold_ms = 100
+    for i in range(10):
+        _sweep(history, {
+            "fast": 10.0,
+            "slow": 250.0,
+            "flaky": None if i < 5 else 10.0,
+        })
+
+    stats = {s.endpoint: s for s in history.stats(["fast", "slow", "flaky", "unknown"], window_seconds=60)}
+    assert [history.endpoint_status(stats[name]) for name in ("fast", "slow", "flaky", "unknown")] == [
+        "healthy", "degraded", "unhealthy", "unknown"
+    ]
+    assert history.overall_status(list(stats.values())) == "degraded"
+    assert history.overall_status([stats["fast"]]) == "healthy"
+    assert history.overall_status([stats["fast"], stats["flaky"]]) == "unhealthy"
+    assert math.isclose(stats["flaky"].availability_percent, 50.0)
@@ -0,0 +1,76 @@
+"""Cached network status: shared sweeps and background refresh"""
+import asyncio
+
+import pytest
+
+from app.models import NetworkTestSummary
+from app.services.network_monitor import NetworkStatusMonitor
+
+
+class StubNetworkService:
+    """Counts sweeps; each one takes ``delay`` seconds"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.sweeps = 0
+
+    async def run_connectivity_tests(self) -> NetworkTestSummary:
+        self.sweeps += 1
+        await asyncio.sleep(self.delay)
+        return NetworkTestSummary(total_endpoints=1, reachable_endpoints=1, unreachable_endpoints=0,
+                                  test_results=[], overall_status=f"sweep {self.sweeps}")
+
+
+def test_concurrent_refreshes_share_one_sweep():
+    async def scenario():
+        monitor = NetworkStatusMonitor(StubNetworkService())
+        summaries = await asyncio.gather(*(monitor.refresh() for _ in range(10)))
+        return monitor, summaries
+
+    monitor, summaries = asyncio.run(scenario())
+    assert monitor.network_service.sweeps == 1
+    assert all(summary is summaries[0] for summary in summaries)
+
+
+def test_cached_summary_is_served_until_forced():
+    async def scenario():
+        monitor = NetworkStatusMonitor(StubNetworkService(delay=0))
+        first = await monitor.get_summary()
+        cached = await monitor.get_summary()
+        forced = await monitor.get_summary(force_refresh=True)
+        return monitor, first, cached, forced
+
+    monitor, first, cached, forced = asyncio.run(scenario())
+    assert cached is first
+    assert forced.overall_status == "sweep 2"
+    assert monitor.age_seconds < 1
+
+
+def test_cancelled_caller_does_not_cancel_the_sweep():
+    async def scenario():
+        monitor = NetworkStatusMonitor(StubNetworkService())
+        caller = asyncio.create_task(monitor.refresh())
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        summary = await monitor.refresh()
+        return monitor, summary
+
+    monitor, summary = asyncio.run(scenario())
+    assert monitor.network_service.sweeps == 1
+    assert summary.overall_status == "sweep 1"
+
+
+def test_background_refresh_repeats_on_the_interval():
+    async def scenario():
+        monitor = NetworkStatusMonitor(StubNetworkService(delay=0))
+        monitor.interval_seconds = 0.01
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    assert monitor.network_service.sweeps >= 3
+    assert monitor.summary is not None
@@ -0,0 +1,91 @@
+"""TLS and HTTPS network probes against the local TLS stand-in"""
+import asyncio
+import ssl
+
+import pytest
+
+from app.config import config_manager
+from app.services.network_service import NetworkTestService
+from benchmarks.fakes.tls_server import generate_certificates, start_server
+
+
+@pytest.fixture(scope="module")
+def certificates(tmp_path_factory):
+    return generate_certificates(str(tmp_path_factory.mktemp("tls")))
+
+
+def _probe(certificates, ca_file, mode: str = "https"):
+    _, cert_file, key_file = certificates
+
+    async def scenario():
+        server = await start_server(cert_file, key_file)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            service = NetworkTestService()
+            return service, await service.test_endpoint_connectivity(f"localhost:{port}", mode=mode)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(config_manager.settings, "network_probe_ca_file", ca_file)
+        return asyncio.run(scenario())
+
+
+def test_https_probe_trusts_the_configured_ca(certificates):
+    ca_file = certificates[0]
+    _, result = _probe(certificates, ca_file)
+    assert result.is_reachable, result.error_message
+    assert result.tls_version.startswith("TLS")
+    assert result.http_status_code == 204
+    assert result.tls_time_ms is not None and result.ttfb_ms is not None
+
+
+def test_tls_probe_rejects_an_untrusted_certificate(certificates):
+    _, result = _probe(certificates, None, mode="tls")
+    assert not result.is_reachable
+    assert result.error_message.startswith("TLS certificate verification failed")
+
+
+def test_tls_probe_checks_the_hostname(tmp_path):
+    other_host = generate_certificates(str(tmp_path), hostname="other.example")
+    _, result = _probe(other_host, other_host[0], mode="tls")
+    assert not result.is_reachable
+    assert "verification failed" in result.error_message
+
+
+def test_ca_file_is_added_to_the_system_store(certificates):
+    service, _ = _probe(certificates, certificates[0], mode="tcp")
+    system_certificates = ssl.create_default_context().get_ca_certs()
+    assert len(service._ssl_context.get_ca_certs()) == len(system_certificates) + 1
+
+
+@pytest.mark.parametrize("endpoint, expected", [
+    ("example.com", ("example.com", 443)),
+    ("example.com:8443", ("example.com", 8443)),
+    ("10.0.0.4:80", ("10.0.0.4", 80)),
+    ("[::1]:8443", ("::1", 8443)),
+    ("[fd00::4]", ("fd00::4", 443)),
+    ("fd00::4", ("fd00::4", 443)),
+])
+def test_endpoints_are_split_into_host_and_port(endpoint, expected):
+    service = NetworkTestService()
+    service.probe_port = 443
+    assert service._split_endpoint(endpoint, None) == expected
+
+
+def test_probe_reaches_a_bracketed_ipv6_endpoint(certificates):
+    _, cert_file, key_file = certificates
+
+    async def scenario():
+        server = await start_server(cert_file, key_file, host="::1")
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await NetworkTestService().test_endpoint_connectivity(f"[::1]:{port}", mode="tcp")
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    result = asyncio.run(scenario())
+    assert result.is_reachable, result.error_message
+    assert result.ip_address == "::1"
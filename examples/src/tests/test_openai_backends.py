@@ -0,0 +1,234 @@
+"""Circuit breaker, failover and retry budgets against the fake Azure OpenAI server"""
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.models import ChatMessage
+from app.services.ai_service import AIService, NoBackendAvailableError, RetryDeadlineExceededError, ThrottledError
+from app.services.openai_backends import (
+    CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, BackendRouter, CircuitBreaker, OpenAIBackend
+)
+from app.services.rate_limiter import AdaptiveRateLimiter
+from benchmarks.fakes.openai_server import FakeOpenAI, FakeOpenAIConfig, start_server
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10)
+    for _ in range(2):
+        breaker.record_failure(now=0)
+    assert breaker.state == CIRCUIT_CLOSED
+
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure(now=0)
+    assert breaker.state == CIRCUIT_CLOSED, "a success resets the failure count"
+
+    breaker.record_failure(now=0)
+    assert breaker.state == CIRCUIT_OPEN
+    assert not breaker.available(now=5)
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure(now=0)
+    assert breaker.available(now=10)
+
+    breaker.on_dispatch(now=10)
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert not breaker.available(now=10), "only one trial request while half open"
+
+    breaker.record_failure(now=11)
+    assert breaker.state == CIRCUIT_OPEN
+    assert not breaker.available(now=20)
+
+    breaker.on_dispatch(now=21)
+    breaker.record_success()
+    assert breaker.state == CIRCUIT_CLOSED
+    assert breaker.available(now=21)
+
+
+def test_breaker_release_ends_trial_without_verdict():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure(now=0)
+    breaker.on_dispatch(now=0)
+    breaker.release()
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert breaker.available(now=0)
+
+
+def _backend(name: str, breaker: CircuitBreaker = None, client=None) -> OpenAIBackend:
+    return OpenAIBackend(
+        name=name, client=client, deployment="chat", weight=1.0,
+        rate_limiter=AdaptiveRateLimiter(0, 0, default_backoff_seconds=0.01),
+        breaker=breaker or CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    )
+
+
+def test_router_skips_open_circuits():
+    broken = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    broken.record_failure(now=time.monotonic())
+    router = BackendRouter([_backend("a", broken), _backend("b")])
+    assert {router.select().name for _ in range(20)} == {"b"}
+    assert router.select(exclude={"b"}) is None
+
+
+def test_cancel_while_queued_for_a_slot_releases_the_backend():
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        breaker.record_failure(now=time.monotonic())
+        backend = _backend("a", breaker)
+        backend.rate_limiter = AdaptiveRateLimiter(0, 100000, default_backoff_seconds=0.01)
+        service = AIService(cache=None)
+        service.router = BackendRouter([backend])
+        service._request_slots = asyncio.Semaphore(0)  # Every slot is taken
+
+        request = asyncio.create_task(_complete(service))
+        await asyncio.sleep(0.01)
+        assert breaker.state == CIRCUIT_HALF_OPEN and not breaker.available(time.monotonic())
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        return backend
+
+    backend = asyncio.run(scenario())
+    # The trial was never sent, so the half open circuit lets the next request try
+    assert backend.breaker.available(time.monotonic())
+    assert backend.rate_limiter.tokens.level == 100000
+
+
+class _Fakes:
+    """Fake Azure OpenAI servers, one per backend, and an AIService routed across them"""
+
+    def __init__(self, *configs: FakeOpenAIConfig):
+        self.configs = configs
+        self.fakes = []
+        self.servers = []
+        self.http_client = None
+
+    async def __aenter__(self) -> AIService:
+        self.http_client = httpx.AsyncClient()
+        backends = []
+        for index, config in enumerate(self.configs):
+            server, fake = await start_server(fake=FakeOpenAI(config))
+            port = server.sockets[0].getsockname()[1]
+            self.servers.append(server)
+            self.fakes.append(fake)
+            client = openai.AsyncAzureOpenAI(azure_endpoint=f"http://127.0.0.1:{port}", api_key="test",
+                                             api_version="2024-02-01", max_retries=0, http_client=self.http_client)
+            backends.append(_backend(f"backend-{index}", client=client))
+
+        service = AIService(cache=None)
+        service.router = BackendRouter(backends)
+        service.client = backends[0].client
+        service.retry_backoff_seconds = 0.01
+        return service
+
+    async def __aexit__(self, *exc_info):
+        await self.http_client.aclose()
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+
+
+async def _complete(service: AIService):
+    return await service._call_upstream(5.0, 0, model="chat", messages=MESSAGES, max_tokens=10)
+
+
+def test_fails_over_on_server_error():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, error_rate=1.0), FakeOpenAIConfig(latency_ms=0))
+        async with fakes as service:
+            for _ in range(5):
+                response = await _complete(service)
+                assert response.choices[0].message.content
+            failing, healthy = service.router.backends
+            assert fakes.fakes[1].stats["ok"] == 5
+            assert failing.failures == fakes.fakes[0].stats["errors"]
+            assert healthy.breaker.state == CIRCUIT_CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_fails_over_on_throttling():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, throttle_rate=1.0, retry_after_ms=5000),
+                       FakeOpenAIConfig(latency_ms=0))
+        async with fakes as service:
+            for _ in range(3):
+                await _complete(service)
+            throttled, healthy = service.router.backends
+            assert fakes.fakes[1].stats["ok"] == 3
+            # A 429 pauses the backend instead of counting against its circuit
+            assert throttled.breaker.state == CIRCUIT_CLOSED
+            assert throttled.rate_limiter.blocked_until > time.monotonic()
+
+    asyncio.run(scenario())
+
+
+def test_retry_budget_for_server_errors():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, error_rate=1.0), FakeOpenAIConfig(latency_ms=0, error_rate=1.0))
+        async with fakes as service:
+            service.max_retries = 2
+            with pytest.raises(openai.InternalServerError):
+                await _complete(service)
+            # Every backend is tried once per round: the first round plus max_retries
+            assert sum(fake.stats["requests"] for fake in fakes.fakes) == 2 * 3
+
+    asyncio.run(scenario())
+
+
+def test_retry_budget_for_throttling():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, throttle_rate=1.0, retry_after_ms=10))
+        async with fakes as service:
+            service.max_throttle_retries = 2
+            with pytest.raises(openai.RateLimitError):
+                await _complete(service)
+            assert fakes.fakes[0].stats["throttled"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_retry_deadline_fails_fast():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, throttle_rate=1.0, retry_after_ms=5000))
+        async with fakes as service:
+            service.retry_deadline_seconds = 1.0
+            start = time.monotonic()
+            with pytest.raises(RetryDeadlineExceededError):
+                await _complete(service)
+            # The 5s Retry-After is known to pass the deadline, so the request does not wait it out
+            assert time.monotonic() - start < 1.0
+            assert fakes.fakes[0].stats["requests"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_generate_response_raises_when_no_backend_answers():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, error_rate=1.0))
+        async with fakes as service:
+            service.max_retries = 1
+            with pytest.raises(NoBackendAvailableError) as raised:
+                await service.generate_response([ChatMessage(session_id="s1", role="user", content="hello")])
+            assert raised.value.retry_after >= 1.0
+
+    asyncio.run(scenario())
+
+
+def test_generate_response_raises_while_throttled():
+    async def scenario():
+        fakes = _Fakes(FakeOpenAIConfig(latency_ms=0, throttle_rate=1.0, retry_after_ms=10))
+        async with fakes as service:
+            service.max_throttle_retries = 0
+            with pytest.raises(ThrottledError) as raised:
+                await service.generate_response([ChatMessage(session_id="s1", role="user", content="hello")])
+            assert raised.value.retry_after > 0
+
+    asyncio.run(scenario())
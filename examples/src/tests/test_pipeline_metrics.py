@@ -0,0 +1,68 @@
+"""Per-stage latency, RU attribution and the Prometheus rendering behind /metrics"""
+import asyncio
+import math
+from types import SimpleNamespace
+
+from app.telemetry import (
+    LatencySummary, PipelineMetrics, instrumented, pipeline_metrics, record_cosmos_response, stage
+)
+
+
+def _cosmos_response(charge: str):
+    return SimpleNamespace(http_response=SimpleNamespace(headers={"x-ms-request-charge": charge}))
+
+
+def test_quantiles_cover_the_recent_samples():
+    summary = LatencySummary(capacity=100)
+    for i in range(1, 201):
+        summary.observe(i / 1000)
+    assert summary.count == 200
+    assert math.isclose(summary.sum, sum(range(1, 201)) / 1000)
+    # Only the newest 100 samples (101..200 ms) are kept
+    assert dict(summary.quantiles()) == {0.5: 0.15, 0.9: 0.19, 0.95: 0.195, 0.99: 0.199}
+    assert all(math.isnan(value) for _, value in LatencySummary().quantiles())
+
+
+def test_request_charge_goes_to_the_innermost_stage():
+    charge_before = dict(pipeline_metrics.request_charge)
+
+    @instrumented("test.inner")
+    async def inner():
+        record_cosmos_response(_cosmos_response("2.5"))
+
+    async def scenario():
+        with stage("test.outer"):
+            record_cosmos_response(_cosmos_response("1"))
+            await inner()
+            record_cosmos_response(_cosmos_response("not a number"))
+        record_cosmos_response(_cosmos_response("4"))
+
+    asyncio.run(scenario())
+    added = {key: value - charge_before.get(key, 0.0) for key, value in pipeline_metrics.request_charge.items()}
+    assert added["test.outer"] == 1.0
+    assert added["test.inner"] == 2.5
+    assert added["other"] == 4.0
+    assert pipeline_metrics.stage_latency["test.inner"].count >= 1
+
+
+def test_prometheus_rendering():
+    metrics = PipelineMetrics()
+    metrics.observe_stage("ai.generate_response", 0.25)
+    metrics.observe_request("POST", "/api/chat/", 0.5)
+    metrics.add_request_charge("history.save_message", 5.0)
+    metrics.add_tokens("eastus", "prompt", 12)
+    metrics.register_stats("write_buffer", lambda: {
+        "pending": 3, "durable": True, "backend": "memory", "average_batch_size": None, "evictions": {"stale": 2}
+    })
+    lines = metrics.render_prometheus().splitlines()
+
+    assert '# TYPE chat_stage_duration_seconds summary' in lines
+    assert 'chat_stage_duration_seconds{stage="ai.generate_response",quantile="0.99"} 0.25' in lines
+    assert 'chat_stage_duration_seconds_count{stage="ai.generate_response"} 1' in lines
+    assert 'http_request_duration_seconds_sum{method="POST",route="/api/chat/"} 0.5' in lines
+    assert 'cosmos_request_charge_total{stage="history.save_message"} 5.0' in lines
+    assert 'openai_tokens_total{backend="eastus",type="prompt"} 12' in lines
+    assert 'write_buffer_pending 3' in lines
+    assert 'write_buffer_durable 1.0' in lines
+    assert 'write_buffer_evictions{type="stale"} 2' in lines
+    assert not any(line.startswith(("write_buffer_backend", "write_buffer_average_batch_size")) for line in lines)
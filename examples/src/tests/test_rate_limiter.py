@@ -0,0 +1,85 @@
+"""Priority ordering, throttling pauses and deadlines of the client-side rate limiter"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_limiter import (
+    PRIORITY_BACKGROUND, PRIORITY_CHAT, AdaptiveRateLimiter, RateLimitTimeoutError
+)
+
+
+async def _dispatch_order(limiter: AdaptiveRateLimiter, requests):
+    """Queue (name, priority) requests in order and return the order they were admitted in"""
+    admitted = []
+
+    async def request(name: str, priority: int):
+        await limiter.acquire(10, priority)
+        admitted.append(name)
+
+    tasks = []
+    for name, priority in requests:
+        tasks.append(asyncio.create_task(request(name, priority)))
+        await asyncio.sleep(0)  # Queue in this order
+    await asyncio.gather(*tasks)
+    return admitted
+
+
+def test_chat_requests_are_admitted_before_background_requests():
+    async def scenario():
+        limiter = AdaptiveRateLimiter(0, 0, default_backoff_seconds=1.0)
+        limiter.throttled(0.05)
+        return await _dispatch_order(limiter, [
+            ("title-1", PRIORITY_BACKGROUND), ("chat-1", PRIORITY_CHAT),
+            ("title-2", PRIORITY_BACKGROUND), ("chat-2", PRIORITY_CHAT)
+        ])
+
+    assert asyncio.run(scenario()) == ["chat-1", "chat-2", "title-1", "title-2"]
+
+
+def test_request_budget_admits_in_priority_then_fifo_order():
+    async def scenario():
+        # 600 requests per minute: one every 0.1s once the first burst is spent
+        limiter = AdaptiveRateLimiter(600, 0, default_backoff_seconds=1.0)
+        limiter.requests.level = 0
+        return await _dispatch_order(limiter, [
+            ("background", PRIORITY_BACKGROUND), ("chat-1", PRIORITY_CHAT), ("chat-2", PRIORITY_CHAT)
+        ])
+
+    assert asyncio.run(scenario()) == ["chat-1", "chat-2", "background"]
+
+
+def test_throttled_pauses_dispatch_for_retry_after():
+    async def scenario():
+        limiter = AdaptiveRateLimiter(0, 0, default_backoff_seconds=1.0)
+        limiter.throttled(0.1)
+        return await limiter.acquire(10)
+
+    waited = asyncio.run(scenario())
+    assert 0.08 <= waited < 0.5
+
+
+def test_deadline_fails_fast_when_budget_arrives_too_late():
+    async def scenario():
+        limiter = AdaptiveRateLimiter(0, 0, default_backoff_seconds=1.0)
+        limiter.throttled(5.0)
+        start = time.monotonic()
+        with pytest.raises(RateLimitTimeoutError):
+            await limiter.acquire(10, deadline=time.monotonic() + 1.0)
+        assert time.monotonic() - start < 0.5
+        assert limiter.queue_depth == 0
+
+    asyncio.run(scenario())
+
+
+def test_deadline_expires_while_queued_behind_others():
+    async def scenario():
+        limiter = AdaptiveRateLimiter(0, 0, default_backoff_seconds=1.0)
+        limiter.throttled(0.5)
+        head = asyncio.create_task(limiter.acquire(10))
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimitTimeoutError):
+            await limiter.acquire(10, deadline=time.monotonic() + 0.1)
+        await head
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+"""Concurrent identical completion requests share one upstream call"""
+import asyncio
+
+import pytest
+
+from app.services.ai_service import AIService
+
+
+class SlowAIService(AIService):
+    """Answers after ``delay`` seconds, or fails with ``error``, counting upstream calls"""
+
+    def __init__(self, delay: float = 0.05, error: Exception = None):
+        super().__init__(cache=None)
+        self.coalesce_requests = True
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def _call_upstream(self, timeout: float, priority: int, **kwargs):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"{kwargs['messages'][0]['content']} #{call}"
+
+
+def _request(service: AIService, content: str = "hello"):
+    return service._create_completion(5.0, model="chat", messages=[{"role": "user", "content": content}])
+
+
+def test_identical_requests_share_one_call():
+    async def scenario():
+        service = SlowAIService()
+        results = await asyncio.gather(*(_request(service) for _ in range(5)), _request(service, "other"))
+        return service, results
+
+    service, results = asyncio.run(scenario())
+    assert results == ["hello #1"] * 5 + ["other #2"]
+    assert service.calls == 2
+    assert service.coalesced_requests == 4
+    assert not service._inflight
+
+
+def test_cancelled_leader_does_not_cancel_the_followers():
+    async def scenario():
+        service = SlowAIService()
+        leader = asyncio.create_task(_request(service))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(_request(service)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return service, await asyncio.gather(*followers)
+
+    service, results = asyncio.run(scenario())
+    assert results == ["hello #1"] * 3
+    assert service.calls == 1
+
+
+def test_every_caller_going_away_leaves_no_stale_entry():
+    async def scenario():
+        service = SlowAIService(delay=0.01)
+        callers = [asyncio.create_task(_request(service)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.02)  # The shared call still completes
+        return service, await _request(service)
+
+    service, result = asyncio.run(scenario())
+    assert result == "hello #2", "a finished call is not reused"
+    assert not service._inflight
+
+
+def test_failure_is_shared_and_not_cached():
+    async def scenario():
+        service = SlowAIService(error=RuntimeError("upstream down"))
+        results = await asyncio.gather(*(_request(service) for _ in range(3)), return_exceptions=True)
+        service.error = None
+        return service, results, await _request(service)
+
+    service, results, retried = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "hello #2"
+
+
+def test_coalescing_can_be_turned_off():
+    async def scenario():
+        service = SlowAIService(delay=0.01)
+        service.coalesce_requests = False
+        await asyncio.gather(*(_request(service) for _ in range(3)))
+        return service
+
+    service = asyncio.run(scenario())
+    assert service.calls == 3
+    assert service.coalesced_requests == 0
@@ -0,0 +1,173 @@
+"""Recent sessions feed: pagination, continuation tokens and the per-process feed writer"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import ChatSession
+from app.services.chat_service import ChatHistoryService
+from app.services.cosmos_store import cosmos_store, exceptions
+from app.services.session_feed import RecentSessionsFeed, decode_continuation, encode_continuation
+from benchmarks.fakes.cosmos_container import InMemoryContainer
+
+
+@pytest.fixture
+def container():
+    container = InMemoryContainer()
+    cosmos_store.use_container(container)
+    yield container
+    asyncio.run(cosmos_store.close())
+
+
+def _service() -> ChatHistoryService:
+    service = ChatHistoryService(cache=None)
+    service.feed = RecentSessionsFeed(cosmos_store)
+    return service
+
+
+def _sessions(count: int):
+    start = datetime(2024, 1, 1)
+    return [ChatSession(title=f"chat {i}", updated_at=start + timedelta(minutes=i)) for i in range(count)]
+
+
+async def _list_all(service: ChatHistoryService, limit: int):
+    pages, token = [], None
+    while True:
+        sessions, token = await service.get_recent_sessions(limit=limit, continuation=token)
+        pages.append([session.title for session in sessions])
+        if token is None:
+            return pages
+
+
+def test_continuation_token_round_trip():
+    state = {"source": "feed", "after": ["2024-01-01T00:00:00", "abc"]}
+    assert decode_continuation(encode_continuation(state)) == state
+    with pytest.raises(ValueError):
+        decode_continuation("not a token")
+
+
+def test_pages_cover_every_session_once_newest_first(container):
+    async def scenario():
+        for session in _sessions(25):
+            await container.create_item(dict(session.to_document(), doc_type="session", session_id=session.id))
+        return await _list_all(_service(), limit=10)
+
+    pages = asyncio.run(scenario())
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == [f"chat {i}" for i in reversed(range(25))]
+
+
+def test_continuation_is_stable_when_sessions_are_added(container):
+    async def scenario():
+        service = _service()
+        for session in _sessions(6):
+            await container.create_item(dict(session.to_document(), doc_type="session", session_id=session.id))
+        first, token = await service.get_recent_sessions(limit=3)
+        # A session updated after the first page moves to the top, not into the next page
+        service.feed.record(container, ChatSession(title="new", updated_at=datetime(2025, 1, 1)))
+        await service.feed.flush()
+        second, token = await service.get_recent_sessions(limit=3, continuation=token)
+        return first, second, token
+
+    first, second, token = asyncio.run(scenario())
+    assert [s.title for s in first] == ["chat 5", "chat 4", "chat 3"]
+    assert [s.title for s in second] == ["chat 2", "chat 1", "chat 0"]
+    assert token is None
+
+
+def test_malformed_continuation_is_rejected(container):
+    with pytest.raises(ValueError):
+        asyncio.run(_service().get_recent_sessions(continuation="bogus"))
+
+
+def test_concurrent_sessions_are_merged_by_one_writer(container):
+    async def scenario():
+        service = _service()
+        await service.get_recent_sessions()  # Builds the (empty) feed
+        sessions = await asyncio.gather(*(service.create_session(f"chat {i}") for i in range(50)))
+        # Queued entries are listed before the writer has stored them
+        listed, _ = await service.get_recent_sessions(limit=100)
+        await service.feed.flush()
+        return service, sessions, listed
+
+    service, sessions, listed = asyncio.run(scenario())
+    assert {s.id for s in listed} == {s.id for s in sessions}
+    document = container.items[(service.feed.feed_id, service.feed.feed_id)]
+    assert {entry["id"] for entry in document["sessions"]} == {s.id for s in sessions}
+    stats = service.feed.stats()
+    assert stats["pending"] == 0
+    assert stats["conflicts"] == 0
+    assert stats["writes"] < len(sessions)
+
+
+def test_writers_in_different_processes_do_not_lose_entries():
+    async def scenario():
+        # Round trips take long enough for the two writers' replaces to conflict
+        container = InMemoryContainer(latency_ms=2)
+        first, second = RecentSessionsFeed(cosmos_store), RecentSessionsFeed(cosmos_store)
+        await first.build(container)
+        sessions = _sessions(40)
+        for index, session in enumerate(sessions):
+            (first if index % 2 else second).record(container, session)
+            await asyncio.sleep(0)
+        await asyncio.gather(first.flush(), second.flush())
+        return container, first, second, sessions
+
+    container, first, second, sessions = asyncio.run(scenario())
+    document = container.items[(first.feed_id, first.feed_id)]
+    assert [entry["id"] for entry in document["sessions"]] == [s.id for s in reversed(sessions)]
+    assert first.conflicts + second.conflicts > 0
+
+
+def test_feed_is_rebuilt_after_repeated_conflicts():
+    class ConflictingContainer(InMemoryContainer):
+        async def replace_item(self, item, body: dict, **kwargs) -> dict:
+            raise exceptions.CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+
+    async def scenario():
+        conflicting = ConflictingContainer()
+        feed = RecentSessionsFeed(cosmos_store)
+        feed.max_write_attempts = 2
+        stored = _sessions(3)
+        for session in stored:
+            await conflicting.create_item(dict(session.to_document(), doc_type="session", session_id=session.id))
+        await feed.build(conflicting)
+        queued = ChatSession(title="queued", updated_at=datetime(2025, 1, 1))
+        feed.record(conflicting, queued)
+        await feed.flush()
+        return conflicting, feed
+
+    conflicting, feed = asyncio.run(scenario())
+    document = conflicting.items[(feed.feed_id, feed.feed_id)]
+    assert [entry["title"] for entry in document["sessions"]] == ["queued", "chat 2", "chat 1", "chat 0"]
+    assert feed.stats() == {"pending": 0, "writes": 0, "conflicts": 2, "rebuilds": 1}
+
+
+def test_entries_recorded_before_the_feed_exists_build_it(container):
+    async def scenario():
+        feed = RecentSessionsFeed(cosmos_store)
+        stored = _sessions(2)
+        for session in stored:
+            await container.create_item(dict(session.to_document(), doc_type="session", session_id=session.id))
+        feed.record(container, ChatSession(title="queued", updated_at=datetime(2025, 1, 1)))
+        await feed.flush()
+        return feed
+
+    feed = asyncio.run(scenario())
+    document = container.items[(feed.feed_id, feed.feed_id)]
+    assert [entry["title"] for entry in document["sessions"]] == ["queued", "chat 1", "chat 0"]
+    assert feed.stats()["pending"] == 0
+
+
+def test_pages_past_the_capped_feed_come_from_the_query(container):
+    async def scenario():
+        service = _service()
+        service.feed.max_entries = 5
+        for session in _sessions(12):
+            await container.create_item(dict(session.to_document(), doc_type="session", session_id=session.id))
+        return service, await _list_all(service, limit=4)
+
+    service, pages = asyncio.run(scenario())
+    document = container.items[(service.feed.feed_id, service.feed.feed_id)]
+    assert len(document["sessions"]) == 5
+    assert sum(pages, []) == [f"chat {i}" for i in reversed(range(12))]
@@ -0,0 +1,113 @@
+"""Background title generation: per-session deduplication, retries and a full queue"""
+import asyncio
+
+from app.services.title_service import TitleGenerationQueue
+
+
+class StubAIService:
+    """Returns a title after failing the first ``failures`` calls"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    def is_available(self) -> bool:
+        return True
+
+    async def generate_chat_title(self, first_message: str, raise_errors: bool = False) -> str:
+        self.calls += 1
+        await self.release.wait()
+        if self.calls <= self.failures:
+            raise RuntimeError("upstream failed")
+        return f"About {first_message}"
+
+
+class StubChatHistoryService:
+    def __init__(self):
+        self.titles = {}
+
+    async def update_session(self, session_id: str, title: str = None, **kwargs) -> bool:
+        self.titles[session_id] = title
+        return True
+
+    async def is_available(self) -> bool:
+        return True
+
+
+def _queue(ai_service: StubAIService, max_attempts: int = 3, queue_size: int = 10) -> TitleGenerationQueue:
+    chat_history_service = StubChatHistoryService()
+    queue = TitleGenerationQueue(ai_service, chat_history_service)
+    queue.worker_count = 2
+    queue.max_queue_size = queue_size
+    queue.max_attempts = max_attempts
+    queue.retry_delay_seconds = 0.001
+    return queue
+
+
+def test_a_session_is_titled_once():
+    async def scenario():
+        ai_service = StubAIService()
+        ai_service.release.clear()
+        queue = _queue(ai_service)
+        assert queue.enqueue("s1", "cats")
+        assert not queue.enqueue("s1", "cats"), "already queued"
+        ai_service.release.set()
+        await queue._queue.join()
+        assert not queue.enqueue("s1", "cats"), "already titled"
+        await queue.stop()
+        return ai_service, queue
+
+    ai_service, queue = asyncio.run(scenario())
+    assert ai_service.calls == 1
+    assert queue.chat_history_service.titles == {"s1": "About cats"}
+    assert queue.counters["deduplicated"] == 2
+
+
+def test_failed_attempts_are_retried():
+    async def scenario():
+        queue = _queue(StubAIService(failures=2))
+        queue.enqueue("s1", "dogs")
+        await queue._queue.join()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.chat_history_service.titles == {"s1": "About dogs"}
+    assert queue.counters["retried"] == 2
+    assert queue.counters["succeeded"] == 1
+
+
+def test_gives_up_after_max_attempts():
+    async def scenario():
+        queue = _queue(StubAIService(failures=5), max_attempts=2)
+        queue.enqueue("s1", "birds")
+        await queue._queue.join()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert not queue.chat_history_service.titles
+    assert queue.counters["failed"] == 1
+    assert queue.stats()["in_flight"] == 0
+
+
+def test_full_queue_drops_requests():
+    async def scenario():
+        ai_service = StubAIService()
+        ai_service.release.clear()
+        queue = _queue(ai_service, queue_size=1)
+        queue.worker_count = 1
+        results = [queue.enqueue(f"s{i}", "fish") for i in range(4)]
+        await asyncio.sleep(0)  # The worker takes the first request off the queue
+        results.append(queue.enqueue("s4", "fish"))
+        ai_service.release.set()
+        await queue._queue.join()
+        await queue.stop()
+        return queue, results
+
+    queue, results = asyncio.run(scenario())
+    assert results == [True, False, False, False, True]
+    assert queue.counters["dropped"] == 3
+    assert set(queue.chat_history_service.titles) == {"s0", "s4"}
@@ -0,0 +1,156 @@
+"""Batching, flushing and item-by-item fallback of the chat history write buffer"""
+import asyncio
+
+import pytest
+
+from app.services.cosmos_store import CosmosStore, exceptions
+from app.services.write_buffer import CosmosWriteBuffer, WriteCancelledError
+from benchmarks.fakes.cosmos_container import InMemoryContainer
+
+
+def _buffer(container: InMemoryContainer, durable: bool = True, flush_interval_seconds: float = 0.01,
+            failures=None) -> CosmosWriteBuffer:
+    store = CosmosStore()
+    store.use_container(container)
+    return CosmosWriteBuffer(store, max_batch_size=100, flush_interval_seconds=flush_interval_seconds,
+                             durable=durable, on_failure=failures.append if failures is not None else None)
+
+
+def _document(session_id: str, message_id: str) -> dict:
+    return {"id": message_id, "session_id": session_id, "role": "user", "content": message_id}
+
+
+def test_turn_is_committed_as_one_batch():
+    async def scenario():
+        container = InMemoryContainer()
+        buffer = _buffer(container, flush_interval_seconds=60)
+        saved = await buffer.create_many("s1", [_document("s1", "user"), _document("s1", "assistant")])
+        return container, buffer, saved
+
+    container, buffer, saved = asyncio.run(scenario())
+    assert saved
+    # Committed without waiting out the (60s) flush interval
+    assert container.operations == {"execute_item_batch": 1}
+    assert {key[1] for key in container.items} == {"user", "assistant"}
+    assert buffer.stats()["average_batch_size"] == 2
+
+
+def test_durable_create_on_idle_partition_commits_immediately():
+    async def scenario():
+        container = InMemoryContainer()
+        buffer = _buffer(container, flush_interval_seconds=60)
+        return container, await buffer.create("s1", _document("s1", "m1"))
+
+    container, saved = asyncio.run(scenario())
+    assert saved
+    assert container.operations == {"create_item": 1}
+
+
+def test_creates_queued_behind_a_commit_share_a_batch():
+    async def scenario():
+        container = InMemoryContainer(latency_ms=20)
+        buffer = _buffer(container)
+        first = asyncio.create_task(buffer.create("s1", _document("s1", "m1")))
+        await asyncio.sleep(0)
+        rest = [buffer.create("s1", _document("s1", f"m{i}")) for i in range(2, 6)]
+        return container, await asyncio.gather(first, *rest)
+
+    container, saved = asyncio.run(scenario())
+    assert all(saved)
+    assert container.operations == {"create_item": 1, "execute_item_batch": 1}
+    assert len(container.items) == 5
+
+
+def test_write_behind_flushes_on_interval_and_flush_all():
+    async def scenario():
+        container = InMemoryContainer()
+        buffer = _buffer(container, durable=False, flush_interval_seconds=0.05)
+        for i in range(3):
+            assert await buffer.create("s1", _document("s1", f"m{i}"))
+        await buffer.create("s2", _document("s2", "other"))
+        assert buffer.pending_count == 4
+        assert not container.items
+
+        await asyncio.sleep(0.1)
+        assert buffer.pending_count == 0
+        assert container.operations == {"execute_item_batch": 1, "create_item": 1}
+
+        await buffer.create("s1", _document("s1", "late"))
+        await buffer.flush_all()
+        return container
+
+    container = asyncio.run(scenario())
+    assert len(container.items) == 5
+
+
+def test_failed_batch_falls_back_to_individual_creates():
+    async def scenario():
+        container = InMemoryContainer()
+        failures = []
+        buffer = _buffer(container, failures=failures)
+        # Already stored, so the batch conflicts and nothing in it is written
+        await container.create_item(_document("s1", "m1"))
+        saved = await buffer.create_many("s1", [_document("s1", "m1"), _document("s1", "m2")])
+        return container, buffer, saved, failures
+
+    container, buffer, saved, failures = asyncio.run(scenario())
+    # The duplicate counts as saved by an earlier attempt; the other document still lands
+    assert saved
+    assert not failures
+    assert container.operations["execute_item_batch"] == 1
+    assert container.operations["create_item"] == 3
+    assert {key[1] for key in container.items} == {"m1", "m2"}
+
+
+def test_failures_are_reported():
+    class FailingContainer(InMemoryContainer):
+        async def create_item(self, body: dict, **kwargs) -> dict:
+            if body["id"] == "bad":
+                raise exceptions.CosmosHttpResponseError(status_code=503, message="Service unavailable")
+            return await super().create_item(body, **kwargs)
+
+    async def scenario():
+        container = FailingContainer()
+        failures = []
+        buffer = _buffer(container, failures=failures)
+        saved = await buffer.create("s1", _document("s1", "bad"))
+        return buffer, saved, failures
+
+    buffer, saved, failures = asyncio.run(scenario())
+    assert not saved
+    assert failures == ["s1"]
+    assert buffer.stats()["failures"] == 1
+
+
+def test_cancelled_commit_fails_its_writes():
+    async def scenario():
+        container = InMemoryContainer(latency_ms=50)
+        failures = []
+        buffer = _buffer(container, failures=failures)
+        create = asyncio.create_task(buffer.create("s1", _document("s1", "m1")))
+        await asyncio.sleep(0.01)
+        buffer._commits["s1"].cancel()
+        with pytest.raises(WriteCancelledError):
+            await asyncio.wait_for(create, 1.0)
+        return buffer, failures
+
+    buffer, failures = asyncio.run(scenario())
+    assert failures == ["s1"]
+    assert buffer.stats()["failures"] == 1
+
+
+def test_flush_all_waits_for_every_commit_in_flight():
+    async def scenario():
+        container = InMemoryContainer(latency_ms=50)
+        buffer = _buffer(container, durable=False)
+        await buffer.create_many("s1", [_document("s1", "first")])
+        await buffer.create_many("s1", [_document("s1", "second")])
+        # The second commit waits behind the first; cancelling it must not end the flush early
+        buffer._commits["s1"].cancel()
+        await buffer.flush_all()
+        return container, buffer
+
+    container, buffer = asyncio.run(scenario())
+    assert {key[1] for key in container.items} == {"first"}
+    assert not buffer._in_flight
+    assert buffer.stats()["failures"] == 1